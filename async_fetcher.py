@@ -1,12 +1,75 @@
 import asyncio
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 import random
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from crawl_archive import ArchiveReader, ArchiveWriter
+from driver_pool import ChromeDriverPool
+from page_features import declared_encoding
+from page_cache import PageCache, CachedPage
+from url_templates import path_template
+
+ANCHOR_PATTERN = re.compile(rb'<a\s[^>]*href', re.IGNORECASE)
+BODY_PATTERN = re.compile(rb'<body[^>]*>(.*)</body>', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(rb'<script.*?</script>|<style.*?</style>|<[^>]+>', re.IGNORECASE | re.DOTALL)
+SPA_ROOT_PATTERN = re.compile(
+    rb'<div[^>]+id=["\'](root|app|__next|__nuxt|main-app)["\'][^>]*>\s*</div>', re.IGNORECASE
+)
+# Status codes that usually mean a bot wall which a real browser gets past
+ESCALATE_STATUSES = (403, 429, 503)
+HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+UTF8_CHARSETS = frozenset(("utf-8", "utf8", "us-ascii", "ascii"))
+
+
+def looks_like_js_shell(html: bytes, min_text_chars: int = 200) -> bool:
+    """
+    Heuristic check whether server-side HTML is only a shell that JavaScript fills in.
+    """
+    if not html or not ANCHOR_PATTERN.search(html):
+        return True
+
+    if SPA_ROOT_PATTERN.search(html):
+        return True
+
+    body = BODY_PATTERN.search(html)
+    if not body:
+        return True
+    text = TAG_PATTERN.sub(b" ", body.group(1))
+    return len(b"".join(text.split())) < min_text_chars
+
+
+def page_bytes(body: bytes, content_type: str) -> bytes:
+    """
+    The page as the parse stage reads it: in the encoding it declares, else UTF-8. A
+    charset only the Content-Type header names is transcoded to UTF-8.
+    """
+    match = HEADER_CHARSET.search(content_type)
+    if match is None or match.group(1).lower() in UTF8_CHARSETS or declared_encoding(body) is not None:
+        return body
+    try:
+        return body.decode(match.group(1), "replace").encode("utf-8")
+    except LookupError:
+        return body
+
+
+def rendered_bytes(source: str) -> bytes:
+    """
+    A rendered page encoded in the charset its markup declares, so the declaration holds.
+    """
+    html = source.encode("utf-8")
+    declared = declared_encoding(html)
+    if declared is None or declared in UTF8_CHARSETS:
+        return html
+    try:
+        return source.encode(declared, "xmlcharrefreplace")
+    except (LookupError, UnicodeError):
+        return html
+
 
 class AsyncFetcher:
     USER_AGENTS = [
@@ -15,40 +78,250 @@ class AsyncFetcher:
         "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Firefox/113.0",
         "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
     ]
+    FETCH_MODES = ("selenium", "http", "tiered", "replay")
+    # Modes that never start a browser
+    BROWSERLESS_MODES = ("http", "replay")
+    HTTP_TIMEOUT = 15
+    # Hosts whose keep-alive connections are kept around
+    HTTP_POOL_HOSTS = 100
+
+    def __init__(self, driver_pool: ChromeDriverPool = None, mode: str = "selenium", http_pool_size: int = 10,
+                 max_workers: int = None, cache: PageCache = None, archive=None):
+        if mode not in self.FETCH_MODES:
+            raise ValueError(f"Unknown fetch mode {mode!r}, expected one of {self.FETCH_MODES}")
+        if mode == "replay" and not isinstance(archive, ArchiveReader):
+            raise ValueError("Replay mode needs an ArchiveReader to serve pages from")
+        self.mode = mode
+        self.driver_pool = driver_pool
+        if self.driver_pool is None and mode not in self.BROWSERLESS_MODES:
+            self.driver_pool = ChromeDriverPool(size=1, user_agents=self.USER_AGENTS)
+
+        # Blocking fetches run on their own threads so they cannot starve the default executor
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+        self.session = None
+        if mode in ("http", "tiered"):
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.HTTP_POOL_HOSTS, pool_maxsize=http_pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+        # Optional on-disk page cache: fresh entries are served as is, stale ones revalidated
+        self.cache = cache
+        # Every page a live mode serves is recorded to an ArchiveWriter; replay mode serves
+        # pages from an ArchiveReader instead of the network
+        self.archive = archive
+
+        # (domain, path template) pairs that served a JS shell over plain HTTP
+        self.escalated = set()
+        self.stats_lock = threading.Lock()
+        self.tier_stats = {
+            "http": {"pages": 0, "seconds": 0.0, "bytes": 0},
+            "selenium": {"pages": 0, "seconds": 0.0, "bytes": 0, "not_ready": 0},
+            "replay": {"pages": 0, "seconds": 0.0, "bytes": 0},
+            "served": {"http": 0, "selenium": 0, "cache": 0, "replay": 0},
+            "escalations": 0,
+            "skipped_http": 0,
+        }
 
-    def __init__(self):
-        pass
+    def __record(self, tier: str, elapsed: float, transferred: int = 0, ready: bool = True):
+        with self.stats_lock:
+            self.tier_stats[tier]["pages"] += 1
+            self.tier_stats[tier]["seconds"] += elapsed
+            self.tier_stats[tier]["bytes"] += transferred
+            if not ready:
+                self.tier_stats[tier]["not_ready"] += 1
 
-    def __fetch_with_selenium_sync(self, url: str) -> dict:
-        options = Options()
-        options.headless = True
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--user-agent=' + random.choice(self.USER_AGENTS))
+    def __from_cache_sync(self, url: str) -> tuple[Optional[CachedPage], Optional[dict]]:
+        """
+        The URL's cache entry, and a result served from it if the entry is still fresh.
+        """
+        start = time.perf_counter()
+        entry = self.cache.get(url)
+        if entry is None or not self.cache.is_fresh(entry):
+            return entry, None
+        html = self.cache.read(entry)
+        if html is None:
+            return None, None
+        self.cache.record_fresh_hit()
+        return entry, {"url": url, "html": html, "status": 200, "tier": "cache",
+                       "elapsed": time.perf_counter() - start, "bytes": 0, "cache": "fresh"}
 
+    def __replay_sync(self, url: str) -> dict:
+        start = time.perf_counter()
+        record = self.archive.get(url)
+        if record is None:
+            # Never fetched while recording, as if the network had failed
+            result = {"url": url, "html": b"", "status": None}
+        else:
+            result = {"url": url, "html": record.body, "status": record.status, "recorded_tier": record.tier}
+        elapsed = time.perf_counter() - start
+        self.__record("replay", elapsed)
+        result.update(tier="replay", elapsed=elapsed, bytes=0)
+        return result
+
+    def __fetch_with_selenium_sync(self, url: str, validators: tuple = (None, None)) -> dict:
+        profile = self.driver_pool.profile
+        start = time.perf_counter()
+        transferred, ready = 0, False
         try:
-            # driver = webdriver.Chrome(ChromeDriverManager().install(), options=options)
-            driver = webdriver.Chrome(options=options)
-            driver.set_page_load_timeout(20)
-            driver.get(url)
+            with self.driver_pool.lease() as driver:
+                # Drop log entries a previous page left behind
+                profile.transferred_bytes(driver)
+                driver.get(url)
+                ready = profile.wait_ready(driver, url)
+                # Handed on as raw bytes, the parse stage does the only parse
+                html = rendered_bytes(driver.page_source)
+                transferred = profile.transferred_bytes(driver)
+            result = {"url": url, "html": html, "status": 200}
+            if self.cache is not None:
+                # Validators of the raw document, if the HTTP tier saw it, guard the rendered copy
+                self.cache.put(url, html, "selenium", *validators)
+        except Exception:
+            result = {"url": url, "html": b"", "status": None}
+
+        elapsed = time.perf_counter() - start
+        self.__record("selenium", elapsed, transferred, ready)
+        result.update(tier="selenium", elapsed=elapsed, bytes=transferred, ready=ready)
+        return result
 
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
+    def __fetch_with_http_sync(self, url: str, cached: CachedPage = None) -> dict:
+        start = time.perf_counter()
+        headers = {"User-Agent": random.choice(self.USER_AGENTS)}
+        if cached is not None:
+            headers.update(cached.conditional_headers())
+        cache_status = None
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.HTTP_TIMEOUT)
+            validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            content_type = response.headers.get("Content-Type", "text/html")
+            if response.status_code == 304 and cached is not None:
+                html = self.cache.read(cached)
+                if html is None:
+                    # The cached body is gone, fetch it in full
+                    return self.__fetch_with_http_sync(url)
+                self.cache.refresh(cached, *validators)
+                result = {"url": url, "html": html, "status": 200}
+                cache_status = "revalidated"
+            elif "html" not in content_type:
+                result = {"url": url, "html": b"", "status": response.status_code}
+            else:
+                html = page_bytes(response.content, content_type)
+                result = {"url": url, "html": html, "status": response.status_code}
+                # JS shells are cached once they were rendered
+                if (self.cache is not None and response.status_code == 200
+                        and (self.mode == "http" or not looks_like_js_shell(html))):
+                    self.cache.put(url, html, "http", *validators)
+                    cache_status = "stored"
+            result["validators"] = validators
+        except requests.RequestException:
+            result = {"url": url, "html": b"", "status": None}
 
-            html = driver.page_source
-            soup = BeautifulSoup(html, "lxml")
-            driver.quit()
-            return {"url": url, "html": soup.prettify(), "status": 200}
-        except Exception as e:
-            return {"url": url, "html": "", "status": None}
+        elapsed = time.perf_counter() - start
+        transferred = 0 if cache_status == "revalidated" else len(result["html"])
+        self.__record("http", elapsed, transferred)
+        result.update(tier="http", elapsed=elapsed, bytes=transferred)
+        if cache_status is not None:
+            result["cache"] = cache_status
+        return result
 
+    async def __fetch_html_with_selenium(self, url: str, validators: tuple = (None, None)) -> dict:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self.__fetch_with_selenium_sync, url, validators)
 
-    async def __fetch_html_with_selenium(self, url: str) -> dict:
+    async def __fetch_html_with_http(self, url: str, cached: CachedPage = None) -> dict:
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.__fetch_with_selenium_sync, url)
+        return await loop.run_in_executor(self.executor, self.__fetch_with_http_sync, url, cached)
+
+    def __escalation_key(self, url: str):
+        return urlparse(url).netloc, path_template(url)
+
+    def __needs_browser(self, result: dict) -> bool:
+        if result["status"] in ESCALATE_STATUSES:
+            return True
+        if result["status"] != 200 or not result["html"]:
+            return False
+        return looks_like_js_shell(result["html"])
+
+    async def __fetch_tiered(self, url: str, cached: CachedPage = None) -> dict:
+        key = self.__escalation_key(url)
+        if key in self.escalated:
+            # A rendered copy stays valid while its raw document does not change
+            if cached is not None and cached.revalidatable:
+                result = await self.__fetch_html_with_http(url, cached)
+                if result.get("cache") == "revalidated":
+                    return result
+                return await self.__fetch_html_with_selenium(url, result.get("validators", (None, None)))
+            with self.stats_lock:
+                self.tier_stats["skipped_http"] += 1
+            return await self.__fetch_html_with_selenium(url)
+
+        result = await self.__fetch_html_with_http(url, cached)
+        if result.get("cache") == "revalidated" or not self.__needs_browser(result):
+            return result
+
+        self.escalated.add(key)
+        with self.stats_lock:
+            self.tier_stats["escalations"] += 1
+        return await self.__fetch_html_with_selenium(url, result.get("validators", (None, None)))
 
     async def smart_fetch_html(self, url: str):
-        result = await self.__fetch_html_with_selenium(url)
-        return result
\ No newline at end of file
+        if self.mode == "replay":
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self.executor, self.__replay_sync, url)
+            with self.stats_lock:
+                self.tier_stats["served"]["replay"] += 1
+            return result
+
+        result = await self.__fetch_live(url)
+        if isinstance(self.archive, ArchiveWriter):
+            # Compressed and appended off the event loop
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self.executor, self.archive.write_page, url, result["html"],
+                                       result["status"], result["tier"])
+        return result
+
+    async def __fetch_live(self, url: str) -> dict:
+        cached = None
+        if self.cache is not None:
+            loop = asyncio.get_event_loop()
+            cached, result = await loop.run_in_executor(self.executor, self.__from_cache_sync, url)
+            if result is not None:
+                with self.stats_lock:
+                    self.tier_stats["served"]["cache"] += 1
+                return result
+
+        if self.mode == "http":
+            result = await self.__fetch_html_with_http(url, cached)
+        elif self.mode == "tiered":
+            result = await self.__fetch_tiered(url, cached)
+        else:
+            # A browser cannot send a conditional request, rendered pages are only reused while fresh
+            result = await self.__fetch_html_with_selenium(url)
+
+        with self.stats_lock:
+            self.tier_stats["served"][result["tier"]] += 1
+        return result
+
+    def get_tier_stats(self) -> dict:
+        """
+        Pages, seconds and bytes transferred per tier, plus the browser time the HTTP tier
+        saved, estimated from the average Selenium render time.
+        """
+        with self.stats_lock:
+            stats = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self.tier_stats.items()}
+        selenium = stats["selenium"]
+        avg_render = selenium["seconds"] / selenium["pages"] if selenium["pages"] else 0.0
+        stats["estimated_browser_seconds_saved"] = round(
+            max(0.0, stats["served"]["http"] * avg_render - stats["http"]["seconds"]), 2
+        )
+        if self.cache is not None:
+            stats["page_cache"] = self.cache.get_stats()
+        if self.archive is not None:
+            stats["archive"] = self.archive.get_stats()
+        return stats
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if self.session is not None:
+            self.session.close()
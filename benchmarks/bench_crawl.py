@@ -0,0 +1,101 @@
+"""
+End-to-end crawl benchmark against synthetic shops served locally.
+
+Starts a SyntheticShop server, crawls it through AsyncCrawler under two host names (two
+seed domains) over plain HTTP and reports pages/sec, product recall and precision
+against the shop's known product URLs, and the peak RSS of the crawler and its parse
+workers. With --cache the shop is crawled twice with a page cache and the second,
+revalidating crawl is reported.
+
+    python -m benchmarks.bench_crawl --products 40 --parse-workers 2
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.results import save_result
+from benchmarks.synthetic_shop import SyntheticShop, ShopServer
+from crawler import AsyncCrawler
+
+
+def peak_rss_mb() -> tuple[float, float]:
+    """
+    Peak resident set size of this process and of its largest finished child, in MB.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def run(shop: SyntheticShop, parse_workers: int, max_depth: int, fetch_budget: int, sitemaps: bool = True,
+        cache: bool = False) -> dict:
+    server = ShopServer(shop).start()
+    seeds = [f"http://127.0.0.1:{server.port}/", f"http://localhost:{server.port}/"]
+    truth = set()
+    for seed in seeds:
+        truth |= shop.product_urls(seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for _ in range(2 if cache else 1):
+                crawler = AsyncCrawler(output_csv=os.path.join(tmp, "products.csv"), fetch_mode="http",
+                                       parse_workers=parse_workers, global_fetch_budget=fetch_budget,
+                                       cache_dir=os.path.join(tmp, "cache") if cache else None)
+                # A local server needs no politeness delay
+                crawler.MIN_REQUEST_DELAY = 0.0
+                crawler.DISCOVER_SITEMAPS = sitemaps
+                not_modified = server.not_modified
+                start = time.perf_counter()
+                collected = asyncio.run(crawler.crawl_multiple_seeds(seeds, max_depth=max_depth))
+                elapsed = time.perf_counter() - start
+        finally:
+            server.close()
+
+    found = {url for rows in collected.values() for _, url in rows}
+    pages = sum(state.fetched for state in crawler.scheduler.domains.values())
+    true_positives = len(found & truth)
+    own_rss, child_rss = peak_rss_mb()
+    return {
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 1),
+        "products_expected": len(truth),
+        "products_found": len(found),
+        "recall": round(true_positives / len(truth), 4) if truth else 0.0,
+        "precision": round(true_positives / len(found), 4) if found else 0.0,
+        "peak_rss_mb": round(own_rss, 1),
+        "peak_child_rss_mb": round(child_rss, 1),
+        "not_modified": server.not_modified - not_modified,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--subcategories", type=int, default=3)
+    parser.add_argument("--products", type=int, default=40, help="products per subcategory")
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=4)
+    parser.add_argument("--fetch-budget", type=int, default=20)
+    parser.add_argument("--no-sitemaps", action="store_true", help="discover pages through links only")
+    parser.add_argument("--cache", action="store_true", help="report a second crawl revalidating a page cache")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    shop = SyntheticShop(seed=args.seed, categories=args.categories, subcategories=args.subcategories,
+                         products_per_subcategory=args.products)
+    print(f"Synthetic shop: {shop.page_count()} pages, {len(shop.product_paths)} products per domain")
+    metrics = run(shop, args.parse_workers, args.max_depth, args.fetch_budget, sitemaps=not args.no_sitemaps,
+                  cache=args.cache)
+    for name, value in metrics.items():
+        print(f"  {name:<20} {value}")
+    if not args.no_save:
+        save_result("crawl", metrics, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
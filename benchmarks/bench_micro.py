@@ -0,0 +1,163 @@
+"""
+Microbenchmarks for the crawler's hot paths, on URLs and pages of a synthetic shop:
+is_dead_end_url, is_product_url, URLFrontier.add_urls, link extraction,
+HTMLParser.parse_html (plain, and with every verdict explained and logged) and the
+SimHash fingerprint used to skip near duplicates.
+
+    python -m benchmarks.bench_micro --repeat 5
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.results import save_result
+from benchmarks.synthetic_shop import SyntheticShop, DEAD_END_PATHS
+from bs4 import BeautifulSoup
+from html_parser import HTMLParser
+from logger_config import ExplanationSampler
+from link_extractor import LinkExtractor, extract_links_from_soup
+from near_duplicates import simhash
+from product_url_analyser import is_dead_end_url, is_product_url, _classify_normalized
+from url_canonicalizer import URLCanonicalizer
+from url_frontier import URLFrontier
+from work_tracker import WorkTracker
+
+BASE_URL = "https://shop.example.com"
+DOMAIN = "shop.example.com"
+
+
+def shop_urls(shop: SyntheticShop) -> list[str]:
+    paths = list(shop.product_paths) + DEAD_END_PATHS
+    for category, subs in shop.tree.items():
+        paths.append(f"/c/{category}")
+        paths.extend(f"/c/{category}/{sub}?page={p}" for sub in subs for p in (1, 2))
+    return [BASE_URL + path for path in paths]
+
+
+def best_rate(fn, items: int, repeat: int) -> float:
+    """
+    Items per second of the fastest of `repeat` runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return items / best
+
+
+def bench_url_checks(urls: list[str], repeat: int) -> dict:
+    def dead_end():
+        _classify_normalized.cache_clear()
+        for url in urls:
+            is_dead_end_url(url)
+
+    def product():
+        _classify_normalized.cache_clear()
+        for url in urls:
+            is_product_url(url)
+
+    def product_cached():
+        for url in urls:
+            is_product_url(url)
+
+    return {
+        "is_dead_end_url_per_sec": round(best_rate(dead_end, len(urls), repeat)),
+        "is_product_url_per_sec": round(best_rate(product, len(urls), repeat)),
+        "is_product_url_cached_per_sec": round(best_rate(product_cached, len(urls), repeat)),
+    }
+
+
+def bench_frontier(urls: list[str], repeat: int, batch: int = 50) -> dict:
+    batches = [set(urls[i:i + batch]) for i in range(0, len(urls), batch)]
+
+    async def add_all():
+        frontier = URLFrontier(BASE_URL + "/", tracker=WorkTracker(), max_depth=10)
+        for urls_batch in batches:
+            await frontier.add_urls(urls_batch, current_depth=0)
+        # Second pass is all duplicates, the common case for navigation links
+        for urls_batch in batches:
+            await frontier.add_urls(urls_batch, current_depth=0)
+
+    return {"frontier_add_urls_per_sec": round(best_rate(lambda: asyncio.run(add_all()), 2 * len(urls), repeat))}
+
+
+def bench_links(shop: SyntheticShop, repeat: int) -> dict:
+    """
+    Link extraction on listing pages: anchor by anchor from a parsed tree (tree already
+    built) against LinkExtractor on the raw HTML with its per-domain cache warm.
+    """
+    canonicalizer = URLCanonicalizer()
+    targets = [f"/c/{c}/{sub}?page={p}" for c, subs in shop.tree.items() for sub in subs for p in (1, 2)]
+    documents = [(BASE_URL + t, shop.render(t)[2].encode("utf-8")) for t in targets]
+    soups = [BeautifulSoup(html, "lxml") for _, html in documents]
+    extractor = LinkExtractor(canonicalizer)
+
+    def from_soup():
+        for (url, _), soup in zip(documents, soups):
+            extract_links_from_soup(soup, url, DOMAIN, canonicalizer)
+
+    def from_raw():
+        for url, html in documents:
+            extractor.extract(html, url, DOMAIN)
+
+    from_raw()
+    return {
+        "soup_links_pages_per_sec": round(best_rate(from_soup, len(documents), repeat), 1),
+        "extract_links_pages_per_sec": round(best_rate(from_raw, len(documents), repeat), 1),
+    }
+
+
+def bench_parse(shop: SyntheticShop, repeat: int, pages: int = 60) -> dict:
+    parser = HTMLParser()
+    explaining = HTMLParser(sampler=ExplanationSampler(rate=1.0))
+    targets = []
+    for category, subs in shop.tree.items():
+        targets.extend(f"/c/{category}/{sub}" for sub in subs)
+    targets.extend(shop.product_paths)
+    documents = [(BASE_URL + t, shop.render(t)[2]) for t in targets[:pages]]
+
+    def parse_all():
+        for url, html in documents:
+            parser.parse_html(url, html, DOMAIN)
+
+    def parse_explained():
+        for url, html in documents:
+            explaining.parse_html(url, html, DOMAIN)
+
+    def fingerprint_all():
+        for _, html in documents:
+            simhash(html)
+
+    return {
+        "parse_html_pages_per_sec": round(best_rate(parse_all, len(documents), repeat), 1),
+        "parse_html_explained_pages_per_sec": round(best_rate(parse_explained, len(documents), repeat), 1),
+        "simhash_pages_per_sec": round(best_rate(fingerprint_all, len(documents), repeat), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--products", type=int, default=200, help="products per subcategory")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    shop = SyntheticShop(seed=args.seed, products_per_subcategory=args.products)
+    urls = shop_urls(shop)
+    print(f"{len(urls)} URLs, best of {args.repeat}")
+
+    metrics = {}
+    metrics.update(bench_url_checks(urls, args.repeat))
+    metrics.update(bench_frontier(urls, args.repeat))
+    metrics.update(bench_links(shop, args.repeat))
+    metrics.update(bench_parse(shop, args.repeat))
+    for name, value in metrics.items():
+        print(f"  {name:<36} {value:>12,}")
+    if not args.no_save:
+        save_result("micro", metrics, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
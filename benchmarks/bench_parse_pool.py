@@ -0,0 +1,84 @@
+"""
+Benchmark for the process pool parse stage.
+
+Parses the same synthetic listing and product pages with an increasing number of pool
+workers and reports pages/sec for each, so the scaling with core count is visible.
+
+    python -m benchmarks.bench_parse_pool --pages 400 --workers 0 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from parse_pool import ParsePool
+
+DOMAIN = "shop.example.com"
+
+
+def listing_page(rng: random.Random, tiles: int = 300) -> str:
+    items = "".join(
+        f'<li><a href="/products/item-{rng.randint(1, 10 ** 6)}"><img src="/img/{i}.jpg">'
+        f'<span>Item {i}</span><span>₹ {rng.randint(100, 9999)}</span></a></li>'
+        for i in range(tiles)
+    )
+    nav = "".join(f'<a href="/c/{c}">{c}</a>' for c in ("men", "women", "kids", "sale", "new"))
+    return f"<html><head><script>var a = 1;</script></head><body><nav>{nav}</nav><ul>{items}</ul></body></html>"
+
+
+def product_page(rng: random.Random) -> str:
+    related = "".join(f'<a href="/products/item-{rng.randint(1, 10 ** 6)}">Related</a>' for _ in range(20))
+    return (
+        "<html><body><h1>Cotton shirt</h1>"
+        f"<span>₹ {rng.randint(100, 9999)}</span><button>Add to Cart</button>"
+        "<div>Product Details</div><p>" + "Soft cotton. " * 200 + "</p>"
+        f"<form><input name='pincode'></form><div>You may also like</div>{related}</body></html>"
+    )
+
+
+def generate_pages(count: int, seed: int = 7) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        if i % 3 == 0:
+            pages.append((f"https://{DOMAIN}/c/men?page={i}", listing_page(rng), DOMAIN))
+        else:
+            pages.append((f"https://{DOMAIN}/products/item-{i}", product_page(rng), DOMAIN))
+    return pages
+
+
+async def run(pages: list, workers: int, batch_size: int) -> float:
+    pool = ParsePool(workers=workers, batch_size=batch_size)
+    pool.start()
+    try:
+        # Warm the workers up so process start-up is not measured
+        await asyncio.gather(*(pool.parse(pages[:1]) for _ in range(max(1, workers))))
+        start = time.perf_counter()
+        batches = [pages[i:i + batch_size] for i in range(0, len(pages), batch_size)]
+        await asyncio.gather(*(pool.parse(batch) for batch in batches))
+        return len(pages) / (time.perf_counter() - start)
+    finally:
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({0, 1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    pages = generate_pages(args.pages)
+    print(f"{os.cpu_count()} cores, {len(pages)} pages, batch size {args.batch_size}")
+    baseline = None
+    for workers in args.workers:
+        rate = asyncio.run(run(pages, workers, args.batch_size))
+        baseline = baseline or rate
+        label = "inline" if workers == 0 else f"{workers} workers"
+        print(f"{label:<12} {rate:10.1f} pages/sec  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Incremental recrawl benchmark against a synthetic shop whose catalogue churns daily.
+
+The shop is crawled in full with `incremental=True`, then refreshed once per simulated
+day (the crawl history is moved back a day in between) while a `--churn` share of its
+products is replaced each day. Reports the pages the last refresh fetched against the
+full crawl, and the recall and precision of its added / removed product delta against
+the shop's actual changes, for the last day and for all refreshes together (a change
+whose listing was not due yet is only picked up a day or more later).
+
+    python -m benchmarks.bench_recrawl --days 3 --churn 0.02
+"""
+import argparse
+import asyncio
+import csv
+import os
+import tempfile
+
+from benchmarks.results import save_result
+from benchmarks.synthetic_shop import SyntheticShop, ShopServer
+from crawl_history import CrawlHistory, DELTA_FIELDS
+from crawler import AsyncCrawler
+from result_writer import CSVSink
+
+DAY = 86400.0
+
+
+def crawl(server: ShopServer, seeds: list[str], workdir: str, day: int, parse_workers: int, max_depth: int,
+          fetch_budget: int) -> tuple[int, list[dict]]:
+    delta_csv = os.path.join(workdir, f"delta-{day}.csv")
+    crawler = AsyncCrawler(output_csv=os.path.join(workdir, f"products-{day}.csv"), fetch_mode="http",
+                           parse_workers=parse_workers, global_fetch_budget=fetch_budget,
+                           state_dir=os.path.join(workdir, "state"), incremental=True,
+                           delta_sinks=[CSVSink(delta_csv, fields=DELTA_FIELDS)])
+    # A local server needs no politeness delay
+    crawler.MIN_REQUEST_DELAY = 0.0
+    asyncio.run(crawler.crawl_multiple_seeds(seeds, max_depth=max_depth))
+    pages = sum(state.fetched for state in crawler.scheduler.domains.values())
+    with open(delta_csv, newline="", encoding="utf-8") as f:
+        return pages, list(csv.DictReader(f))
+
+
+def score(found: set, expected: set) -> tuple[float, float]:
+    recall = len(found & expected) / len(expected) if expected else 1.0
+    precision = len(found & expected) / len(found) if found else 1.0
+    return round(recall, 4), round(precision, 4)
+
+
+def run(args) -> dict:
+    shops = [SyntheticShop(seed=args.seed, products_per_subcategory=args.products, revision=day, churn=args.churn)
+             for day in range(args.days + 1)]
+    server = ShopServer(shops[0]).start()
+    seeds = [f"http://127.0.0.1:{server.port}/", f"http://localhost:{server.port}/"]
+
+    pages, deltas = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for day, shop in enumerate(shops):
+                server.shop = shop
+                if day > 0:
+                    history = CrawlHistory(os.path.join(tmp, "state", "crawl_history.sqlite"))
+                    history.shift(DAY)
+                    history.close()
+                day_pages, delta = crawl(server, seeds, tmp, day, args.parse_workers, args.max_depth,
+                                         args.fetch_budget)
+                pages.append(day_pages)
+                deltas.append(delta)
+        finally:
+            server.close()
+
+    metrics = {
+        "full_crawl_pages": pages[0],
+        "refresh_pages": pages[-1],
+        "refresh_share": round(pages[-1] / pages[0], 3) if pages[0] else 0.0,
+    }
+    for suffix, first in (("", len(shops) - 1), ("_all", 1)):
+        expected = {"added": set(), "removed": set()}
+        for before, after in zip(shops[first - 1:], shops[first:]):
+            for seed in seeds:
+                expected["added"] |= after.product_urls(seed) - before.product_urls(seed)
+                expected["removed"] |= before.product_urls(seed) - after.product_urls(seed)
+        for change in ("added", "removed"):
+            found = {row["product_url"] for delta in deltas[first:] for row in delta if row["change"] == change}
+            recall, precision = score(found, expected[change])
+            metrics[f"{change}_expected{suffix}"] = len(expected[change])
+            metrics[f"{change}_recall{suffix}"] = recall
+            metrics[f"{change}_precision{suffix}"] = precision
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--products", type=int, default=40, help="products per subcategory")
+    parser.add_argument("--days", type=int, default=3, help="daily refreshes after the full crawl")
+    parser.add_argument("--churn", type=float, default=0.02, help="share of products replaced per day")
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=4)
+    parser.add_argument("--fetch-budget", type=int, default=20)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    metrics = run(args)
+    for name, value in metrics.items():
+        print(f"  {name:<24} {value}")
+    if not args.no_save:
+        save_result("recrawl", metrics, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Record / replay benchmark: crawls a synthetic shop over HTTP while recording an archive,
+shuts the shop down and crawls the archive again with fetch_mode="replay". Reports
+pages/sec of both crawls, the archive's size against the bytes it holds, and how many
+of the recorded crawl's products the replay finds.
+
+    python -m benchmarks.bench_replay --products 40 --parse-workers 2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.results import save_result
+from benchmarks.synthetic_shop import SyntheticShop, ShopServer
+from crawler import AsyncCrawler
+
+
+def crawl(seeds: list[str], workdir: str, name: str, fetch_mode: str, archive: str, parse_workers: int,
+          max_depth: int, fetch_budget: int) -> tuple[set, int, float, dict]:
+    crawler = AsyncCrawler(output_csv=os.path.join(workdir, f"{name}.csv"), fetch_mode=fetch_mode,
+                           parse_workers=parse_workers, global_fetch_budget=fetch_budget, archive=archive)
+    # A local server needs no politeness delay
+    crawler.MIN_REQUEST_DELAY = 0.0
+    start = time.perf_counter()
+    collected = asyncio.run(crawler.crawl_multiple_seeds(seeds, max_depth=max_depth))
+    elapsed = time.perf_counter() - start
+    found = {url for rows in collected.values() for _, url in rows}
+    pages = sum(state.fetched for state in crawler.scheduler.domains.values())
+    return found, pages, elapsed, crawler.archive.get_stats()
+
+
+def run(args) -> dict:
+    shop = SyntheticShop(seed=args.seed, products_per_subcategory=args.products)
+    server = ShopServer(shop).start()
+    seeds = [f"http://127.0.0.1:{server.port}/", f"http://localhost:{server.port}/"]
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "crawl.warc.gz")
+        try:
+            recorded, record_pages, record_seconds, written = crawl(
+                seeds, tmp, "record", "http", archive, args.parse_workers, args.max_depth, args.fetch_budget)
+        finally:
+            # The replay must not reach the network
+            server.close()
+        replayed, replay_pages, replay_seconds, read = crawl(
+            seeds, tmp, "replay", "replay", archive, args.parse_workers, args.max_depth, args.fetch_budget)
+        archive_bytes = os.path.getsize(archive)
+
+    return {
+        "record_pages": record_pages,
+        "record_pages_per_sec": round(record_pages / record_seconds, 1) if record_seconds else 0.0,
+        "replay_pages": replay_pages,
+        "replay_pages_per_sec": round(replay_pages / replay_seconds, 1) if replay_seconds else 0.0,
+        "archive_records": written["records"],
+        "archive_mb": round(archive_bytes / 2 ** 20, 2),
+        "archive_compression": round(written["bytes_in"] / archive_bytes, 1) if archive_bytes else 0.0,
+        "replay_misses": read["misses"],
+        "replay_recall": round(len(replayed & recorded) / len(recorded), 4) if recorded else 1.0,
+        "replay_new_products": len(replayed - recorded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--products", type=int, default=40, help="products per subcategory")
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=4)
+    parser.add_argument("--fetch-budget", type=int, default=20)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    metrics = run(args)
+    for name, value in metrics.items():
+        print(f"  {name:<24} {value}")
+    if not args.no_save:
+        save_result("replay", metrics, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Microbenchmark for the URL pattern engine.
+
+Compares the original per-call regex loop against the compiled engine, with and
+without the verdict cache, on a synthetic list of URLs.
+
+    python -m benchmarks.bench_url_patterns --count 1000000
+"""
+import argparse
+import random
+import re
+import time
+import urllib.parse
+
+from product_patterns import DEAD_END_PATTERNS, PRODUCT_URL_PATTERNS
+from product_url_analyser import ENGINE, classify_url, normalize_url, verdict_cache_info
+
+HOSTS = ["https://www.virgio.com", "https://www.tatacliq.com", "https://nykaafashion.com", "https://www.westside.com"]
+PATH_SHAPES = [
+    "/products/{slug}",
+    "/collections/{word}/products/{slug}",
+    "/{slug}-p{id}",
+    "/p/{id}",
+    "/{word}/{word}",
+    "/{word}/c-{id}",
+    "/account/orders",
+    "/help/{word}",
+    "/search?q={word}",
+    "/static/{word}.js",
+    "/images/{slug}.jpg",
+    "/",
+    "/about",
+]
+WORDS = ["men", "women", "kids", "shirts", "dresses", "sale", "new", "tops", "denim", "ethnic", "shoes", "bags"]
+
+
+def generate_urls(count: int, seed: int = 7, repeat_ratio: float = 0.6) -> list[str]:
+    """
+    Deterministic URL list; `repeat_ratio` of the entries are repeats of navigation-like
+    URLs, the way header and footer links repeat across real pages.
+    """
+    rng = random.Random(seed)
+    nav = []
+    for _ in range(500):
+        nav.append(rng.choice(HOSTS) + "/" + rng.choice(WORDS) + "/" + rng.choice(WORDS))
+
+    urls = []
+    for _ in range(count):
+        if rng.random() < repeat_ratio:
+            urls.append(rng.choice(nav))
+            continue
+        shape = rng.choice(PATH_SHAPES)
+        path = shape.format(
+            slug="-".join(rng.choice(WORDS) for _ in range(3)),
+            word=rng.choice(WORDS),
+            id=rng.randint(1000, 9999999),
+        )
+        urls.append(rng.choice(HOSTS) + path)
+    return urls
+
+
+def legacy_verdict(url: str) -> tuple[bool, bool]:
+    """
+    The analyzer logic before the pattern engine: one re.search per pattern per call.
+    """
+    url = url.lower().strip()
+    path = urllib.parse.urlparse(url).path
+
+    dead_end = False
+    if re.search(r'\.(css|js|json|xml|txt|pdf|zip|rar|exe|dmg|pkg)$', path):
+        dead_end = True
+    elif re.search(r'\.(jpg|jpeg|png|gif|svg|ico|webp|mp4|mp3|wav|pdf)$', path):
+        dead_end = True
+    else:
+        for category, patterns in DEAD_END_PATTERNS.items():
+            for pattern in patterns:
+                if re.search(pattern, path) or re.search(pattern, url):
+                    dead_end = True
+                    break
+            if dead_end:
+                break
+    if not dead_end and (re.search(r'/(share|social|follow)', path)
+                         or re.search(r'/(email|newsletter|subscribe)', path)
+                         or re.search(r'/(download|file|attachment|document)', path)):
+        dead_end = True
+    if dead_end:
+        return True, False
+
+    for pattern in PRODUCT_URL_PATTERNS:
+        if re.search(pattern, path):
+            return False, True
+    return False, False
+
+
+def engine_verdict(url: str) -> tuple[bool, bool]:
+    verdict = ENGINE.classify(normalize_url(url))
+    return verdict.is_dead_end, verdict.is_product
+
+
+def cached_verdict(url: str) -> tuple[bool, bool]:
+    verdict = classify_url(url)
+    return verdict.is_dead_end, verdict.is_product
+
+
+def run(name: str, fn, urls: list[str]) -> float:
+    start = time.perf_counter()
+    for url in urls:
+        fn(url)
+    elapsed = time.perf_counter() - start
+    rate = len(urls) / elapsed
+    print(f"{name:<10} {len(urls):>9} urls  {elapsed:8.2f}s  {rate:>12,.0f} urls/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--check", action="store_true", help="verify the engine agrees with the legacy logic")
+    args = parser.parse_args()
+
+    urls = generate_urls(args.count)
+    if args.check:
+        mismatches = [u for u in urls if legacy_verdict(u) != engine_verdict(u)]
+        print(f"verdict mismatches: {len(mismatches)}")
+        for url in mismatches[:10]:
+            print("  ", url, legacy_verdict(url), engine_verdict(url))
+
+    before = run("legacy", legacy_verdict, urls)
+    compiled = run("compiled", engine_verdict, urls)
+    cached = run("cached", cached_verdict, urls)
+    print(f"speedup: compiled {compiled / before:.1f}x, cached {cached / before:.1f}x")
+    print(verdict_cache_info())
+
+
+if __name__ == "__main__":
+    main()
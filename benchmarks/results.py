@@ -0,0 +1,102 @@
+"""
+Saved benchmark results.
+
+Every run appends one JSON line to `benchmarks/results/<benchmark>.jsonl` with the git
+commit, machine details and its metrics. Comparing two runs shows the change per metric:
+
+    python -m benchmarks.results crawl            # latest run against the one before
+    python -m benchmarks.results crawl --base 3f5f7eb
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Metrics where a smaller value is better; everything else is better when larger
+LOWER_IS_BETTER = ("seconds", "rss", "bytes", "_ms", "latency")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_result(benchmark: str, metrics: dict, params: dict = None, results_dir: str = RESULTS_DIR) -> dict:
+    record = {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": params or {},
+        "metrics": metrics,
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, f"{benchmark}.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Saved {benchmark} result for {record['commit']}")
+    return record
+
+
+def load_results(benchmark: str, results_dir: str = RESULTS_DIR) -> list[dict]:
+    path = os.path.join(results_dir, f"{benchmark}.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(base: dict, head: dict, threshold: float = 0.05) -> list[tuple]:
+    """
+    (metric, base value, head value, relative change, regressed) for every numeric metric
+    in both runs. A change worse than `threshold` counts as a regression.
+    """
+    rows = []
+    for name, head_value in head["metrics"].items():
+        base_value = base["metrics"].get(name)
+        if not isinstance(head_value, (int, float)) or not isinstance(base_value, (int, float)):
+            continue
+        change = (head_value - base_value) / base_value if base_value else 0.0
+        worse = change > 0 if any(key in name for key in LOWER_IS_BETTER) else change < 0
+        rows.append((name, base_value, head_value, change, worse and abs(change) > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark")
+    parser.add_argument("--base", help="commit to compare against, default the previous run")
+    parser.add_argument("--threshold", type=float, default=0.05)
+    args = parser.parse_args()
+
+    runs = load_results(args.benchmark)
+    if len(runs) < 2:
+        print(f"Need at least two saved {args.benchmark} runs, found {len(runs)}")
+        return
+    head = runs[-1]
+    if args.base:
+        candidates = [r for r in runs[:-1] if r["commit"].startswith(args.base)]
+        if not candidates:
+            print(f"No {args.benchmark} run saved for commit {args.base}")
+            return
+        base = candidates[-1]
+    else:
+        base = runs[-2]
+
+    print(f"{args.benchmark}: {base['commit']} ({base['time']}) -> {head['commit']} ({head['time']})")
+    for name, base_value, head_value, change, regressed in compare(base, head, args.threshold):
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {name:<32} {base_value:>14.4g} {head_value:>14.4g} {change:>+8.1%}{flag}")
+
+
+if __name__ == "__main__":
+    main()
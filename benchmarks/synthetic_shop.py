@@ -0,0 +1,299 @@
+"""
+Deterministic synthetic e-commerce site for offline benchmarks.
+
+A shop has a home page, a category tree, paginated product listing pages (PLPs),
+product detail pages (PDPs) with a price, one add-to-cart button, a details section and
+related products, plus the account, help, legal, search and static pages a crawler
+should recognise as dead ends. With `sitemaps` it also serves a robots.txt pointing at
+a sitemap index, a plain sitemap of the navigation pages and gzipped product sitemaps
+with lastmod dates. Pages are rendered on request from the shop's seed, so
+the same seed always serves the same site and the set of product URLs is known. A shop
+at `revision` N has had its catalogue churned N times: each time a `churn` share of the
+products is removed (their pages 404) and as many new ones are listed first in their
+subcategory.
+"""
+import gzip
+import hashlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+WORDS = ["cotton", "linen", "denim", "slim", "relaxed", "printed", "striped", "classic", "summer", "oversized",
+         "cropped", "ribbed", "floral", "textured", "washed", "organic"]
+GARMENTS = ["shirt", "tshirt", "dress", "jeans", "kurta", "jacket", "skirt", "trousers", "top", "shorts"]
+CATEGORIES = ["men", "women", "kids", "home", "beauty", "sale", "new", "ethnic"]
+DEAD_END_PATHS = [
+    "/account/login", "/account/register", "/cart", "/wishlist", "/checkout",
+    "/help/shipping", "/help/returns", "/faq", "/contact", "/about",
+    "/terms", "/privacy-policy", "/return-policy", "/blog/style-guide", "/careers",
+    "/search?q=shirt", "/track-order", "/static/app.js", "/static/site.css", "/images/banner.jpg",
+]
+ROBOTS_DISALLOW = ["/account/", "/checkout", "/search"]
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+class SyntheticShop:
+    """
+    `categories` top-level categories with `subcategories` each; every subcategory lists
+    `products_per_subcategory` products, `page_size` per PLP page. Products also link
+    `related` other products, and a share of links carry tracking parameters. Product
+    sitemaps hold up to `sitemap_size` URLs each.
+    """
+
+    def __init__(self, seed: int = 7, categories: int = 4, subcategories: int = 3,
+                 products_per_subcategory: int = 40, page_size: int = 20, related: int = 8,
+                 tracking_ratio: float = 0.2, description_words: int = 150, sitemaps: bool = True,
+                 sitemap_size: int = 1000, revision: int = 0, churn: float = 0.0):
+        self.seed = seed
+        self.sitemaps = sitemaps
+        self.sitemap_size = sitemap_size
+        self.page_size = page_size
+        self.related = related
+        self.tracking_ratio = tracking_ratio
+        self.description_words = description_words
+        rng = random.Random(seed)
+
+        self.tree = {}
+        self.products = {}
+        product_id = 1000
+        for category in CATEGORIES[:categories]:
+            subs = {}
+            for s in range(subcategories):
+                sub = f"{rng.choice(WORDS)}-{rng.choice(GARMENTS)}s-{s}"
+                paths = []
+                for _ in range(products_per_subcategory):
+                    product_id += rng.randint(1, 50)
+                    slug = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{rng.choice(GARMENTS)}"
+                    path = f"/products/{slug}-{product_id}"
+                    self.products[path] = (slug.replace("-", " ").title(), rng.randint(299, 4999))
+                    paths.append(path)
+                subs[sub] = paths
+            self.tree[category] = subs
+        # Related products are drawn from the original catalogue so pages only change with churn
+        self.original_paths = list(self.products)
+
+        self.revision = revision
+        for r in range(1, revision + 1):
+            churn_rng = random.Random(f"{seed}:revision:{r}")
+            count = round(len(self.products) * churn)
+            for path in churn_rng.sample(sorted(self.products), count):
+                del self.products[path]
+                for subs in self.tree.values():
+                    for paths in subs.values():
+                        if path in paths:
+                            paths.remove(path)
+            for _ in range(count):
+                product_id += churn_rng.randint(1, 50)
+                slug = f"{churn_rng.choice(WORDS)}-{churn_rng.choice(WORDS)}-{churn_rng.choice(GARMENTS)}"
+                path = f"/products/{slug}-{product_id}"
+                self.products[path] = (slug.replace("-", " ").title(), churn_rng.randint(299, 4999))
+                category = churn_rng.choice(sorted(self.tree))
+                self.tree[category][churn_rng.choice(sorted(self.tree[category]))].insert(0, path)
+        self.product_paths = list(self.products)
+
+    def product_urls(self, base_url: str) -> set[str]:
+        """
+        Ground truth: every product URL of the shop served at `base_url`.
+        """
+        base_url = base_url.rstrip("/")
+        return {base_url + path for path in self.product_paths}
+
+    def page_count(self) -> int:
+        listing_pages = sum(
+            -(-len(paths) // self.page_size) for subs in self.tree.values() for paths in subs.values()
+        )
+        return 1 + len(self.tree) + listing_pages + len(self.products) + len(DEAD_END_PATHS)
+
+    def __rng(self, path: str) -> random.Random:
+        return random.Random(f"{self.seed}:{path}")
+
+    def __link(self, rng: random.Random, path: str, text: str) -> str:
+        if rng.random() < self.tracking_ratio:
+            path += ("&" if "?" in path else "?") + f"utm_source=nav&utm_medium={rng.choice(WORDS)}"
+        return f'<a href="{path}">{text}</a>'
+
+    def __layout(self, rng: random.Random, title: str, body: str) -> str:
+        nav = "".join(self.__link(rng, f"/c/{c}", c.title()) for c in self.tree)
+        footer = "".join(self.__link(rng, path, path.strip("/").split("/")[-1]) for path in DEAD_END_PATHS)
+        return (
+            f"<!DOCTYPE html><html><head><title>{title}</title>"
+            '<link rel="stylesheet" href="/static/site.css"><script src="/static/app.js"></script></head>'
+            f"<body><header><nav>{nav}</nav></header><main>{body}</main>"
+            f"<footer>{footer}</footer></body></html>"
+        )
+
+    def __home(self, rng) -> str:
+        tiles = "".join(
+            f"<section><h2>{c.title()}</h2>"
+            + "".join(self.__link(rng, f"/c/{c}/{sub}", sub.replace("-", " ")) for sub in subs)
+            + "</section>"
+            for c, subs in self.tree.items()
+        )
+        return self.__layout(rng, "Home", f"<h1>Synthetic Shop</h1>{tiles}")
+
+    def __category(self, rng, category: str) -> str:
+        subs = "".join(
+            f"<li>{self.__link(rng, f'/c/{category}/{sub}', sub.replace('-', ' '))}</li>"
+            for sub in self.tree[category]
+        )
+        return self.__layout(rng, category.title(), f"<h1>{category.title()}</h1><ul>{subs}</ul>")
+
+    def __listing(self, rng, category: str, sub: str, page: int) -> str:
+        paths = self.tree[category][sub]
+        pages = -(-len(paths) // self.page_size)
+        tiles = "".join(
+            f'<li class="tile">{self.__link(rng, path, self.products[path][0])}'
+            f'<img src="/images/{path.rsplit("/", 1)[-1]}.jpg"><span class="price">₹ {self.products[path][1]}</span></li>'
+            for path in paths[(page - 1) * self.page_size:page * self.page_size]
+        )
+        pager = "".join(
+            self.__link(rng, f"/c/{category}/{sub}?page={p}", str(p)) for p in range(1, pages + 1) if p != page
+        )
+        return self.__layout(rng, sub, f"<h1>{sub.replace('-', ' ')}</h1><ul>{tiles}</ul><div>{pager}</div>")
+
+    def __product(self, rng, path: str) -> str:
+        name, price = self.products[path]
+        description = " ".join(rng.choice(WORDS) for _ in range(self.description_words))
+        related = "".join(
+            f"<li>{self.__link(rng, p, self.products[p][0])}</li>"
+            for p in rng.sample(self.original_paths, min(self.related, len(self.original_paths)))
+            if p in self.products
+        )
+        body = (
+            f"<h1>{name}</h1><span class='price'>₹ {price}</span><button>Add to Cart</button>"
+            f"<div><h2>Product Details</h2><p>{description}</p></div>"
+            "<form><input name='pincode'></form>"
+            f"<section><h2>You may also like</h2><ul>{related}</ul></section>"
+        )
+        return self.__layout(rng, name, body)
+
+    def __dead_end(self, rng, path: str) -> str:
+        return self.__layout(rng, path, f"<h1>{path}</h1><p>{' '.join(rng.choice(WORDS) for _ in range(60))}</p>")
+
+    def __robots(self, base: str) -> str:
+        lines = ["User-agent: *"] + [f"Disallow: {path}" for path in ROBOTS_DISALLOW]
+        return "\n".join(lines) + f"\n\nSitemap: {base}/sitemap_index.xml\n"
+
+    def __sitemap_index(self, base: str) -> str:
+        names = ["sitemap-pages.xml"] + [
+            f"sitemap-products-{n}.xml.gz" for n in range(-(-len(self.product_paths) // self.sitemap_size))
+        ]
+        entries = "".join(f"<sitemap><loc>{base}/{name}</loc></sitemap>" for name in names)
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'
+
+    def __urlset(self, base: str, paths: list[str]) -> str:
+        entries = []
+        for path in paths:
+            rng = self.__rng("lastmod:" + path)
+            lastmod = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            entries.append(f"<url><loc>{base}{path}</loc><lastmod>{lastmod}</lastmod></url>")
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{"".join(entries)}</urlset>'
+
+    def __sitemap(self, path: str, base: str):
+        if path == "/robots.txt":
+            return 200, "text/plain", self.__robots(base)
+        if path == "/sitemap_index.xml":
+            return 200, "application/xml", self.__sitemap_index(base)
+        if path == "/sitemap-pages.xml":
+            pages = ["/"] + [f"/c/{c}" for c in self.tree] + [f"/c/{c}/{sub}" for c, subs in self.tree.items()
+                                                             for sub in subs]
+            return 200, "application/xml", self.__urlset(base, pages)
+        if path.startswith("/sitemap-products-") and path.endswith(".xml.gz"):
+            n = int(path[len("/sitemap-products-"):-len(".xml.gz")])
+            paths = self.product_paths[n * self.sitemap_size:(n + 1) * self.sitemap_size]
+            if paths:
+                return 200, "application/gzip", gzip.compress(self.__urlset(base, paths).encode("utf-8"))
+        return None
+
+    def render(self, target: str, host: str = "127.0.0.1"):
+        """
+        (status, content type, body) for a request target such as `/c/men/x?page=2`.
+        `host` is the Host header, used for the absolute URLs in robots.txt and sitemaps.
+        The body is bytes for gzipped sitemaps and text otherwise.
+        """
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/") or "/"
+        rng = self.__rng(path + "?" + parts.query)
+        segments = path.strip("/").split("/")
+
+        if self.sitemaps and (path == "/robots.txt" or path.startswith("/sitemap")):
+            response = self.__sitemap(path, f"http://{host}")
+            if response is not None:
+                return response
+        if path == "/":
+            return 200, "text/html", self.__home(rng)
+        if path in self.products:
+            return 200, "text/html", self.__product(rng, path)
+        if segments[0] == "c" and len(segments) == 2 and segments[1] in self.tree:
+            return 200, "text/html", self.__category(rng, segments[1])
+        if segments[0] == "c" and len(segments) == 3 and segments[2] in self.tree.get(segments[1], {}):
+            page = int(parse_qs(parts.query).get("page", ["1"])[0] or 1)
+            return 200, "text/html", self.__listing(rng, segments[1], segments[2], page)
+        if path.endswith((".js", ".css")):
+            return 200, "text/plain", "/* static */"
+        if path.endswith(".jpg"):
+            return 200, "image/jpeg", "jpeg"
+        if any(path == urlsplit(p).path for p in DEAD_END_PATHS):
+            return 200, "text/html", self.__dead_end(rng, path)
+        return 404, "text/html", "<html><body>Not found</body></html>"
+
+
+class ShopServer:
+    """
+    Serves a SyntheticShop over HTTP on a local port from a background thread. Responses
+    carry an ETag and a matching If-None-Match gets a 304.
+    """
+
+    def __init__(self, shop: SyntheticShop, host: str = "127.0.0.1", port: int = 0):
+        self.shop = shop
+        self.host = host
+        self.port = port
+        self.server = None
+        self.requests = 0
+        self.not_modified = 0
+
+    def start(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                owner.requests += 1
+                status, content_type, body = owner.shop.render(self.path, self.headers.get("Host", owner.host))
+                data = body if isinstance(body, bytes) else body.encode("utf-8")
+                etag = '"' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    owner.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 200:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="shop", daemon=True).start()
+        return self
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
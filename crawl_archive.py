@@ -0,0 +1,214 @@
+import gzip
+import json
+import mmap
+import os
+import threading
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+# Gzip members are read with this window size
+GZIP_WBITS = 31
+SCAN_CHUNK = 64 * 1024
+
+
+@dataclass
+class ArchivedRecord:
+    uri: str
+    record_type: str
+    body: bytes
+    headers: dict = field(default_factory=dict)
+
+    @property
+    def status(self) -> Optional[int]:
+        value = self.headers.get("X-Crawler-Status", "-")
+        return int(value) if value.isdigit() else None
+
+    @property
+    def tier(self) -> Optional[str]:
+        return self.headers.get("X-Crawler-Tier")
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def encode_record(record_type: str, uri: str, body: bytes, fields: dict, compress_level: int = 6) -> bytes:
+    """
+    One WARC/1.1 record as its own gzip member, so records can be read on their own and
+    the whole file still gunzips as one stream.
+    """
+    lines = [
+        "WARC/1.1",
+        f"WARC-Type: {record_type}",
+        f"WARC-Target-URI: {uri}",
+        f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in fields.items())
+    lines.append(f"Content-Length: {len(body)}")
+    record = "\r\n".join(lines).encode("utf-8") + b"\r\n\r\n" + body + b"\r\n\r\n"
+    return gzip.compress(record, compresslevel=compress_level, mtime=0)
+
+
+def decode_record(member: bytes) -> ArchivedRecord:
+    data = zlib.decompress(member, GZIP_WBITS)
+    head_end = data.index(b"\r\n\r\n")
+    headers = {}
+    for line in data[:head_end].decode("utf-8").split("\r\n")[1:]:
+        name, _, value = line.partition(": ")
+        headers[name] = value
+    length = int(headers.get("Content-Length", 0))
+    body = data[head_end + 4:head_end + 4 + length]
+    return ArchivedRecord(headers.get("WARC-Target-URI", ""), headers.get("WARC-Type", ""), body, headers)
+
+
+class ArchiveWriter:
+    """
+    Appends fetched pages, robots.txt files and sitemap URL batches to a WARC-like
+    archive: every record is a WARC/1.1 `resource` (or `metadata`) record in its own gzip
+    member. Next to it, `<path>.idx` gets one line per record (type, offset, length,
+    URI). Recording into an existing archive appends to it. Safe to use from the
+    fetcher threads.
+    """
+
+    def __init__(self, path: str, compress_level: int = 6):
+        self.path = path
+        self.compress_level = compress_level
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.file = open(path, "ab")
+        self.index = open(index_path(path), "a", encoding="utf-8")
+        self.offset = self.file.seek(0, os.SEEK_END)
+        self.stats = {"records": 0, "bytes_in": 0, "bytes_stored": 0}
+
+    def write(self, record_type: str, uri: str, body: bytes, **fields):
+        # Compressed on the calling thread, only the append holds the lock
+        member = encode_record(record_type, uri, body, fields, self.compress_level)
+        with self.lock:
+            self.file.write(member)
+            self.index.write(f"{record_type}\t{self.offset}\t{len(member)}\t{uri}\n")
+            self.offset += len(member)
+            self.stats["records"] += 1
+            self.stats["bytes_in"] += len(body)
+            self.stats["bytes_stored"] += len(member)
+
+    def write_page(self, url: str, html: bytes, status: Optional[int], tier: str):
+        self.write("resource", url, html or b"", **{"Content-Type": "text/html",
+                                                   "X-Crawler-Status": "-" if status is None else status,
+                                                   "X-Crawler-Tier": tier})
+
+    def write_sitemap_batch(self, domain: str, batch: list[tuple[str, str, str]]):
+        body = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in batch).encode("utf-8")
+        self.write("metadata", f"sitemaps:{domain}", body, **{"Content-Type": "application/x-ndjson"})
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return dict(self.stats)
+
+    def close(self):
+        with self.lock:
+            for f in (self.file, self.index):
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+
+class ArchiveReader:
+    """
+    Serves records of an archive written by ArchiveWriter from a read-only memory map,
+    looked up through its index (the last record of a URI wins). The index is rebuilt by
+    scanning the gzip members when it is missing or does not cover the whole archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # uri -> (offset, length); metadata URIs keep every record, in order
+        self.records: dict[str, tuple[int, int]] = {}
+        self.metadata: dict[str, list[tuple[int, int]]] = {}
+        self.lock = threading.Lock()
+        self.stats = {"records": 0, "hits": 0, "misses": 0, "index_rebuilt": False}
+        if not self.__load_index(size):
+            self.records.clear()
+            self.metadata.clear()
+            self.__scan()
+            self.stats["index_rebuilt"] = True
+        self.stats["records"] = len(self.records) + sum(len(v) for v in self.metadata.values())
+
+    def __add(self, record_type: str, offset: int, length: int, uri: str):
+        if record_type == "metadata":
+            self.metadata.setdefault(uri, []).append((offset, length))
+        else:
+            self.records[uri] = (offset, length)
+
+    def __load_index(self, size: int) -> bool:
+        end = 0
+        try:
+            with open(index_path(self.path), encoding="utf-8") as f:
+                for line in f:
+                    record_type, offset, length, uri = line.rstrip("\n").split("\t", 3)
+                    offset, length = int(offset), int(length)
+                    self.__add(record_type, offset, length, uri)
+                    end = max(end, offset + length)
+        except (OSError, ValueError):
+            return False
+        return end == size
+
+    def __scan(self):
+        """
+        Find the record boundaries by inflating one gzip member after another.
+        """
+        offset, size = 0, len(self.map)
+        while offset < size:
+            inflater = zlib.decompressobj(GZIP_WBITS)
+            position, head = offset, b""
+            while not inflater.eof and position < size:
+                chunk = self.map[position:position + SCAN_CHUNK]
+                position += len(chunk)
+                data = inflater.decompress(chunk)
+                # Only the header block is kept of the record
+                if b"\r\n\r\n" not in head:
+                    head += data
+            if not inflater.eof:
+                break
+            length = position - len(inflater.unused_data) - offset
+            headers = dict(line.partition(": ")[::2] for line in
+                           head.split(b"\r\n\r\n", 1)[0].decode("utf-8", "replace").split("\r\n")[1:])
+            self.__add(headers.get("WARC-Type", ""), offset, length, headers.get("WARC-Target-URI", ""))
+            offset += length
+
+    def __read(self, offset: int, length: int) -> ArchivedRecord:
+        return decode_record(self.map[offset:offset + length])
+
+    def get(self, uri: str) -> Optional[ArchivedRecord]:
+        location = self.records.get(uri)
+        with self.lock:
+            self.stats["hits" if location is not None else "misses"] += 1
+        return self.__read(*location) if location is not None else None
+
+    def sitemap_batches(self, domain: str) -> Iterator[list[tuple[str, str, str]]]:
+        for location in self.metadata.get(f"sitemaps:{domain}", ()):
+            body = self.__read(*location).body
+            yield [tuple(json.loads(line)) for line in body.decode("utf-8").splitlines() if line]
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return dict(self.stats)
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
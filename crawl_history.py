@@ -0,0 +1,268 @@
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+from typing import Iterator
+from seen_set import FingerprintSet, url_fingerprint
+
+# Columns of the product delta stream an incremental crawl writes
+DELTA_FIELDS = ("seed_domain", "product_url", "change", "reason", "detected_at")
+
+
+def _signed(fingerprint: int) -> int:
+    # SQLite integers are signed 64-bit
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+class CrawlHistory:
+    """
+    What earlier crawls saw of each URL, kept in a SQLite database (WAL mode) to drive
+    incremental recrawls.
+
+    Every fetch is recorded with a hash of the body. A URL's change rate is estimated as
+    (changes + 1) / (observed seconds + `prior_interval`): one change per prior interval
+    until visits say otherwise. Its next visit is due 1 / rate seconds after the last,
+    kept between `min_interval` and `max_interval`. Pages are remembered as products,
+    listings (pages that link to products) or other pages. A listing keeps the product
+    links it had, to spot products that drop off it, and a count of the new product
+    links it surfaced. A product page is only revisited to check that it still exists,
+    so its content changing (prices, recommendations) does not count as a change, and
+    products taken from a trusted template without a fetch wait `max_interval`.
+    """
+
+    def __init__(self, path: str, min_interval: float = 3600.0, max_interval: float = 30 * 86400.0,
+                 prior_interval: float = 86400.0, checkpoint_every: int = 500):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.prior_interval = prior_interval
+        self.checkpoint_every = checkpoint_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                fingerprint INTEGER NOT NULL,
+                domain TEXT NOT NULL,
+                kind TEXT NOT NULL DEFAULT 'page',
+                depth INTEGER NOT NULL,
+                content_hash BLOB,
+                first_seen REAL NOT NULL,
+                last_visited REAL,
+                last_changed REAL,
+                visits INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                observed_seconds REAL NOT NULL DEFAULT 0,
+                new_products INTEGER NOT NULL DEFAULT 0,
+                product_links BLOB,
+                next_visit REAL NOT NULL,
+                gone INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS pages_due ON pages (domain, next_visit);
+            CREATE INDEX IF NOT EXISTS pages_fingerprint ON pages (fingerprint);
+        """)
+        self.db.commit()
+        self.run_started = time.time()
+        # URLs known before this run, and the live products (found in any run, not removed)
+        self.known = FingerprintSet()
+        self.products = FingerprintSet()
+        self.removed = set()
+        self.pending_ops = 0
+        self.stats = {"known": 0, "due": 0, "not_due": 0, "fetched": 0, "changed": 0, "new_product_links": 0,
+                      "verifications": 0, "added": 0, "removed": 0}
+
+    def __touch(self):
+        self.pending_ops += 1
+        if self.pending_ops >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.db.commit()
+        self.pending_ops = 0
+
+    def __interval(self, changes: int, observed_seconds: float) -> float:
+        interval = (observed_seconds + self.prior_interval) / (changes + 1)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def load(self, domain: str) -> int:
+        """
+        Remember which URLs and live products of `domain` earlier runs saw. Returns the
+        number of known URLs.
+        """
+        count = 0
+        for fingerprint, kind, gone in self.db.execute(
+                "SELECT fingerprint, kind, gone FROM pages WHERE domain = ?", (domain,)):
+            fingerprint &= (1 << 64) - 1
+            self.known.add(fingerprint)
+            if kind == "product" and not gone:
+                self.products.add(fingerprint)
+            count += 1
+        self.stats["known"] += count
+        return count
+
+    def due(self, domain: str, now: float = None) -> list[tuple[str, int, str, float]]:
+        """
+        (url, depth, kind, product yield) of the domain's URLs due for a visit, where the
+        yield is the average number of new product links a visit surfaced.
+        """
+        now = time.time() if now is None else now
+        rows = self.db.execute(
+            "SELECT url, depth, kind, new_products, visits FROM pages "
+            "WHERE domain = ? AND next_visit <= ? AND gone = 0",
+            (domain, now),
+        ).fetchall()
+        self.stats["due"] += len(rows)
+        return [(url, depth, kind, new_products / visits if visits else 0.0)
+                for url, depth, kind, new_products, visits in rows]
+
+    def not_due(self, domain: str, now: float = None, exclude: str = None) -> Iterator[str]:
+        """
+        The domain's known URLs that need no visit yet (or are gone), except `exclude`.
+        """
+        now = time.time() if now is None else now
+        cursor = self.db.execute(
+            "SELECT url FROM pages WHERE domain = ? AND (next_visit > ? OR gone = 1)", (domain, now)
+        )
+        for (url,) in cursor:
+            if url != exclude:
+                self.stats["not_due"] += 1
+                yield url
+
+    def is_product(self, url: str) -> bool:
+        fingerprint = url_fingerprint(url)
+        return fingerprint in self.products and fingerprint not in self.removed
+
+    def record_fetch(self, url: str, domain: str, depth: int, body: bytes, now: float = None) -> bool:
+        """
+        Record a successful fetch and schedule the next one. Returns whether the body
+        changed since the last visit.
+        """
+        now = time.time() if now is None else now
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        self.stats["fetched"] += 1
+        row = self.db.execute(
+            "SELECT content_hash, last_visited, changes, observed_seconds, kind FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            self.db.execute(
+                "INSERT INTO pages (url, fingerprint, domain, depth, content_hash, first_seen, last_visited, "
+                "last_changed, visits, next_visit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)",
+                (url, _signed(url_fingerprint(url)), domain, depth, digest, now, now, now,
+                 now + self.__interval(0, 0.0)),
+            )
+            self.__touch()
+            return True
+
+        content_hash, last_visited, changes, observed_seconds, kind = row
+        changed = content_hash != digest
+        if last_visited is not None:
+            observed_seconds += max(0.0, now - last_visited)
+        if changed and content_hash is not None and kind != "product":
+            changes += 1
+            self.stats["changed"] += 1
+        self.db.execute(
+            "UPDATE pages SET depth = MIN(depth, ?), content_hash = ?, last_visited = ?, "
+            "last_changed = CASE WHEN ? THEN ? ELSE last_changed END, visits = visits + 1, changes = ?, "
+            "observed_seconds = ?, next_visit = ?, gone = 0 WHERE url = ?",
+            (depth, digest, now, changed, now, changes, observed_seconds,
+             now + self.__interval(changes, observed_seconds), url),
+        )
+        self.__touch()
+        return changed
+
+    def record_page(self, url: str, is_product: bool, product_links: set) -> list[str]:
+        """
+        Record what a fetched page turned out to be and the product links on it. Returns
+        products that an earlier visit saw linked here, are missing now and were not
+        visited in this run, so they can be checked.
+        """
+        fingerprints = array("q", sorted(_signed(url_fingerprint(link)) for link in product_links))
+        new_links = sum(1 for fingerprint in fingerprints if fingerprint & ((1 << 64) - 1) not in self.known)
+        self.stats["new_product_links"] += new_links
+        row = self.db.execute("SELECT product_links FROM pages WHERE url = ?", (url,)).fetchone()
+        kind = "product" if is_product else "listing" if product_links else "page"
+        self.db.execute(
+            "UPDATE pages SET kind = ?, new_products = new_products + ?, product_links = ? WHERE url = ?",
+            (kind, new_links, fingerprints.tobytes() if product_links else None, url),
+        )
+        self.__touch()
+        if row is None or row[0] is None:
+            return []
+
+        previous = array("q")
+        previous.frombytes(row[0])
+        dropped = list(set(previous) - set(fingerprints))
+        if not dropped:
+            return []
+        placeholders = ",".join("?" * len(dropped))
+        missing = [url for (url,) in self.db.execute(
+            f"SELECT url FROM pages WHERE fingerprint IN ({placeholders}) AND kind = 'product' AND gone = 0 "
+            "AND (last_visited IS NULL OR last_visited < ?)",
+            (*dropped, self.run_started),
+        )]
+        self.stats["verifications"] += len(missing)
+        return missing
+
+    def record_product(self, url: str, domain: str, depth: int, now: float = None) -> bool:
+        """
+        Mark a URL as a live product, whether fetched or taken from a trusted template.
+        Returns True if it was not a live product before, i.e. it was added.
+        """
+        now = time.time() if now is None else now
+        added = not self.is_product(url)
+        fingerprint = url_fingerprint(url)
+        self.db.execute(
+            "INSERT OR IGNORE INTO pages (url, fingerprint, domain, depth, first_seen, next_visit) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (url, _signed(fingerprint), domain, depth, now, now + self.max_interval),
+        )
+        self.db.execute("UPDATE pages SET kind = 'product', gone = 0 WHERE url = ?", (url,))
+        self.__touch()
+        self.products.add(fingerprint)
+        self.removed.discard(fingerprint)
+        if added:
+            self.stats["added"] += 1
+        return added
+
+    def remove(self, url: str, gone: bool, now: float = None) -> bool:
+        """
+        Record that a URL is gone (404 / 410) or is no longer a product page. Returns
+        True if it was a live product, i.e. a product was removed.
+        """
+        now = time.time() if now is None else now
+        removed = self.is_product(url)
+        if gone:
+            self.db.execute("UPDATE pages SET gone = 1, last_visited = ?, next_visit = ? WHERE url = ?",
+                            (now, now + self.max_interval, url))
+        elif removed:
+            self.db.execute("UPDATE pages SET kind = 'page' WHERE url = ?", (url,))
+        self.__touch()
+        if removed:
+            self.removed.add(url_fingerprint(url))
+            self.stats["removed"] += 1
+        return removed
+
+    def shift(self, seconds: float):
+        """
+        Move every timestamp back by `seconds`, as if the earlier crawls happened that
+        much earlier (for benchmarks and tests).
+        """
+        self.db.execute(
+            "UPDATE pages SET first_seen = first_seen - ?, last_visited = last_visited - ?, "
+            "last_changed = last_changed - ?, next_visit = next_visit - ?",
+            (seconds, seconds, seconds, seconds),
+        )
+        self.db.commit()
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
+
+    def close(self):
+        self.checkpoint()
+        self.db.close()
@@ -0,0 +1,200 @@
+import asyncio
+from collections import deque
+from urllib.parse import urlparse
+from host_controller import HostController
+from metrics import REGISTRY
+from sitemap_discovery import RobotsRules
+from template_learner import TemplateLearner
+from url_frontier import URLFrontier
+from work_tracker import WorkTracker
+
+# Callback gauges registered for every domain while it is crawled
+DOMAIN_GAUGES = ("frontier_depth", "tracker_outstanding", "fetches_in_flight", "host_concurrency_limit")
+
+
+class DomainState:
+    """
+    Everything the crawl keeps per seed domain: its frontier, work tracker, politeness
+    limits, concurrency controller and the product URLs collected so far. With robots.txt
+    rules the frontier drops disallowed URLs and a longer Crawl-delay replaces `min_delay`.
+    `failed` is set once the controller gave up on the host and its frontier was dropped.
+    """
+
+    def __init__(self, seed_url: str, max_depth: int = 3, max_in_flight: int = 5, min_delay: float = 0.0,
+                 store=None, controller: HostController = None, templates: TemplateLearner = None,
+                 robots: RobotsRules = None, max_frontier_size: int = None):
+        self.seed_url = seed_url
+        self.domain = urlparse(seed_url).netloc
+        self.tracker = WorkTracker()
+        self.templates = templates
+        self.robots = robots
+        self.frontier = URLFrontier(seed_url=seed_url, max_depth=max_depth, tracker=self.tracker, store=store,
+                                    templates=templates, robots=robots, max_size=max_frontier_size)
+        # Adaptive in-flight limit, starting at max_in_flight
+        self.controller = controller or HostController(initial_limit=max_in_flight)
+        self.min_delay = max(min_delay, robots.crawl_delay) if robots is not None else min_delay
+        self.in_flight = 0
+        self.next_allowed = 0.0
+        self.finished = False
+        self.failed = False
+        self.fetched = 0
+        # Not kept while the crawl streams its results
+        self.collected: list[tuple[str, str]] = []
+        self.products = 0
+
+    def has_capacity(self, now: float) -> bool:
+        return (not self.finished and not self.frontier.is_empty()
+                and self.controller.can_send(self.in_flight, now))
+
+    def ready_at(self) -> float:
+        return max(self.next_allowed, self.controller.open_until)
+
+
+class CrawlScheduler:
+    """
+    Hands out URLs from many domain frontiers to a shared set of fetcher workers.
+
+    The number of workers is the global fetch budget. Each domain is limited by its
+    HostController's adaptive in-flight limit and circuit breaker and by `min_delay`
+    seconds between fetch starts, and domains are visited round-robin so idle capacity
+    moves to whichever has work. A domain whose controller gives up has its queued URLs
+    dropped, so it finishes (as failed) without holding up the other domains.
+    """
+
+    def __init__(self):
+        self.domains: dict[str, DomainState] = {}
+        self.rotation = deque()
+        self.condition = asyncio.Condition()
+        self.closed = False
+
+    def add_domain(self, state: DomainState):
+        self.domains[state.domain] = state
+        self.rotation.append(state)
+        self.__register_gauges(state)
+
+    @staticmethod
+    def __register_gauges(state: DomainState):
+        labels = {"domain": state.domain}
+        REGISTRY.gauge("frontier_depth", "URLs queued in a domain's frontier", labels, fn=lambda: len(state.frontier.store))
+        REGISTRY.gauge("tracker_outstanding", "Pages a domain still has to finish", labels, fn=lambda: state.tracker.count)
+        REGISTRY.gauge("fetches_in_flight", "Fetches in flight per domain", labels, fn=lambda: state.in_flight)
+        REGISTRY.gauge("host_concurrency_limit", "Adaptive in-flight limit per domain", labels,
+                       fn=lambda: round(state.controller.limit, 2))
+
+    @staticmethod
+    def unregister_gauges(state: DomainState):
+        """
+        Drop the domain's gauges, whose callbacks would keep its state alive.
+        """
+        for name in DOMAIN_GAUGES:
+            REGISTRY.remove(name, {"domain": state.domain})
+
+    def __pick(self, now: float):
+        """
+        Pop the next URL from the first domain in rotation order that may fetch now.
+        Returns the pick, or the earliest time a throttled domain becomes available.
+        """
+        soonest = None
+        for _ in range(len(self.rotation)):
+            state = self.rotation[0]
+            self.rotation.rotate(-1)
+            ready_at = state.ready_at()
+            if now < ready_at:
+                if not state.finished and not state.frontier.is_empty():
+                    soonest = ready_at if soonest is None else min(soonest, ready_at)
+                continue
+            if not state.has_capacity(now):
+                continue
+            entry = state.frontier.pop_nowait()
+            if entry is None:
+                continue
+            state.in_flight += 1
+            state.controller.on_send(now)
+            state.next_allowed = now + state.min_delay
+            return (state, *entry, now), None
+        return None, soonest
+
+    async def next_request(self) -> tuple[DomainState, str, int, float]:
+        """
+        Wait for the next fetch. Returns the domain, URL, depth and the scheduler time it
+        was handed out, which goes back to release().
+        """
+        loop = asyncio.get_event_loop()
+        async with self.condition:
+            while True:
+                if self.closed:
+                    raise StopAsyncIteration
+                pick, soonest = self.__pick(loop.time())
+                if pick is not None:
+                    return pick
+                timeout = None if soonest is None else max(0.0, soonest - loop.time())
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, state: DomainState, started_at: float = None, status=None, latency: float = None):
+        """
+        Return a fetch slot and feed the outcome to the domain's controller. A status of
+        None means the fetch failed without a response; without `started_at` no fetch was
+        made and nothing is recorded.
+        """
+        async with self.condition:
+            state.in_flight -= 1
+            state.fetched += 1
+            if started_at is not None:
+                state.controller.record(status, latency, started_at, asyncio.get_event_loop().time())
+                if state.controller.gave_up and not state.failed:
+                    await self.__drop_domain(state)
+            self.condition.notify_all()
+
+    async def __drop_domain(self, state: DomainState):
+        state.failed = True
+        dropped = await state.frontier.drop()
+        print(f"Giving up on {state.domain} after {state.controller.consecutive_trips} breaker trips, "
+              f"dropped {dropped} queued URLs")
+
+    async def cancel(self, state: DomainState, started_at: float):
+        """
+        Return a slot that was handed out but used for no fetch. Its politeness delay is
+        given back too, unless another fetch on the domain has started since.
+        """
+        async with self.condition:
+            state.in_flight -= 1
+            if state.next_allowed == started_at + state.min_delay:
+                state.next_allowed = started_at
+            self.condition.notify_all()
+
+    async def notify(self):
+        async with self.condition:
+            self.condition.notify_all()
+
+    def get_host_stats(self) -> dict[str, dict]:
+        """
+        Current concurrency limit, breaker state and latency percentiles per domain.
+        """
+        return {domain: dict(state.controller.get_stats(), in_flight=state.in_flight, failed=state.failed)
+                for domain, state in self.domains.items()}
+
+    async def finish_domain(self, state: DomainState):
+        async with self.condition:
+            state.finished = True
+            if state in self.rotation:
+                self.rotation.remove(state)
+            if all(s.finished for s in self.domains.values()):
+                self.closed = True
+            self.condition.notify_all()
+        self.unregister_gauges(state)
+        await state.frontier.finish()
+
+    async def watch_domain(self, state: DomainState):
+        """
+        Mark a domain finished once its tracker reports no outstanding work.
+        """
+        await state.tracker.wait()
+        outcome = "Gave up on" if state.failed else "All work finished for"
+        print(f"{outcome} {state.domain}, {state.products} product URLs, "
+              f"frontier {state.frontier.get_stats()}, host {state.controller.get_stats()}")
+        if state.templates is not None:
+            print(f"URL templates for {state.domain}: {state.templates.get_stats()}")
+        await self.finish_domain(state)
@@ -1,108 +1,693 @@
 import asyncio
-import csv
+import functools
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator
 from urllib.parse import urlparse
-import aiofiles
 from async_fetcher import AsyncFetcher
-from html_parser import HTMLParser
-from url_frontier import URLFrontier
-from logger_config import setup_logger
-from threading import Lock
-from work_tracker import WorkTracker
+from crawl_archive import ArchiveReader, ArchiveWriter
+from crawl_history import CrawlHistory, DELTA_FIELDS
+from crawl_scheduler import CrawlScheduler, DomainState
+from driver_pool import ChromeDriverPool
+from frontier_store import SQLiteFrontierStore
+from host_controller import HostController
+from metrics import REGISTRY, MetricsServer, write_snapshots
+from near_duplicates import NearDuplicateIndex
+from page_cache import PageCache
+from page_queue import PageQueue, MemoryGuard, peak_rss, current_rss
+from product_url_analyser import is_product_url
+from parse_pool import ParsePool
+from render_profile import RenderProfile
+from result_writer import ResultWriter, ResultStream, CSVSink
+from sitemap_discovery import SitemapDiscovery
+from template_learner import TemplateLearner
+from vector_classifier import load_model
+from url_canonicalizer import URLCanonicalizer, CanonicalizationRules
+from logger_config import setup_logger, ExplanationSampler
+
+PARSE_BATCH_SECONDS = REGISTRY.histogram("parse_batch_seconds", "Parse pool round trip for one batch")
+PARSE_SECONDS = REGISTRY.histogram("parse_seconds", "HTML parsing and link extraction per page")
+CLASSIFY_SECONDS = REGISTRY.histogram("classify_seconds", "Product page classification per page")
+PARSE_ERRORS = REGISTRY.counter("parse_errors_total", "Pages that failed to parse")
+PRODUCTS_FOUND = REGISTRY.counter("products_found_total", "Product URLs found, before output deduplication")
+TEMPLATE_PRODUCTS = REGISTRY.counter("template_products_total", "Product URLs taken from a trusted template unfetched")
+SITEMAP_URLS = REGISTRY.counter("sitemap_urls_total", "Same-domain page URLs read from sitemaps")
+RECRAWL_SKIPPED = REGISTRY.counter("recrawl_skipped_urls_total", "Known URLs an incremental crawl did not revisit")
+NEAR_DUPLICATES = REGISTRY.counter("near_duplicate_pages_total", "Pages that reused a near duplicate's verdict and links")
+
 
 class AsyncCrawler:
+    # Fetches in flight across all domains
+    GLOBAL_FETCH_BUDGET = 20
+    # Fetches in flight per domain to start with, adapted between the bounds below
     CONCURRENT_FETCHERS = 5
+    MIN_FETCHERS_PER_DOMAIN = 1
+    MAX_FETCHERS_PER_DOMAIN = 20
+    # Fetches slower than this (seconds) stop a domain's limit from growing
+    FETCH_LATENCY_TARGET = 10.0
+    # Consecutive failures that pause a domain, and the initial pause in seconds
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_COOLDOWN = 30.0
+    # Breaker trips without a success in between before a domain is dropped as failed
+    BREAKER_MAX_TRIPS = 5
+    # Seconds between two fetch starts on the same domain
+    MIN_REQUEST_DELAY = 0.5
+    MAX_PAGES_PER_DRIVER = 50
+    WARM_UP_DRIVERS = False
+    PARSE_BATCH_SIZE = 8
+    # Batches scored by a vector classifier model can be larger, one matrix product each
+    VECTOR_PARSE_BATCH_SIZE = 64
+    # Fetched pages waiting for the parsers may take up this many bytes before fetchers
+    # wait; optionally kept zlib-compressed while they wait
+    HTML_QUEUE_MAX_BYTES = 64 * 1024 * 1024
+    COMPRESS_QUEUED_PAGES = False
+    # Fetched pages are held back while the crawler's RSS is above this many MB
+    MEMORY_CEILING_MB = 2048
+    # Seconds between commits of a persisted frontier
+    FRONTIER_CHECKPOINT_INTERVAL = 5.0
+    # Product rows are written in batches of this size, or at least this often
+    OUTPUT_BATCH_SIZE = 500
+    OUTPUT_FLUSH_INTERVAL = 1.0
+    # URL templates are trusted as products after this many classified pages at this
+    # precision; a share of their URLs is still fetched to verify them
+    LEARN_URL_TEMPLATES = True
+    TEMPLATE_MIN_SAMPLES = 20
+    TEMPLATE_TRUST_PRECISION = 0.95
+    TEMPLATE_VERIFY_RATE = 0.05
+    # Seconds between JSON metrics snapshots when metrics_file is set
+    METRICS_SNAPSHOT_INTERVAL = 10.0
+    # robots.txt disallow rules and Crawl-delay are honoured, and the sitemaps it lists
+    # (or /sitemap.xml) seed the frontier in batches alongside the link crawl
+    RESPECT_ROBOTS_TXT = True
+    # robots.txt files fetched at once before the crawl starts
+    ROBOTS_FETCH_CONCURRENCY = 32
+    DISCOVER_SITEMAPS = True
+    SITEMAP_BATCH_SIZE = 500
+    # Sitemap URLs queue behind linked pages of the same kind, so URL templates are
+    # usually learned from the link crawl before the bulk of the sitemap is fetched
+    SITEMAP_PRIORITY_OFFSET = 5
+    MAX_SITEMAPS_PER_DOMAIN = 500
+    MAX_SITEMAP_URLS_PER_DOMAIN = 1_000_000
+    # Queued URLs per domain; past this the lowest-value URLs are evicted from the frontier
+    MAX_FRONTIER_SIZE = 1_000_000
+    # With cache_dir set, cached pages younger than this are used without a request;
+    # older ones are revalidated with ETag / Last-Modified where the fetch tier allows it
+    PAGE_CACHE_FRESH_SECONDS = 0.0
+    # Pages within this many SimHash bits of an already parsed page reuse its verdict (their
+    # links are still their own); each parse worker remembers up to NEAR_DUPLICATE_CAPACITY pages
+    SKIP_NEAR_DUPLICATES = True
+    NEAR_DUPLICATE_DISTANCE = 3
+    NEAR_DUPLICATE_CAPACITY = 20_000
+    # Incremental crawls revisit a known URL after about 1 / its change rate, within these
+    # bounds (seconds); a URL seen once counts as changing once per RECRAWL_PRIOR_INTERVAL
+    RECRAWL_MIN_INTERVAL = 3600.0
+    RECRAWL_MAX_INTERVAL = 30 * 86400.0
+    RECRAWL_PRIOR_INTERVAL = 86400.0
+    # Due listing pages move forward by up to this much priority, in proportion to the
+    # new product links a visit used to surface (full boost at one per visit)
+    RECRAWL_LISTING_BOOST = 10.0
+    # Product records stream() holds for a slow consumer before the parsers wait on it
+    STREAM_BUFFER_SIZE = 1000
+    # Log records are written by a background thread, as JSON lines when LOG_STRUCTURED.
+    # Classifier explanations are built for every page at DEBUG, otherwise for a share
+    # EXPLAIN_SAMPLE_RATE of each domain's pages (explain_sample_rates per domain)
+    LOG_FILE = "crawler.log"
+    LOG_LEVEL = "INFO"
+    LOG_STRUCTURED = False
+    EXPLAIN_SAMPLE_RATE = 0.0
+    # While an archive is recorded, products of trusted templates are still fetched, so a
+    # replay or a classifier run over the archive has every page the crawl reached
+    RECORD_TEMPLATE_PRODUCTS = True
 
-    def __init__(self, output_csv: str = "product_urls.csv"):
-        self.html_queue = asyncio.Queue()
+    def __init__(self, output_csv: str = "product_urls.csv", driver_pool_size: int = None,
+                 fetch_mode: str = "tiered", parse_workers: int = None, global_fetch_budget: int = None,
+                 state_dir: str = None, resume: bool = False,
+                 canonical_rules: dict[str, CanonicalizationRules] = None, sinks: list = None,
+                 metrics_port: int = None, metrics_file: str = None, classifier_model: str = None,
+                 render_profile: RenderProfile = None, cache_dir: str = None, incremental: bool = False,
+                 delta_sinks: list = None, explain_sample_rates: dict[str, float] = None, archive: str = None):
+        self.html_queue = PageQueue(max_bytes=self.HTML_QUEUE_MAX_BYTES, compress=self.COMPRESS_QUEUED_PAGES)
+        self.driver_pool_size = driver_pool_size or self.CONCURRENT_FETCHERS
+        self.driver_pool = None
+        # Resource blocking and readiness for Chrome, the lightweight profile by default
+        self.render_profile = render_profile
+        self.fetch_mode = fetch_mode
+        if fetch_mode == "replay" and archive is None:
+            raise ValueError("fetch_mode='replay' needs the archive to replay")
+        # Live crawls record every page, robots.txt and sitemap batch to this archive;
+        # fetch_mode="replay" crawls it instead of the network
+        self.archive_path = archive
+        self.archive = None
+        self.fetcher = None
+        self.global_fetch_budget = global_fetch_budget or self.GLOBAL_FETCH_BUDGET
+        self.scheduler = None
+        # Per-domain URL canonicalization, applied to seeds and to every extracted link
+        self.canonicalizer = URLCanonicalizer(domain_rules=canonical_rules)
+        # Weight file (or directory of versioned weight files) of a vector classifier
+        model = load_model(classifier_model) if classifier_model else None
+        near_duplicates = None
+        if self.SKIP_NEAR_DUPLICATES:
+            near_duplicates = NearDuplicateIndex(max_distance=self.NEAR_DUPLICATE_DISTANCE,
+                                                 capacity=self.NEAR_DUPLICATE_CAPACITY)
+        sampler = ExplanationSampler(self.EXPLAIN_SAMPLE_RATE, explain_sample_rates)
+        self.parse_pool = ParsePool(workers=parse_workers,
+                                    batch_size=self.VECTOR_PARSE_BATCH_SIZE if model else self.PARSE_BATCH_SIZE,
+                                    canonicalizer=self.canonicalizer, model=model, near_duplicates=near_duplicates,
+                                    sampler=sampler)
         self.logger = None
-        self.tracker = None
-        self.outputLock = None
         self.output_csv = output_csv
-        # Write header to output file
-        with open(self.output_csv, mode="w", newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["seed_domain", "product_url"])
-
-    async def __parser_worker(self, seed_domain: str, frontier: URLFrontier, collected: list[tuple[str, str]]):
-        print(f"Parser worker started for domain {seed_domain}")
-        html_parser = HTMLParser()
-        while True:
-            item = await self.html_queue.get()
+        self.discovery = None
+        # Fetched pages are kept under cache_dir and revalidated on the next crawl
+        self.cache_dir = cache_dir
+        self.page_cache = None
+        # Frontiers are persisted under state_dir when it is set, and picked up again with resume
+        self.state_dir = state_dir
+        self.resume = resume and state_dir is not None
+        # A resumed crawl keeps appending to the previous output
+        self.sinks = sinks or [CSVSink(output_csv, append=self.resume)]
+        self.result_writer = None
+        # Set while stream() runs: products go to its consumer and are not collected
+        self.result_stream = None
+        self.domains_task = None
+        # Incremental crawls keep a history under state_dir, only revisit URLs that are due
+        # and stream added and removed products to the delta sinks
+        self.incremental = incremental and state_dir is not None
+        self.history = None
+        self.delta_sinks = delta_sinks or [
+            CSVSink(os.path.splitext(output_csv)[0] + "_delta.csv", fields=DELTA_FIELDS, append=True)
+        ]
+        self.delta_writer = None
+        # Prometheus text is served on metrics_port, JSON snapshots go to metrics_file
+        self.metrics_port = metrics_port
+        self.metrics_file = metrics_file
+        REGISTRY.gauge("html_queue_depth", "Fetched pages waiting to be parsed", fn=self.html_queue.qsize)
+        REGISTRY.gauge("html_queue_bytes", "Bytes of fetched pages waiting to be parsed",
+                       fn=lambda: self.html_queue.bytes)
+        REGISTRY.gauge("process_rss_bytes", "Resident set size of the crawler process", fn=current_rss)
+
+    async def __next_parse_batch(self) -> tuple[list, bool]:
+        """
+        Wait for one page and then take whatever else is already queued, up to the batch
+        size. Returns the batch and whether a stop sentinel was seen.
+        """
+        item = await self.html_queue.get()
+        if item is None:
+            self.html_queue.task_done()
+            return [], True
+
+        batch = [item]
+        while len(batch) < self.parse_pool.batch_size:
+            try:
+                item = self.html_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
             if item is None:
                 self.html_queue.task_done()
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def __parser_worker(self):
+        print("Parser worker started")
+        while True:
+            batch, stop = await self.__next_parse_batch()
+            if batch:
+                await self.__handle_parse_batch(batch)
+            if stop:
                 break
+
+    async def __handle_parse_batch(self, batch: list):
+        start = time.perf_counter()
+        try:
+            results = await self.parse_pool.parse([(url, html, state.domain) for html, state, url, depth in batch],
+                                                  compressed=self.html_queue.compress)
+            PARSE_BATCH_SECONDS.observe(time.perf_counter() - start)
+        except Exception as e:
+            self.logger.info("Parse batch of %d pages failed: %r", len(batch), e)
+            results = [None] * len(batch)
+
+        for (html, state, url, depth), result in zip(batch, results):
             try:
-                url, html, depth = item
-                child_urls, product_urls = html_parser.parse_html(url, html, seed_domain)
+                if result is None:
+                    continue
+                if "error" in result:
+                    PARSE_ERRORS.inc()
+                    self.logger.info("Failed to parse %s: %s", url, result["error"],
+                                     extra={"fields": {"url": url, "domain": state.domain, "error": result["error"]}})
+                else:
+                    PARSE_SECONDS.observe(result["timings"]["parse"])
+                    CLASSIFY_SECONDS.observe(result["timings"]["classify"])
+                    if "duplicate_of" in result:
+                        NEAR_DUPLICATES.inc()
+                    if state.templates is not None:
+                        state.templates.record(url, result["is_product_page"], result["child_urls"])
+                    if self.history is not None:
+                        await self.__record_history(state, url, depth, result)
+                child_urls, product_urls = result["child_urls"], result["product_urls"]
                 print(f"Parsed {len(child_urls)} child URLs and {len(product_urls)} product URLs from {url}")
-                await frontier.add_urls(set(child_urls), current_depth=depth)
+                template_products = await state.frontier.add_urls(set(child_urls), current_depth=depth)
+                PRODUCTS_FOUND.inc(len(product_urls))
                 for purl in product_urls:
-                    with self.outputLock:
-                        async with aiofiles.open(self.output_csv, mode="a", newline='', encoding='utf-8') as f:
-                            writer = csv.writer(f)
-                            await writer.writerow([seed_domain, purl])
-                collected.extend((seed_domain, purl) for purl in product_urls)
+                    record = {"seed_domain": state.domain, "product_url": purl, "source_url": url, "depth": depth,
+                              "method": "classifier"}
+                    await self.result_writer.write(record)
+                    if self.result_stream is not None:
+                        await self.result_stream.put({**record, "confidence": result["confidence"],
+                                                      "score": result["score"], "features": result["features"]})
+                self.__collect(state, product_urls)
+                await self.__track_products(state, product_urls, depth)
+                await self.__write_template_products(state, template_products, url, depth + 1)
             finally:
-                if frontier.is_empty():
-                    print(f"Html queue length is {self.html_queue.qsize()} for {seed_domain}")
-                await self.tracker.done()
+                await state.tracker.done()
                 self.html_queue.task_done()
+                # Done only once its product rows are written, a resumed crawl fetches it again otherwise
+                await self.result_writer.checkpoint(functools.partial(state.frontier.complete, url))
+        await self.scheduler.notify()
+
+    async def __write_template_products(self, state: DomainState, urls: list[str], source_url: str, depth: int):
+        """
+        Products of trusted templates are taken from the link without a fetch.
+        """
+        TEMPLATE_PRODUCTS.inc(len(urls))
+        for purl in urls:
+            record = {"seed_domain": state.domain, "product_url": purl, "source_url": source_url, "depth": depth,
+                      "method": "template"}
+            await self.result_writer.write(record)
+            if self.result_stream is not None:
+                # The template's product share stands in for a classifier confidence
+                await self.result_stream.put({**record, "confidence": state.templates.precision(purl), "score": None,
+                                              "features": None})
+        self.__collect(state, urls)
+        await self.__track_products(state, urls, depth)
 
-    async def __fetcher_worker(self, frontier: URLFrontier, semaphore: asyncio.Semaphore, seed_domain: str):
-        print(f"Fetcher worker started for domain {seed_domain}")
-        fetcher = AsyncFetcher()
+    def __collect(self, state: DomainState, urls):
+        state.products += len(urls)
+        if self.result_stream is None:
+            state.collected.extend((state.domain, purl) for purl in urls)
+
+    async def __track_products(self, state: DomainState, urls, depth: int):
+        """
+        Incremental crawls: products no earlier crawl had go to the delta stream.
+        """
+        if self.history is None:
+            return
+        for purl in urls:
+            if self.history.record_product(purl, state.domain, depth):
+                await self.__write_delta(state, purl, "added")
+
+    async def __write_delta(self, state: DomainState, url: str, change: str, reason: str = None):
+        REGISTRY.counter("product_changes_total", "Products added or removed since earlier crawls",
+                         {"change": change}).inc()
+        await self.delta_writer.write({"seed_domain": state.domain, "product_url": url, "change": change,
+                                       "reason": reason,
+                                       "detected_at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+
+    async def __record_history(self, state: DomainState, url: str, depth: int, result: dict):
+        """
+        Incremental crawls: remember what a parsed page was, report a known product that
+        no longer is one, and queue products that dropped off the page to check on them.
+        """
+        if state.templates is not None:
+            is_product_link = state.templates.is_product_link
+        else:
+            is_product_link = lambda link: is_product_url(link, explain=False)[0]
+        product_links = {child for child in result["child_urls"] if is_product_link(child)}
+        if not result["is_product_page"] and self.history.remove(url, gone=False):
+            await self.__write_delta(state, url, "removed", "not_product")
+        dropped = self.history.record_page(url, result["is_product_page"], product_links)
+        if dropped:
+            await state.frontier.add_urls(set(dropped), current_depth=depth, revisit=True)
+
+    async def __plan_recrawl(self, state: DomainState, seed_url: str):
+        """
+        Incremental crawls: known URLs that are not due yet are marked as seen, due ones
+        are queued, listings that used to surface new products first.
+        """
+        known = self.history.load(state.domain)
+        skipped = state.frontier.skip_urls(self.history.not_due(state.domain, exclude=seed_url))
+        RECRAWL_SKIPPED.inc(skipped)
+        due = self.history.due(state.domain)
+        by_depth = {}
+        for url, depth, kind, product_yield in due:
+            boost = self.RECRAWL_LISTING_BOOST * min(1.0, product_yield) if kind == "listing" else 0.0
+            by_depth.setdefault(depth, {})[url] = boost
+        for depth, boosts in by_depth.items():
+            await state.frontier.add_urls(set(boosts), current_depth=depth - 1, boosts=boosts, revisit=True)
+        print(f"Incremental crawl of {state.domain}: {known} known URLs, {len(due)} due, {skipped} not due")
+
+    async def __add_sitemap_batch(self, state: DomainState, batch: list[tuple[str, str, str]]):
+        """
+        Queue one batch of (url, lastmod, sitemap url) entries at depth 0, as if the seed
+        page had linked them.
+        """
+        lastmods, sources = {}, {}
+        for loc, lastmod, sitemap_url in batch:
+            url = self.canonicalizer.canonicalize(loc)
+            if urlparse(url).netloc != state.domain:
+                continue
+            lastmods[url] = lastmod
+            sources[url] = sitemap_url
+        SITEMAP_URLS.inc(len(lastmods))
+        template_products = await state.frontier.add_urls(set(lastmods), current_depth=-1, lastmods=lastmods,
+                                                          priority_offset=self.SITEMAP_PRIORITY_OFFSET)
+        for purl in template_products:
+            await self.__write_template_products(state, [purl], sources[purl], 0)
+        await self.scheduler.notify()
+
+    async def __discover_sitemaps(self, state: DomainState):
+        """
+        Feed a domain's sitemaps to its frontier; the domain is not finished before this is.
+        """
+        try:
+            stats = await self.discovery.discover(state.seed_url, state.robots,
+                                                  lambda batch: self.__add_sitemap_batch(state, batch))
+            print(f"Sitemaps for {state.domain}: {stats}")
+        except Exception as e:
+            self.logger.info("Sitemap discovery failed for %s: %r", state.domain, e)
+        finally:
+            await state.tracker.done()
+
+    async def __fetcher_worker(self):
+        fetcher = self.fetcher
         while True:
             try:
-                url, depth = await frontier.next_url()
+                state, url, depth, started_at = await self.scheduler.next_request()
             except StopAsyncIteration:
-                print(f"StopAsyncIteration raised for {seed_domain}, stopping fetcher worker...")
                 break
-            parsed = urlparse(url)
-            if parsed.netloc != seed_domain:
-                await self.tracker.done()
-                continue
-            async with semaphore:
+            status, latency = None, None
+            fetched = False
+            try:
+                parsed = urlparse(url)
+                if parsed.netloc != state.domain:
+                    state.frontier.complete(url)
+                    continue
+                # Queued (e.g. from a sitemap) before its template came to be trusted; known
+                # products of an incremental crawl are queued to be checked, so they are fetched
+                if (state.templates is not None and not (self.history is not None and self.history.is_product(url))
+                        and state.templates.skip_fetch(url)):
+                    await self.__write_template_products(state, [url], None, depth)
+                    state.frontier.complete(url)
+                    continue
+                fetched = True
                 result = await fetcher.smart_fetch_html(url)
-            if result["html"] and result["status"] == 200:
-                print(f"Fetched HTML for {url} at depth {depth}")
-                await self.html_queue.put((result["url"], result["html"], depth))
-                await self.tracker.add()
-            else:
-                self.logger.info("Failed to fetch HTML for : %s", url)
-            await self.tracker.done()
-
-    async def __crawl_and_collect(self, seed_url: str, max_depth: int = 3) -> list[tuple[str, str]]:
-        seed_domain = urlparse(seed_url).netloc
+                status, latency = result["status"], result["elapsed"]
+                self.__record_fetch(result)
+                if result["html"] and result["status"] == 200:
+                    print(f"Fetched HTML for {url} at depth {depth}")
+                    if self.history is not None:
+                        self.history.record_fetch(url, state.domain, depth, result["html"])
+                    await state.tracker.add()
+                    # Waits while the queue is over its byte budget
+                    await self.html_queue.put((result["html"], state, url, depth))
+                else:
+                    self.logger.info("Failed to fetch HTML for : %s", url,
+                                     extra={"fields": {"url": url, "domain": state.domain, "status": result["status"],
+                                                       "tier": result["tier"]}})
+                    if (self.history is not None and result["status"] in (404, 410)
+                            and self.history.remove(url, gone=True)):
+                        await self.__write_delta(state, url, "removed", "gone")
+                    state.frontier.complete(url)
+            finally:
+                if fetched and self.fetch_mode == "replay":
+                    # No site behind a replayed page, nothing to adapt the host's limits to
+                    await self.scheduler.release(state)
+                elif fetched:
+                    await self.scheduler.release(state, started_at, status, latency)
+                else:
+                    # Nothing was fetched, so there is nothing to tell the controller
+                    await self.scheduler.cancel(state, started_at)
+                await state.tracker.done()
+
+    @staticmethod
+    def __record_fetch(result: dict):
+        tier = result["tier"]
+        status = "error" if result["status"] is None else f"{result['status'] // 100}xx"
+        REGISTRY.histogram("fetch_seconds", "Fetch latency by tier", {"tier": tier}).observe(result["elapsed"])
+        REGISTRY.counter("fetches_total", "Fetches by tier and status class", {"tier": tier, "status": status}).inc()
+        REGISTRY.counter("fetch_bytes_total", "Bytes transferred by tier", {"tier": tier}).inc(result.get("bytes", 0))
+
+    def __template_learner(self):
+        if not self.LEARN_URL_TEMPLATES:
+            return None
+        recording = isinstance(self.archive, ArchiveWriter) and self.RECORD_TEMPLATE_PRODUCTS
+        return TemplateLearner(
+            min_samples=self.TEMPLATE_MIN_SAMPLES,
+            trust_precision=self.TEMPLATE_TRUST_PRECISION,
+            verify_rate=1.0 if recording else self.TEMPLATE_VERIFY_RATE,
+        )
+
+    def __host_controller(self) -> HostController:
+        return HostController(
+            initial_limit=self.CONCURRENT_FETCHERS,
+            min_limit=self.MIN_FETCHERS_PER_DOMAIN,
+            max_limit=self.MAX_FETCHERS_PER_DOMAIN,
+            latency_target=self.FETCH_LATENCY_TARGET,
+            failure_threshold=self.BREAKER_FAILURE_THRESHOLD,
+            cooldown=self.BREAKER_COOLDOWN,
+            max_trips=self.BREAKER_MAX_TRIPS,
+        )
+
+    def __frontier_store(self, domain: str):
+        if self.state_dir is None:
+            return None
+        filename = re.sub(r"[^A-Za-z0-9.-]", "_", domain) + ".frontier.sqlite"
+        return SQLiteFrontierStore(
+            os.path.join(self.state_dir, filename),
+            checkpoint_interval=self.FRONTIER_CHECKPOINT_INTERVAL,
+            reset=not self.resume,
+        )
+
+    async def __crawl_domains(self, seed_urls: list[str], max_depth: int = 3) -> dict[str, list[tuple[str, str]]]:
         # Create async resources inside the event loop
-        if self.logger is None:
-            self.logger = setup_logger()
-        if self.tracker is None:
-            self.tracker = WorkTracker()
-        if self.outputLock is None:
-            self.outputLock = Lock()
-
-        print(f"seed domain : {seed_domain}")
-        frontier = URLFrontier(seed_url=seed_url, max_depth=max_depth, tracker=self.tracker)
-        await frontier.add_urls({seed_url}, current_depth=-1)
-        collected = []
-        semaphore = asyncio.Semaphore(self.CONCURRENT_FETCHERS)
-        parser_task = asyncio.create_task(self.__parser_worker(seed_domain, frontier, collected))
+        self.scheduler = CrawlScheduler()
+        seeds = {}
+        for seed_url in seed_urls:
+            seed_url = self.canonicalizer.canonicalize(seed_url)
+            seeds.setdefault(urlparse(seed_url).netloc, seed_url)
+        all_robots = await self.__fetch_robots(list(seeds.values()))
+        for (domain, seed_url), robots in zip(seeds.items(), all_robots):
+            state = DomainState(
+                seed_url,
+                max_depth=max_depth,
+                max_in_flight=self.CONCURRENT_FETCHERS,
+                # A replayed crawl puts no load on the site
+                min_delay=0.0 if self.fetch_mode == "replay" else self.MIN_REQUEST_DELAY,
+                store=self.__frontier_store(domain),
+                controller=self.__host_controller(),
+                templates=self.__template_learner(),
+                robots=robots,
+                max_frontier_size=self.MAX_FRONTIER_SIZE,
+            )
+            print(f"seed domain : {state.domain}")
+            if self.resume:
+                pending = await state.frontier.resume()
+                print(f"Resumed {pending} pending URLs for {state.domain}")
+            if self.history is not None:
+                await self.__plan_recrawl(state, seed_url)
+            await state.frontier.add_urls({seed_url}, current_depth=-1)
+            if self.DISCOVER_SITEMAPS:
+                # Counted as outstanding work until the sitemaps are read
+                await state.tracker.add()
+            # A resumed domain may have nothing left to do
+            await state.tracker.settle()
+            self.scheduler.add_domain(state)
+        if not self.scheduler.domains:
+            return {}
+
+        # One parser coroutine per pool worker keeps every process busy
+        parser_tasks = [
+            asyncio.create_task(self.__parser_worker())
+            for _ in range(max(1, self.parse_pool.workers))
+        ]
         fetcher_tasks = [
-            asyncio.create_task(self.__fetcher_worker(frontier, semaphore, seed_domain))
-            for _ in range(self.CONCURRENT_FETCHERS)
+            asyncio.create_task(self.__fetcher_worker())
+            for _ in range(self.global_fetch_budget)
         ]
-        await self.tracker.wait()
-        await self.html_queue.put(None)
-        print(f"Added None to HTML queue for {seed_domain}, waiting for parser worker to finish...")
-        await self.html_queue.join()
-        print(f"HTML queue for {seed_domain} is empty, waiting for parser worker to finish...")
-        await parser_task
-        await frontier.finish()
-        print(f"Parser worker for {seed_domain} has finished processing all items.")
-        await asyncio.gather(*fetcher_tasks)
-        print(f"Fetcher worker for {seed_domain} has finished processing all items.")
-        return collected
-
-    async def crawl_multiple_seeds(self, seed_urls: list[str]):
-        for seed_url in seed_urls:
-            await self.__crawl_and_collect(seed_url)
+        discovery_tasks = [
+            asyncio.create_task(self.__discover_sitemaps(state))
+            for state in self.scheduler.domains.values()
+            if self.DISCOVER_SITEMAPS
+        ]
+        watchers = [
+            asyncio.create_task(self.scheduler.watch_domain(state))
+            for state in self.scheduler.domains.values()
+        ]
+        memory_guard = MemoryGuard(self.html_queue, self.MEMORY_CEILING_MB * 2 ** 20)
+        guard_task = asyncio.create_task(memory_guard.run())
+        tasks = parser_tasks + fetcher_tasks + discovery_tasks + watchers + [guard_task]
+
+        try:
+            await self.__wait_for_domains(watchers, parser_tasks)
+            await asyncio.gather(*discovery_tasks)
+            await asyncio.gather(*fetcher_tasks)
+            print("All fetcher workers have finished, stopping parser workers...")
+            for _ in parser_tasks:
+                await self.html_queue.put(None)
+            await self.html_queue.join()
+            await asyncio.gather(*parser_tasks)
+            print("All parser workers have finished processing all items.")
+        finally:
+            # Only left early when the crawl is cancelled (e.g. a stream consumer stopped)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(f"Host stats: {self.scheduler.get_host_stats()}")
+            print(f"Page queue stats: {self.html_queue.get_stats()}")
+            print(f"Memory: peak RSS {peak_rss() / 2 ** 20:.1f} MB, {memory_guard.get_stats()}")
+            try:
+                # Pages whose rows are written are marked done before the frontiers close
+                if self.result_writer.error is None:
+                    await self.result_writer.flush()
+            finally:
+                for state in self.scheduler.domains.values():
+                    # Domains left unfinished by a cancelled crawl still hold gauges
+                    self.scheduler.unregister_gauges(state)
+                    state.frontier.close()
+        return {domain: state.collected for domain, state in self.scheduler.domains.items()}
+
+    async def __fetch_robots(self, seed_urls: list[str]) -> list:
+        """
+        robots.txt rules of every seed, ROBOTS_FETCH_CONCURRENCY fetches at a time (the
+        discovery's robots thread pool), so one slow host does not hold up the others.
+        """
+        if not self.RESPECT_ROBOTS_TXT:
+            return [None] * len(seed_urls)
+        return await asyncio.gather(*(self.discovery.fetch_robots(seed_url) for seed_url in seed_urls))
+
+    async def __wait_for_domains(self, watchers: list, parser_tasks: list):
+        """
+        Wait until every domain is finished. A parser worker or output writer that dies
+        would leave the domains' trackers undrained, so its exception is raised at once.
+        """
+        writers = [w.task for w in (self.result_writer, self.delta_writer) if w is not None and w.task is not None]
+        guards = set(parser_tasks) | set(writers)
+        pending = set(watchers)
+        while pending:
+            done, _ = await asyncio.wait(pending | guards, return_when=asyncio.FIRST_COMPLETED)
+            for task in done & guards:
+                for writer in (self.result_writer, self.delta_writer):
+                    if writer is not None and writer.error is not None:
+                        raise writer.error
+                # Parser workers and writers only stop early on an exception
+                task.result()
+                guards.discard(task)
+            pending -= done
+
+    async def crawl_multiple_seeds(self, seed_urls: list[str], max_depth: int = 3):
+        loop = asyncio.get_event_loop()
+        # Before the parse workers start, they log at the same level
+        if self.logger is None:
+            self.logger = setup_logger(self.LOG_FILE, structured=self.LOG_STRUCTURED, level=self.LOG_LEVEL)
+        if self.fetch_mode not in AsyncFetcher.BROWSERLESS_MODES:
+            self.driver_pool = ChromeDriverPool(
+                size=self.driver_pool_size,
+                max_pages_per_driver=self.MAX_PAGES_PER_DRIVER,
+                user_agents=AsyncFetcher.USER_AGENTS,
+                profile=self.render_profile,
+            )
+        if self.cache_dir is not None:
+            self.page_cache = PageCache(self.cache_dir, fresh_for=self.PAGE_CACHE_FRESH_SECONDS)
+        if self.archive_path is not None:
+            self.archive = (ArchiveReader(self.archive_path) if self.fetch_mode == "replay"
+                            else ArchiveWriter(self.archive_path))
+        self.fetcher = AsyncFetcher(self.driver_pool, mode=self.fetch_mode,
+                                    http_pool_size=self.CONCURRENT_FETCHERS,
+                                    max_workers=self.global_fetch_budget, cache=self.page_cache,
+                                    archive=self.archive)
+        self.result_writer = ResultWriter(self.sinks, batch_size=self.OUTPUT_BATCH_SIZE,
+                                          flush_interval=self.OUTPUT_FLUSH_INTERVAL)
+        if self.incremental:
+            self.history = CrawlHistory(os.path.join(self.state_dir, "crawl_history.sqlite"),
+                                        min_interval=self.RECRAWL_MIN_INTERVAL,
+                                        max_interval=self.RECRAWL_MAX_INTERVAL,
+                                        prior_interval=self.RECRAWL_PRIOR_INTERVAL)
+            self.delta_writer = ResultWriter(self.delta_sinks, batch_size=self.OUTPUT_BATCH_SIZE,
+                                             flush_interval=self.OUTPUT_FLUSH_INTERVAL, dedupe=False)
+        self.discovery = SitemapDiscovery(batch_size=self.SITEMAP_BATCH_SIZE,
+                                          max_sitemaps=self.MAX_SITEMAPS_PER_DOMAIN,
+                                          max_urls=self.MAX_SITEMAP_URLS_PER_DOMAIN,
+                                          archive=self.archive,
+                                          robots_workers=self.ROBOTS_FETCH_CONCURRENCY)
+        metrics_server = None
+        snapshot_task = None
+        if self.metrics_port is not None:
+            metrics_server = MetricsServer(REGISTRY, port=self.metrics_port)
+            metrics_server.start()
+            print(f"Serving metrics on http://127.0.0.1:{metrics_server.port}/metrics")
+        if self.metrics_file is not None:
+            snapshot_task = asyncio.create_task(write_snapshots(self.metrics_file, self.METRICS_SNAPSHOT_INTERVAL))
+        try:
+            await self.result_writer.start()
+            if self.delta_writer is not None:
+                await self.delta_writer.start()
+            self.parse_pool.start()
+            if self.driver_pool is not None and self.WARM_UP_DRIVERS:
+                await loop.run_in_executor(None, self.driver_pool.warm_up)
+            self.domains_task = asyncio.ensure_future(self.__crawl_domains(seed_urls, max_depth=max_depth))
+            return await self.domains_task
+        finally:
+            self.domains_task = None
+            try:
+                # A failed sink raises from here, after everything below is closed
+                await self.__close_writers()
+            finally:
+                await self.__close_resources(loop, metrics_server, snapshot_task)
+
+    async def __close_writers(self):
+        try:
+            if self.result_writer.task is not None:
+                await self.result_writer.close()
+            print(f"Output stats: {self.result_writer.get_stats()}")
+        finally:
+            if self.delta_writer is not None:
+                if self.delta_writer.task is not None:
+                    await self.delta_writer.close()
+                print(f"Delta stats: {self.delta_writer.get_stats()}")
+
+    async def __close_resources(self, loop, metrics_server, snapshot_task):
+        if self.history is not None:
+            print(f"History stats: {self.history.get_stats()}")
+            self.history.close()
+        print(f"Fetch tier stats: {self.fetcher.get_tier_stats()}")
+        self.fetcher.close()
+        if self.page_cache is not None:
+            self.page_cache.close()
+        self.discovery.close()
+        if self.archive is not None:
+            self.archive.close()
+        await loop.run_in_executor(None, self.parse_pool.close)
+        if self.driver_pool is not None:
+            print(f"Driver pool stats: {self.driver_pool.get_stats()}")
+            await loop.run_in_executor(None, self.driver_pool.close)
+        if snapshot_task is not None:
+            snapshot_task.cancel()
+            await asyncio.gather(snapshot_task, return_exceptions=True)
+        if metrics_server is not None:
+            metrics_server.close()
+
+    async def stream(self, seed_urls: list[str], max_depth: int = 3) -> AsyncIterator[dict]:
+        """
+        Crawl the seeds and yield each product as soon as it is classified: the output row
+        (seed_domain, product_url, source_url, depth, method) plus the classifier's
+        confidence, score and features. Rows still go to the sinks.
+
+        At most STREAM_BUFFER_SIZE records wait for the consumer. Past that the parsers
+        wait, and the fetchers once the page queue is full. Products are not collected in
+        memory. Closing the generator (use contextlib.aclosing to close it as soon as the
+        loop is left) or cancelling the consumer stops the crawl, and the sinks are flushed
+        and closed as after a full crawl.
+        """
+        self.result_stream = ResultStream(max_records=self.STREAM_BUFFER_SIZE)
+        crawl = asyncio.ensure_future(self.crawl_multiple_seeds(seed_urls, max_depth=max_depth))
+        try:
+            while (record := await self.result_stream.get(crawl)) is not None:
+                yield record
+        finally:
+            if not crawl.done():
+                # Cancelling the domains leaves crawl_multiple_seeds to shut down in order
+                (self.domains_task or crawl).cancel()
+            await asyncio.gather(crawl, return_exceptions=True)
+            print(f"Stream stats: {self.result_stream.get_stats()}")
+            self.result_stream = None
@@ -0,0 +1,138 @@
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from render_profile import RenderProfile
+
+
+class ChromeDriverPool:
+    """
+    Pool of long-lived headless Chrome drivers that are leased out per fetch.
+
+    Drivers are created lazily (or eagerly through warm_up) up to `size`, handed back
+    after each page and recycled once they have served `max_pages_per_driver` pages or
+    raised during a fetch. Drivers are configured with the pool's RenderProfile.
+    """
+
+    def __init__(self, size: int = 5, max_pages_per_driver: int = 50, page_load_timeout: int = 20,
+                 user_agents: list[str] = None, profile: RenderProfile = None):
+        self.size = size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.page_load_timeout = page_load_timeout
+        self.user_agents = user_agents or []
+        self.profile = profile or RenderProfile()
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.pages_served = {}
+        self.closed = False
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "warmups": 0,
+            "recycled": 0,
+            "crashes": 0,
+            "created": 0,
+        }
+
+    def __create_driver(self):
+        options = Options()
+        options.add_argument('--headless')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        if self.user_agents:
+            options.add_argument('--user-agent=' + random.choice(self.user_agents))
+        self.profile.apply_options(options)
+
+        driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        self.profile.setup_driver(driver)
+        with self.lock:
+            self.pages_served[id(driver)] = 0
+            self.stats["created"] += 1
+        return driver
+
+    def __quit_driver(self, driver):
+        with self.lock:
+            self.pages_served.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def warm_up(self, count: int = None):
+        """
+        Start `count` drivers ahead of the first fetch (defaults to the pool size).
+        """
+        count = min(count or self.size, self.size - self.idle.qsize())
+        for _ in range(count):
+            self.idle.put(self.__create_driver())
+            with self.lock:
+                self.stats["warmups"] += 1
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            driver = self.idle.get_nowait()
+            with self.lock:
+                self.stats["hits"] += 1
+            return driver
+        except queue.Empty:
+            pass
+
+        try:
+            driver = self.__create_driver()
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.stats["misses"] += 1
+        return driver
+
+    def release(self, driver, broken: bool = False):
+        try:
+            with self.lock:
+                served = self.pages_served.get(id(driver), 0) + 1
+                self.pages_served[id(driver)] = served
+                if broken:
+                    self.stats["crashes"] += 1
+                elif served >= self.max_pages_per_driver:
+                    self.stats["recycled"] += 1
+
+            if broken or self.closed or served >= self.max_pages_per_driver:
+                self.__quit_driver(driver)
+            else:
+                self.idle.put(driver)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def lease(self):
+        """
+        Lease a driver for one page. The driver is recycled if the body raises.
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        except BaseException:
+            self.release(driver, broken=True)
+            raise
+        self.release(driver)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.__quit_driver(driver)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        stats["idle"] = self.idle.qsize()
+        stats["size"] = self.size
+        return stats
@@ -0,0 +1,242 @@
+import heapq
+import os
+import sqlite3
+import time
+from typing import Optional
+from sortedcontainers import SortedList
+from seen_set import FingerprintSet, BloomFilter, url_fingerprint
+
+
+class MemoryFrontierStore:
+    """
+    In-memory priority queue and fingerprint seen-set, the frontier's default backend.
+
+    Entries are kept in a sorted list, so push, pop and evicting the worst entry are all
+    O(log n); URLs of equal priority come out in the order they were pushed.
+    """
+
+    def __init__(self, bloom_capacity: int = None):
+        self.queue = SortedList()
+        self.sequence = 0
+        bloom = BloomFilter(capacity=bloom_capacity) if bloom_capacity else None
+        self.visited = FingerprintSet(bloom=bloom)
+
+    def mark_visited(self, url: str) -> bool:
+        """
+        Record a URL as seen. Returns False if it had been seen before.
+        """
+        return self.visited.add(url_fingerprint(url))
+
+    def seen_stats(self) -> dict:
+        return {
+            "seen": len(self.visited),
+            "duplicates_suppressed": self.visited.duplicates,
+            "seen_bytes_per_url": round(self.visited.bytes_per_url(), 2),
+        }
+
+    def push(self, priority, url: str, depth: int):
+        self.sequence += 1
+        self.queue.add((priority, self.sequence, url, depth))
+
+    def pop(self) -> Optional[tuple]:
+        if not self.queue:
+            return None
+        priority, _, url, depth = self.queue.pop(0)
+        return priority, url, depth
+
+    def evict(self, count: int) -> list[str]:
+        """
+        Drop the `count` lowest-value (highest priority number) URLs, returning them.
+        """
+        return [self.queue.pop()[2] for _ in range(min(count, len(self.queue)))]
+
+    def complete(self, url: str):
+        pass
+
+    def restore(self) -> int:
+        return len(self.queue)
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class SQLiteFrontierStore:
+    """
+    Durable frontier backend in a SQLite database (WAL mode).
+
+    Every queued URL lives on disk; only the best `hot_size` entries are also kept in an
+    in-memory heap, so memory stays bounded however large the frontier grows. Popped URLs
+    move to an `inflight` table until complete() is called, and restore() puts whatever
+    was still in flight back in the queue, so a resumed crawl neither loses nor refetches
+    finished pages. Changes are committed every `checkpoint_every` operations or
+    `checkpoint_interval` seconds.
+    """
+
+    def __init__(self, path: str, hot_size: int = 1000, checkpoint_every: int = 500,
+                 checkpoint_interval: float = 5.0, reset: bool = False):
+        self.path = path
+        self.hot_size = hot_size
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                priority REAL NOT NULL,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS frontier_order ON frontier (priority, id);
+            CREATE TABLE IF NOT EXISTS visited (fingerprint INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS inflight (
+                url TEXT PRIMARY KEY,
+                priority REAL NOT NULL,
+                depth INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        if reset:
+            self.db.executescript("DELETE FROM frontier; DELETE FROM visited; DELETE FROM inflight;")
+        self.db.commit()
+
+        # Hot head: (priority, id, url, depth) for every row at or below `boundary`
+        self.heap = []
+        self.boundary = None
+        self.size = self.db.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        self.pending_ops = 0
+        self.last_checkpoint = time.monotonic()
+        self.checkpoints = 0
+        self.duplicates = 0
+
+    def mark_visited(self, url: str) -> bool:
+        fingerprint = url_fingerprint(url)
+        # SQLite integers are signed 64-bit
+        if fingerprint >= 1 << 63:
+            fingerprint -= 1 << 64
+        cursor = self.db.execute("INSERT OR IGNORE INTO visited (fingerprint) VALUES (?)", (fingerprint,))
+        self.__touch()
+        if cursor.rowcount != 1:
+            self.duplicates += 1
+            return False
+        return True
+
+    def seen_stats(self) -> dict:
+        seen = self.db.execute("SELECT COUNT(*) FROM visited").fetchone()[0]
+        return {
+            "seen": seen,
+            "duplicates_suppressed": self.duplicates,
+            # On disk: 8-byte key plus SQLite's per-row overhead
+            "seen_bytes_per_url": None,
+        }
+
+    def push(self, priority, url: str, depth: int):
+        cursor = self.db.execute(
+            "INSERT INTO frontier (priority, url, depth) VALUES (?, ?, ?)", (priority, url, depth)
+        )
+        entry = (priority, cursor.lastrowid, url, depth)
+        # Rows beyond the loaded window are picked up by the next refill
+        if self.boundary is not None and entry[:2] < self.boundary:
+            heapq.heappush(self.heap, entry)
+            if len(self.heap) > 2 * self.hot_size:
+                self.heap = []
+                self.boundary = None
+        self.size += 1
+        self.__touch()
+
+    def __refill(self):
+        if self.boundary is None:
+            rows = self.db.execute(
+                "SELECT priority, id, url, depth FROM frontier ORDER BY priority, id LIMIT ?",
+                (self.hot_size,),
+            ).fetchall()
+        else:
+            rows = self.db.execute(
+                "SELECT priority, id, url, depth FROM frontier WHERE (priority, id) > (?, ?) "
+                "ORDER BY priority, id LIMIT ?",
+                (*self.boundary, self.hot_size),
+            ).fetchall()
+        for row in rows:
+            heapq.heappush(self.heap, row)
+        if rows:
+            self.boundary = rows[-1][:2]
+        elif self.boundary is None:
+            self.boundary = (float("-inf"), 0)
+
+    def pop(self) -> Optional[tuple]:
+        if not self.heap:
+            self.__refill()
+            if not self.heap:
+                return None
+        priority, row_id, url, depth = heapq.heappop(self.heap)
+        self.db.execute("DELETE FROM frontier WHERE id = ?", (row_id,))
+        self.db.execute(
+            "INSERT OR REPLACE INTO inflight (url, priority, depth) VALUES (?, ?, ?)", (url, priority, depth)
+        )
+        self.size -= 1
+        self.__touch()
+        return priority, url, depth
+
+    def evict(self, count: int) -> list[str]:
+        """
+        Drop the `count` lowest-value (highest priority number) URLs, returning them.
+        """
+        rows = self.db.execute(
+            "SELECT priority, id, url FROM frontier ORDER BY priority DESC, id DESC LIMIT ?", (count,)
+        ).fetchall()
+        if not rows:
+            return []
+        self.db.executemany("DELETE FROM frontier WHERE id = ?", [(row_id,) for _, row_id, _ in rows])
+        # Evicting rows from the hot head is rare, start it over when it happens
+        if self.boundary is not None and min(row[:2] for row in rows) <= self.boundary:
+            self.heap = []
+            self.boundary = None
+        self.size -= len(rows)
+        self.__touch()
+        return [url for _, _, url in rows]
+
+    def complete(self, url: str):
+        self.db.execute("DELETE FROM inflight WHERE url = ?", (url,))
+        self.__touch()
+
+    def restore(self) -> int:
+        """
+        Requeue URLs that were in flight when the previous run stopped. Returns the
+        number of queued URLs.
+        """
+        rows = self.db.execute("SELECT priority, url, depth FROM inflight").fetchall()
+        for priority, url, depth in rows:
+            self.push(priority, url, depth)
+        self.db.execute("DELETE FROM inflight")
+        self.checkpoint()
+        return self.size
+
+    def __touch(self):
+        self.pending_ops += 1
+        if (self.pending_ops >= self.checkpoint_every
+                or time.monotonic() - self.last_checkpoint >= self.checkpoint_interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.db.commit()
+        self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        self.pending_ops = 0
+        self.last_checkpoint = time.monotonic()
+        self.checkpoints += 1
+
+    def close(self):
+        self.checkpoint()
+        self.db.close()
+
+    def __len__(self):
+        return self.size
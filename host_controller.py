@@ -0,0 +1,181 @@
+import math
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_failure(status) -> bool:
+    """
+    Outcomes that mean the host is struggling: no response (timeout, connection or
+    browser error), rate limiting and server errors.
+    """
+    return status is None or status == 429 or status >= 500
+
+
+class LatencyWindow:
+    """
+    The most recent fetch latencies of one host, for percentiles.
+    """
+
+    def __init__(self, size: int = 256):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class HostController:
+    """
+    AIMD concurrency limit and circuit breaker for one host.
+
+    Every healthy completion (no failure, latency within `latency_target`, recent error
+    rate below `max_error_rate`) grows the limit by `increase / limit`, i.e. about
+    `increase` per round of `limit` fetches. A failure multiplies it by `decrease`, at most
+    once per round: failures of fetches started before the last decrease are not counted
+    again. After `failure_threshold` consecutive failures the breaker opens and the host
+    gets no fetches for `cooldown` seconds, then a single probe is let through. A failed
+    probe reopens the breaker with twice the cooldown, up to `max_cooldown`. Fetches that
+    started before the last trip do not count once they finish: while the breaker is open
+    or probing only the probe decides. After `max_trips` failed probes in a row the
+    controller gives up on the host.
+    """
+
+    def __init__(self, initial_limit: float = 5, min_limit: float = 1, max_limit: float = 20,
+                 latency_target: float = 10.0, increase: float = 1.0, decrease: float = 0.5,
+                 max_error_rate: float = 0.1, failure_threshold: int = 5, cooldown: float = 30.0,
+                 max_cooldown: float = 300.0, max_trips: int = 5):
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self.max_error_rate = max_error_rate
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_trips = max_trips
+
+        self.latency = LatencyWindow()
+        self.outcomes = deque(maxlen=50)
+        self.last_decrease = float("-inf")
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.last_trip = float("-inf")
+        self.probing = False
+        self.probe_started = None
+        self.trips = 0
+        self.consecutive_trips = 0
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def gave_up(self) -> bool:
+        return self.max_trips is not None and self.consecutive_trips >= self.max_trips
+
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def can_send(self, in_flight: int, now: float) -> bool:
+        """
+        Whether one more fetch may start with `in_flight` already running.
+        """
+        if self.gave_up:
+            return False
+        if self.state == OPEN:
+            if now < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == HALF_OPEN:
+            return not self.probing and in_flight == 0
+        return in_flight < int(self.limit)
+
+    def on_send(self, now: float = None):
+        if self.state == HALF_OPEN:
+            self.probing = True
+            self.probe_started = now
+
+    def record(self, status, latency: float, started_at: float, now: float):
+        """
+        Feed back the outcome of a fetch that started at `started_at`.
+        """
+        failed = is_failure(status)
+        self.outcomes.append(failed)
+        if latency is not None:
+            self.latency.add(latency)
+
+        if failed:
+            self.failures += 1
+            # Fetches that were in flight when the breaker opened already counted towards it
+            if self.state == OPEN or started_at < self.last_trip:
+                return
+            if self.state == HALF_OPEN and not self.__is_probe(started_at):
+                return
+            self.consecutive_failures += 1
+            if started_at >= self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.last_decrease = now
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.__trip(now)
+            return
+
+        self.successes += 1
+        if self.state == HALF_OPEN and not self.__is_probe(started_at):
+            return
+        if self.state == OPEN or started_at < self.last_trip:
+            # A late success says nothing about the host since the trip
+            return
+        self.consecutive_failures = 0
+        self.consecutive_trips = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.probing = False
+            self.cooldown = self.base_cooldown
+        if (latency is None or latency <= self.latency_target) and self.error_rate() < self.max_error_rate:
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def __is_probe(self, started_at: float) -> bool:
+        return self.probing and self.probe_started is not None and started_at >= self.probe_started
+
+    def __trip(self, now: float):
+        if self.state == HALF_OPEN:
+            # The probe failed
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self.consecutive_trips += 1
+        self.state = OPEN
+        self.open_until = now + self.cooldown
+        self.last_trip = now
+        self.probing = False
+        self.trips += 1
+
+    def get_stats(self) -> dict:
+        def rounded(value):
+            return None if value is None else round(value, 3)
+
+        return {
+            "limit": round(self.limit, 2),
+            "breaker": self.state,
+            "breaker_trips": self.trips,
+            "gave_up": self.gave_up,
+            "successes": self.successes,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_p50": rounded(self.latency.percentile(50)),
+            "latency_p90": rounded(self.latency.percentile(90)),
+            "latency_p99": rounded(self.latency.percentile(99)),
+        }
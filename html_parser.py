@@ -1,37 +1,162 @@
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from typing import List, Tuple
+import logging
+import time
+from typing import List, Optional, Tuple
+from link_extractor import LinkExtractor
+from near_duplicates import NearDuplicateIndex, simhash
+from page_features import extract_features
 from product_page_classifier import ProductPageClassifier
-from product_url_analyser import is_dead_end_url
-from logger_config import setup_logger
+from url_canonicalizer import URLCanonicalizer
+from vector_classifier import VectorClassifier
+from logger_config import setup_logger, ExplanationSampler, LazyLines
 
 class HTMLParser:
-    def __init__(self):
+    def __init__(self, canonicalizer: URLCanonicalizer = None, model: VectorClassifier = None,
+                 near_duplicates: NearDuplicateIndex = None, sampler: ExplanationSampler = None):
         self.logger = setup_logger()
+        # Verdict explanations are only built for sampled pages, or for all of them at DEBUG
+        self.sampler = sampler
         self.productPageClassifer = ProductPageClassifier()
+        self.canonicalizer = canonicalizer or URLCanonicalizer()
+        # Links come from the raw HTML, with verdicts cached per domain across pages
+        self.link_extractor = LinkExtractor(self.canonicalizer)
+        # With a vector model, parse_pages() classifies a whole batch at once
+        self.model = model
+        # Pages that are (near) duplicates of one already parsed take over its verdict, their links are their own
+        self.near_duplicates = near_duplicates
 
-    def parse_html(self, page_url: str, html: str, seed_domain: str) -> Tuple[List[str], List[str]]:
-        soup = BeautifulSoup(html, "lxml")
-        child_urls = set()
-        product_urls = set()
+    @staticmethod
+    def __result(page_url: str, child_urls: set, verdict: dict, timings: dict) -> dict:
+        return {
+            "url": page_url,
+            "child_urls": child_urls,
+            "product_urls": {page_url} if verdict["is_product_page"] else set(),
+            "is_product_page": verdict["is_product_page"],
+            "confidence": verdict["confidence"],
+            "score": verdict["score"],
+            "features": verdict["features"],
+            "timings": timings,
+        }
+
+    def __explain_level(self, page_url: str, seed_domain: str) -> Optional[int]:
+        """
+        Level to log the page's verdict and explanation at, None to build neither.
+        """
+        if self.sampler is not None and self.sampler.sampled(page_url, seed_domain):
+            return logging.INFO
+        if self.logger.isEnabledFor(logging.DEBUG):
+            return logging.DEBUG
+        return None
+
+    def __log_verdict(self, level: int, page_url: str, seed_domain: str, verdict: dict, explanation: LazyLines = None):
+        fields = {"url": page_url, "domain": seed_domain, "product": verdict["is_product_page"],
+                  "confidence": verdict["confidence"], "score": verdict["score"]}
+        # A vector model has no explanation, its features are what it scored
+        if explanation is not None:
+            fields["explanation"] = explanation
+        else:
+            fields["features"] = verdict["features"]
+        self.logger.log(level, "Classified %s", page_url, extra={"fields": fields})
 
-        result = self.productPageClassifer.analyze(soup, page_url, None, self.logger.info)
+    def __fingerprint(self, page_url: str, html, seed_domain: str) -> tuple[int, float, dict]:
+        """
+        The page's SimHash, the seconds it took and, for a near duplicate of a page
+        classified for the same seed domain, a result with that page's verdict (else None).
+        The links are always the page's own: listings that share a layout differ mostly
+        in the products they link to.
+        """
+        start = time.perf_counter()
+        fingerprint = simhash(html)
+        match = self.near_duplicates.lookup(fingerprint, seed_domain)
+        seconds = time.perf_counter() - start
+        if match is None:
+            return fingerprint, seconds, None
+        distance, (original_url, verdict) = match
+        child_urls = self.link_extractor.extract(html, page_url, seed_domain)
+        result = self.__result(page_url, child_urls, verdict,
+                               {"parse": time.perf_counter() - start, "classify": 0.0})
+        result["duplicate_of"] = original_url
+        return fingerprint, seconds, result
 
-        if result["is_product_page"]:
-            product_urls.add(page_url)
+    def __remember(self, fingerprint: int, result: dict, seed_domain: str):
+        verdict = {key: result[key] for key in ("is_product_page", "confidence", "score", "features")}
+        self.near_duplicates.add(fingerprint, (result["url"], verdict), seed_domain)
 
-        for tag in soup.find_all("a", href=True):
-            href = tag["href"]
-            url = urljoin(page_url, href)
-            parsed = urlparse(url)
+    def parse_page(self, page_url: str, html: str, seed_domain: str) -> dict:
+        """
+        Parse a page into its child URLs, product URLs and the classifier verdict.
+        The explanation is left out so the result stays small enough to pass between processes.
+        Stage timings in seconds are reported under `timings`. A near duplicate of a page
+        parsed before reuses that page's verdict, names it in `duplicate_of` and still
+        gets its own links.
+        """
+        if self.model is not None:
+            return self.parse_pages([(page_url, html, seed_domain)])[0]
 
-            if parsed.netloc != seed_domain:
-                continue
+        fingerprint, fingerprint_seconds = None, 0.0
+        if self.near_duplicates is not None:
+            fingerprint, fingerprint_seconds, duplicate = self.__fingerprint(page_url, html, seed_domain)
+            if duplicate is not None:
+                return duplicate
 
-            normalized = parsed._replace(fragment="").geturl().rstrip("/")
+        # The classifier streams its features from the raw HTML, no tree is built
+        level = self.__explain_level(page_url, seed_domain)
+        start = time.perf_counter()
+        result = self.productPageClassifer.analyze(html, page_url, None, None, explain=level is not None)
+        classify_seconds = time.perf_counter() - start
+        if level is not None:
+            self.__log_verdict(level, page_url, seed_domain, result, result["explanation"])
 
-            if not is_dead_end_url(parsed.path):
-                child_urls.add(normalized)
+        start = time.perf_counter()
+        child_urls = self.link_extractor.extract(html, page_url, seed_domain)
+        timings = {"parse": time.perf_counter() - start + fingerprint_seconds, "classify": classify_seconds}
+        parsed = self.__result(page_url, child_urls, result, timings)
+        if fingerprint is not None:
+            self.__remember(fingerprint, parsed, seed_domain)
+        return parsed
 
-        return child_urls, product_urls
+    def parse_pages(self, items: list[tuple[str, str, str]]) -> list[dict]:
+        """
+        Parse a batch of (url, html, seed_domain) pages. With a vector model the pages'
+        feature vectors are scored together in one matrix product.
+        """
+        if self.model is None:
+            return [self.parse_page(*item) for item in items]
 
+        results = [None] * len(items)
+        parsed = []
+        features = []
+        for index, (page_url, html, seed_domain) in enumerate(items):
+            fingerprint, fingerprint_seconds = None, 0.0
+            if self.near_duplicates is not None:
+                fingerprint, fingerprint_seconds, duplicate = self.__fingerprint(page_url, html, seed_domain)
+                if duplicate is not None:
+                    results[index] = duplicate
+                    continue
+            # Neither links nor features need a parsed tree, both are read from the raw HTML
+            start = time.perf_counter()
+            child_urls = self.link_extractor.extract(html, page_url, seed_domain)
+            parse_seconds = time.perf_counter() - start + fingerprint_seconds
+            start = time.perf_counter()
+            features.append((extract_features(html), page_url))
+            parsed.append((index, fingerprint, page_url, seed_domain, child_urls, parse_seconds,
+                           time.perf_counter() - start))
+
+        if parsed:
+            start = time.perf_counter()
+            verdicts = self.model.classify(features)
+            # The batch product is shared evenly between the pages
+            batch_share = (time.perf_counter() - start) / len(parsed)
+            for (index, fingerprint, page_url, seed_domain, child_urls, parse_seconds, extract), verdict in zip(
+                    parsed, verdicts):
+                results[index] = self.__result(page_url, child_urls, verdict,
+                                               {"parse": parse_seconds, "classify": extract + batch_share})
+                level = self.__explain_level(page_url, seed_domain)
+                if level is not None:
+                    self.__log_verdict(level, page_url, seed_domain, verdict)
+                if fingerprint is not None:
+                    self.__remember(fingerprint, results[index], seed_domain)
+        return results
+
+    def parse_html(self, page_url: str, html: str, seed_domain: str) -> Tuple[List[str], List[str]]:
+        result = self.parse_page(page_url, html, seed_domain)
+        return result["child_urls"], result["product_urls"]
@@ -0,0 +1,150 @@
+import html as html_entities
+import re
+from typing import Optional, Union
+from urllib.parse import urljoin, urlparse, urlsplit
+from bs4 import BeautifulSoup
+from product_url_analyser import is_dead_end_url
+from url_canonicalizer import URLCanonicalizer
+
+# Anchor hrefs in the raw HTML; script and style bodies and comments are matched too so
+# that anchors inside them are skipped, the way an HTML parser treats them as text
+ANCHOR_HREF_SOURCE = (
+    rb'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->'
+    rb'|<a(?=\s)[^>]*?\shref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+))'
+)
+ANCHOR_HREF_BYTES = re.compile(ANCHOR_HREF_SOURCE, re.IGNORECASE | re.DOTALL)
+ANCHOR_HREF_TEXT = re.compile(ANCHOR_HREF_SOURCE.decode("ascii"), re.IGNORECASE | re.DOTALL)
+# hrefs that do not depend on the page path: root-relative, protocol-relative or with a scheme
+DOMAIN_WIDE_BYTES = re.compile(rb"/|[a-zA-Z][a-zA-Z0-9+.-]*:")
+DOMAIN_WIDE_TEXT = re.compile(DOMAIN_WIDE_BYTES.pattern.decode("ascii"))
+
+
+def iter_hrefs(html: Union[str, bytes]):
+    """
+    Raw href values of the page's <a> tags, in document order, as they appear in the
+    source (bytes for a bytes page, entities not yet decoded).
+    """
+    pattern = ANCHOR_HREF_BYTES if isinstance(html, bytes) else ANCHOR_HREF_TEXT
+    for match in pattern.finditer(html):
+        double, single, bare = match.groups()
+        value = double if double is not None else single if single is not None else bare
+        if value is not None:
+            yield value
+
+
+def extract_links_from_soup(soup: BeautifulSoup, page_url: str, seed_domain: str,
+                            canonicalizer: URLCanonicalizer) -> set:
+    """
+    Same-domain, non-dead-end child URLs of a parsed page, evaluated anchor by anchor.
+    This was the parser's link extraction before LinkExtractor and is kept as reference.
+    """
+    child_urls = set()
+    for tag in soup.find_all("a", href=True):
+        url = urljoin(page_url, tag["href"])
+        if not url.startswith(("http://", "https://")):
+            continue
+        normalized = canonicalizer.canonicalize(url, seed_domain)
+        parsed = urlparse(normalized)
+        if parsed.netloc != seed_domain:
+            continue
+        if not is_dead_end_url(parsed.path):
+            child_urls.add(normalized)
+    return child_urls
+
+
+class LinkExtractor:
+    """
+    Child URL extraction straight from the raw HTML.
+
+    hrefs are pulled out with one regex scan and deduplicated before anything else is
+    done with them. Each distinct href is resolved, canonicalized and checked for the
+    domain and for dead ends once. Absolute and root-relative hrefs resolve the same way
+    on every page of a domain, so their verdicts go to a per-domain cache of up to
+    `cache_size` entries. Header, footer and other navigation links that repeat across
+    pages are therefore evaluated once per domain. Relative hrefs are only cached for
+    the page they are on.
+    """
+
+    def __init__(self, canonicalizer: URLCanonicalizer = None, cache_size: int = 50_000):
+        self.canonicalizer = canonicalizer or URLCanonicalizer()
+        self.cache_size = cache_size
+        self.domain_caches: dict[str, dict] = {}
+        self.pages = 0
+        self.anchors = 0
+        self.unique_hrefs = 0
+        self.cache_hits = 0
+        self.evaluated = 0
+
+    def __evaluate(self, url: str, seed_domain: str) -> Optional[str]:
+        """
+        The canonical child URL an absolute URL stands for, or None if it is dropped.
+        """
+        self.evaluated += 1
+        if not url.startswith(("http://", "https://")):
+            return None
+        normalized = self.canonicalizer.canonicalize(url, seed_domain)
+        parsed = urlparse(normalized)
+        if parsed.netloc != seed_domain or is_dead_end_url(parsed.path):
+            return None
+        return normalized
+
+    @staticmethod
+    def __domain_key(raw: Union[str, bytes], origin: str) -> Optional[tuple]:
+        """
+        Cache key for raw hrefs that resolve the same on every page of the domain (absolute
+        and root-relative ones), else None.
+        """
+        pattern = DOMAIN_WIDE_BYTES if isinstance(raw, bytes) else DOMAIN_WIDE_TEXT
+        if pattern.match(raw):
+            return origin, raw
+        return None
+
+    def __resolve(self, raw: Union[str, bytes], page_url: str, seed_domain: str) -> Optional[str]:
+        href = raw.decode("utf-8", "replace") if isinstance(raw, bytes) else raw
+        if "&" in href:
+            href = html_entities.unescape(href)
+        return self.__evaluate(urljoin(page_url, href.strip()), seed_domain)
+
+    def extract(self, html: Union[str, bytes], page_url: str, seed_domain: str) -> set:
+        """
+        Same-domain, non-dead-end child URLs of a page, canonicalized.
+        """
+        self.pages += 1
+        raw_hrefs = set()
+        for raw in iter_hrefs(html):
+            self.anchors += 1
+            raw_hrefs.add(raw)
+        self.unique_hrefs += len(raw_hrefs)
+
+        cache = self.domain_caches.get(seed_domain)
+        if cache is None:
+            cache = self.domain_caches[seed_domain] = {}
+        page = urlsplit(page_url)
+        origin = f"{page.scheme}://{page.netloc}"
+
+        child_urls = set()
+        for raw in raw_hrefs:
+            key = self.__domain_key(raw, origin)
+            if key is None:
+                url = self.__resolve(raw, page_url, seed_domain)
+            elif key in cache:
+                self.cache_hits += 1
+                url = cache[key]
+            else:
+                url = self.__resolve(raw, page_url, seed_domain)
+                if len(cache) >= self.cache_size:
+                    del cache[next(iter(cache))]
+                cache[key] = url
+            if url is not None:
+                child_urls.add(url)
+        return child_urls
+
+    def get_stats(self) -> dict:
+        return {
+            "pages": self.pages,
+            "anchors": self.anchors,
+            "unique_hrefs": self.unique_hrefs,
+            "cache_hits": self.cache_hits,
+            "evaluated": self.evaluated,
+            "cached_hrefs": sum(len(c) for c in self.domain_caches.values()),
+        }
@@ -1,11 +1,166 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import queue
+from seen_set import url_fingerprint
 
-def setup_logger(log_file="crawler.log"):
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[
-            logging.FileHandler(log_file)
-        ]
-    )
-    return logging.getLogger("crawler")
+LOGGER_NAME = "crawler"
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# Listener threads writing queued records, and the queue parse workers log to
+_listeners: list[logging.handlers.QueueListener] = []
+_file_handler = None
+_worker_queue = None
+_configured = False
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    # Records stay in this process, so the message is formatted by the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LazyLines:
+    """
+    Log lines kept as %-format templates with their arguments. They are only formatted
+    when read, e.g. by the formatter on the listener thread.
+    """
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, template: str, *args):
+        self.entries.append((template, args))
+
+    def extend(self, lines):
+        self.entries.extend((line, ()) for line in lines)
+
+    def lines(self) -> list[str]:
+        return [template % args if args else template for template, args in self.entries]
+
+    def __iter__(self):
+        return iter(self.lines())
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _json_default(value):
+    return value.lines() if isinstance(value, LazyLines) else str(value)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One compact JSON object per line: time, level, logger, message and the record's
+    `fields` (passed as `extra={"fields": {...}}`).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                 "msg": record.getMessage()}
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=_json_default)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    The plain text format, with a record's `fields` appended as compact JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + json.dumps(fields, separators=(",", ":"), default=_json_default)
+        return text
+
+
+class ExplanationSampler:
+    """
+    Picks the pages whose classifier explanation is built and logged at INFO: a share
+    `rate` of each domain's pages, or the domain's own rate from `domain_rates`. The pick
+    depends only on the URL, so it is the same in every process and run.
+    """
+
+    def __init__(self, rate: float = 0.0, domain_rates: dict[str, float] = None):
+        self.rate = rate
+        self.domain_rates = domain_rates or {}
+
+    def sampled(self, url: str, domain: str) -> bool:
+        rate = self.domain_rates.get(domain, self.rate)
+        return rate > 0 and url_fingerprint(url) % 10_000 < rate * 10_000
+
+
+def _start_listener(records):
+    listener = logging.handlers.QueueListener(records, _file_handler)
+    listener.start()
+    _listeners.append(listener)
+
+
+def setup_logger(log_file: str = "crawler.log", structured: bool = False, level=logging.INFO) -> logging.Logger:
+    """
+    The crawler's logger. Records go through a QueueHandler to a listener thread that
+    writes them to `log_file`, so a log call never waits on disk. With `structured` every
+    record is one compact JSON line. Only the first call configures logging, and only
+    the crawler's own logger: it does not propagate, and the root logger and its
+    handlers are left to the application.
+    """
+    global _file_handler, _configured
+    logger = logging.getLogger(LOGGER_NAME)
+    if _configured:
+        return logger
+
+    _configured = True
+    _file_handler = logging.FileHandler(log_file)
+    _file_handler.setFormatter(JSONFormatter() if structured else TextFormatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    logger.handlers = [_LocalQueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+    _start_listener(records)
+    atexit.register(stop_logging)
+    return logger
+
+
+def worker_log_queue() -> multiprocessing.Queue:
+    """
+    Queue for parse worker processes (see setup_worker_logger), written by a listener
+    thread of this process to the same log file.
+    """
+    global _worker_queue
+    if _worker_queue is None:
+        setup_logger()
+        _worker_queue = multiprocessing.Queue()
+        _start_listener(_worker_queue)
+    return _worker_queue
+
+
+def setup_worker_logger(records: multiprocessing.Queue, level) -> logging.Logger:
+    """
+    Send a worker process's crawler records to the main process, replacing the handlers
+    the crawler's logger inherited.
+    """
+    global _configured
+    _configured = True
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+    # Listeners inherited from the parent do not run here
+    _listeners.clear()
+    return logger
+
+
+def stop_logging():
+    """
+    Write out every queued record and stop the listener threads.
+    """
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from sub-millisecond frontier operations to browser timeouts
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, labels: tuple = ()):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus(self) -> list[str]:
+        return [f"{self.name}{format_labels(self.labels)} {self.value}"]
+
+
+class Gauge:
+    """
+    A value that is set directly, or read from `fn` whenever the registry is scraped so
+    queue depths cost nothing between scrapes.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, labels: tuple = (), fn=None):
+        self.name = name
+        self.labels = labels
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return None
+        return self.value
+
+    def prometheus(self) -> list[str]:
+        value = self.snapshot()
+        return [] if value is None else [f"{self.name}{format_labels(self.labels)} {value}"]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is one bisect and three additions.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float):
+        """
+        Upper bound of the bucket holding the q-quantile.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+    def prometheus(self) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{format_labels(self.labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{self.name}_bucket{format_labels(self.labels + (('le', '+Inf'),))} {self.count}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels)} {self.sum}")
+        lines.append(f"{self.name}_count{format_labels(self.labels)} {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms, optionally labelled. Looking a metric up
+    returns the same object every time, so hot paths look it up once and keep it.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def __get(self, cls, name: str, help: str, labels: dict, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = cls(name, key[1], **kwargs)
+                    self.metrics[key] = metric
+                    self.help.setdefault(name, help)
+        return metric
+
+    def counter(self, name: str, help: str = "", labels: dict = None) -> Counter:
+        return self.__get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", labels: dict = None, fn=None) -> Gauge:
+        gauge = self.__get(Gauge, name, help, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name: str, help: str = "", labels: dict = None,
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.__get(Histogram, name, help, labels, buckets=buckets)
+
+    def remove(self, name: str, labels: dict = None):
+        """
+        Drop a metric, e.g. a per-domain gauge whose callback holds on to the domain.
+        """
+        with self.lock:
+            self.metrics.pop((name, tuple(sorted((labels or {}).items()))), None)
+
+    def snapshot(self) -> dict:
+        """
+        {name: value} for unlabelled metrics, {name: {"k=v,...": value}} for labelled ones.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        result = {}
+        for metric in metrics:
+            if metric.labels:
+                label = ",".join(f"{k}={v}" for k, v in metric.labels)
+                result.setdefault(metric.name, {})[label] = metric.snapshot()
+            else:
+                result[metric.name] = metric.snapshot()
+        return result
+
+    def to_prometheus(self) -> str:
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: (m.name, m.labels))
+        lines = []
+        described = set()
+        for metric in metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                if self.help.get(metric.name):
+                    lines.append(f"# HELP {metric.name} {self.help[metric.name]}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry the crawl stages report to
+REGISTRY = MetricsRegistry()
+
+
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    """
+    Combine registry snapshots of several processes: counters and gauges are summed,
+    histogram counts and sums are added and their quantiles are the largest reported,
+    an upper bound of the merged quantile.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, value in snapshot.items():
+            merged[name] = _merge_value(merged.get(name), value)
+    return merged
+
+
+def _merge_value(current, value):
+    if current is None:
+        return dict(value) if isinstance(value, dict) else value
+    if value is None:
+        return current
+    if isinstance(value, dict) and "count" in value and "p50" in value:
+        merged = {"count": current["count"] + value["count"], "sum": round(current["sum"] + value["sum"], 6)}
+        for q in ("p50", "p90", "p99"):
+            known = [v for v in (current[q], value[q]) if v is not None]
+            merged[q] = max(known) if known else None
+        return merged
+    if isinstance(value, dict):
+        for label, labelled in value.items():
+            current[label] = _merge_value(current.get(label), labelled)
+        return current
+    return current + value
+
+
+class MetricsServer:
+    """
+    Serves a registry on a local port: Prometheus text at /metrics, JSON at /metrics.json.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.to_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+async def write_snapshots(path: str, interval: float = 10.0, registry: MetricsRegistry = REGISTRY):
+    """
+    Rewrite `path` with a JSON snapshot of the registry every `interval` seconds until cancelled.
+    """
+    loop = asyncio.get_event_loop()
+
+    def write():
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "metrics": registry.snapshot()}, f)
+        os.replace(tmp_path, path)
+
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(None, write)
+    finally:
+        await loop.run_in_executor(None, write)
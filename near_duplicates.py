@@ -0,0 +1,126 @@
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Optional, Union
+import numpy as np
+
+FINGERPRINT_BITS = 64
+# Letters and digits lowercased, every other byte a separator
+TOKEN_TABLE = bytes(c if chr(c).isalnum() and c < 128 else 32 for c in range(256)).lower()
+# Token hashes are memoized; the table is started over when it grows past this
+MAX_CACHED_TOKENS = 1_000_000
+# Site-wide boilerplate, left out of the fingerprint so pages sharing a large navigation
+# are compared by their own content
+BOILERPLATE_PATTERN = re.compile(rb"<(script|style|nav|header|footer|noscript|svg)\b.*?</\1\s*>",
+                                 re.IGNORECASE | re.DOTALL)
+
+
+class _TokenHashes(dict):
+    def __missing__(self, token: bytes) -> int:
+        value = self[token] = int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), "little")
+        return value
+
+
+_token_hashes = _TokenHashes()
+
+
+def simhash(html: Union[str, bytes]) -> int:
+    """
+    64-bit SimHash of a page over the distinct 3-token shingles of its main content:
+    markup, link targets and text alike, without scripts, styles, nav, header and footer.
+    Pages that differ in a few words are a few bits apart, unrelated pages about half the
+    bits.
+    """
+    if isinstance(html, str):
+        html = html.encode("utf-8", "replace")
+    tokens = BOILERPLATE_PATTERN.sub(b" ", html).translate(TOKEN_TABLE).split()
+    if not tokens:
+        return 0
+    if len(_token_hashes) > MAX_CACHED_TOKENS:
+        _token_hashes.clear()
+    hashes = list(map(_token_hashes.__getitem__, tokens)) + [0, 0]
+    # Tuples of ints hash the same in every process, unlike str and bytes
+    shingles = set(map(hash, zip(hashes, hashes[1:], hashes[2:max(3, len(tokens))])))
+    values = np.fromiter(shingles, dtype=np.int64, count=len(shingles))
+    bits = np.unpackbits(values.view(np.uint8)).reshape(-1, FINGERPRINT_BITS)
+    majority = bits.sum(axis=0) * 2 > len(values)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """
+    SimHash fingerprints of recently seen pages, each with a value (e.g. the page's parse
+    result), looked up by Hamming distance.
+
+    Fingerprints are cut into `max_distance + 1` bands. Two fingerprints at most
+    `max_distance` bits apart agree on at least one band, so a lookup only compares the
+    fingerprints that share a band with it. Pages only match within their `scope` (e.g.
+    their seed domain). Up to `capacity` pages are kept, the oldest are dropped first.
+    """
+
+    def __init__(self, max_distance: int = 3, capacity: int = 20_000):
+        self.max_distance = max_distance
+        self.capacity = capacity
+        bands = max_distance + 1
+        edges = [i * FINGERPRINT_BITS // bands for i in range(bands + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self.tables: list[dict[tuple, set]] = [{} for _ in self.bands]
+        self.entries: OrderedDict[tuple, object] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.exact_hits = 0
+
+    def __keys(self, fingerprint: int, scope):
+        return [(scope, (fingerprint >> shift) & mask) for shift, mask in self.bands]
+
+    def lookup(self, fingerprint: int, scope=None) -> Optional[tuple[int, object]]:
+        """
+        (distance, value) of the nearest page of `scope` within `max_distance` bits, or None.
+        """
+        self.lookups += 1
+        if (scope, fingerprint) in self.entries:
+            self.hits += 1
+            self.exact_hits += 1
+            return 0, self.entries[scope, fingerprint]
+
+        best = None
+        for table, key in zip(self.tables, self.__keys(fingerprint, scope)):
+            for candidate in table.get(key, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = distance, candidate
+        if best is None:
+            return None
+        self.hits += 1
+        return best[0], self.entries[scope, best[1]]
+
+    def add(self, fingerprint: int, value, scope=None):
+        if (scope, fingerprint) in self.entries:
+            return
+        self.entries[scope, fingerprint] = value
+        for table, key in zip(self.tables, self.__keys(fingerprint, scope)):
+            table.setdefault(key, set()).add(fingerprint)
+        while len(self.entries) > self.capacity:
+            self.__drop(*self.entries.popitem(last=False)[0])
+
+    def __drop(self, scope, fingerprint: int):
+        for table, key in zip(self.tables, self.__keys(fingerprint, scope)):
+            members = table[key]
+            members.discard(fingerprint)
+            if not members:
+                del table[key]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_stats(self) -> dict:
+        return {
+            "pages": len(self.entries),
+            "lookups": self.lookups,
+            "near_duplicates": self.hits,
+            "exact_duplicates": self.exact_hits,
+        }
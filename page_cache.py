@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class CachedPage:
+    url: str
+    content_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    # Tier that produced the body; a rendered page is revalidated against its raw document
+    tier: str
+    fetched_at: float
+
+    @property
+    def revalidatable(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    On-disk page cache keyed by canonical URL.
+
+    Bodies are stored zlib-compressed under the SHA-256 of their content
+    (`objects/ab/cdef....z`), so pages with identical bodies share one file. A SQLite
+    index (WAL mode) maps each URL to its content hash, ETag, Last-Modified, the tier
+    that fetched it and when. Entries younger than `fresh_for` seconds are served without
+    a request; older ones are revalidated with a conditional GET where the tier allows
+    it. Safe to use from the fetcher threads.
+    """
+
+    def __init__(self, directory: str, fresh_for: float = 0.0, compress_level: int = 6):
+        self.directory = directory
+        self.objects = os.path.join(directory, "objects")
+        self.fresh_for = fresh_for
+        self.compress_level = compress_level
+        os.makedirs(self.objects, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, "pages.sqlite"), check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                tier TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.stats = {"lookups": 0, "fresh_hits": 0, "revalidated": 0, "stored": 0, "shared_bodies": 0,
+                      "missing_bodies": 0, "bytes_stored": 0, "bytes_not_transferred": 0}
+
+    def __object_path(self, content_hash: str) -> str:
+        return os.path.join(self.objects, content_hash[:2], content_hash[2:] + ".z")
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        with self.lock:
+            self.stats["lookups"] += 1
+            row = self.db.execute(
+                "SELECT url, content_hash, etag, last_modified, tier, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return CachedPage(*row) if row else None
+
+    def is_fresh(self, entry: CachedPage) -> bool:
+        return time.time() - entry.fetched_at < self.fresh_for
+
+    def read(self, entry: CachedPage) -> Optional[bytes]:
+        """
+        The cached body, or None if its object file is gone (the entry is dropped then).
+        """
+        try:
+            with open(self.__object_path(entry.content_hash), "rb") as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            with self.lock:
+                self.stats["missing_bodies"] += 1
+                self.db.execute("DELETE FROM pages WHERE url = ?", (entry.url,))
+            return None
+        with self.lock:
+            self.stats["bytes_not_transferred"] += len(body)
+        return body
+
+    def put(self, url: str, body: bytes, tier: str, etag: str = None, last_modified: str = None) -> str:
+        """
+        Store a fetched body for `url` and return its content hash.
+        """
+        content_hash = hashlib.sha256(body).hexdigest()
+        path = self.__object_path(content_hash)
+        shared = os.path.exists(path)
+        if not shared:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written aside and renamed, so a reader never sees half a file
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(zlib.compress(body, self.compress_level))
+            os.replace(temp_path, path)
+        with self.lock:
+            self.stats["stored"] += 1
+            if shared:
+                self.stats["shared_bodies"] += 1
+            else:
+                self.stats["bytes_stored"] += os.path.getsize(path)
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages (url, content_hash, etag, last_modified, tier, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, content_hash, etag, last_modified, tier, time.time()),
+            )
+        return content_hash
+
+    def refresh(self, entry: CachedPage, etag: str = None, last_modified: str = None):
+        """
+        The server confirmed the cached body (304): keep it, with any new validators.
+        """
+        with self.lock:
+            self.stats["revalidated"] += 1
+            self.db.execute(
+                "UPDATE pages SET etag = ?, last_modified = ?, fetched_at = ? WHERE url = ?",
+                (etag or entry.etag, last_modified or entry.last_modified, time.time(), entry.url),
+            )
+
+    def record_fresh_hit(self):
+        with self.lock:
+            self.stats["fresh_hits"] += 1
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return dict(self.stats)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
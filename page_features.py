@@ -0,0 +1,174 @@
+import re
+from dataclasses import dataclass, asdict
+from typing import Optional, Union
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import PreformattedString
+from lxml import etree
+
+PRICE_PATTERN = re.compile(r'(₹|\$|€)\s?\d{2,}')
+CTA_PATTERN = re.compile(r"(add to cart|buy now|select size|select color)", re.IGNORECASE)
+SPEC_PATTERN = re.compile(r"product details|specifications| select size| add to wishlist| know your product", re.IGNORECASE)
+RELATED_PATTERN = re.compile(r"similar products|you may also like|recommended", re.IGNORECASE)
+
+SKIPPED_TAGS = frozenset(("script", "style"))
+FEED_CHUNK_SIZE = 64 * 1024
+
+# Browsers look for the page's own charset declaration in its first KB
+CHARSET_SNIFF_BYTES = 1024
+META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+BOMS = ((b"\xef\xbb\xbf", "utf-8"), (b"\xff\xfe", "utf-16"), (b"\xfe\xff", "utf-16"))
+
+
+@dataclass
+class PageFeatures:
+    """
+    Compact record of the page signals the classifier scores.
+
+    `complete` is False when extraction stopped early because no further content could
+    change the verdict; the counters then only cover the part of the page that was read.
+    """
+    price_hits: int = 0
+    price_text: Optional[str] = None
+    cta_count: int = 0
+    cta_text: Optional[str] = None
+    has_spec_section: bool = False
+    has_related_section: bool = False
+    num_forms: int = 0
+    num_inputs: int = 0
+    num_links: int = 0
+    num_images: int = 0
+    complete: bool = True
+
+    @property
+    def has_inputs_or_forms(self) -> bool:
+        return self.num_forms > 0 or self.num_inputs > 0
+
+    @property
+    def saturated(self) -> bool:
+        """
+        True once every signal the classifier scores has reached its final value.
+        """
+        return (self.price_hits > 0 and self.cta_count > 1 and self.has_spec_section
+                and self.has_related_section and self.has_inputs_or_forms)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class FeatureCollector:
+    """
+    Streaming parser target that accumulates PageFeatures from start/end/data events.
+    Text between two tags is matched as one string, the way BeautifulSoup splits it.
+    """
+
+    def __init__(self):
+        self.features = PageFeatures()
+        self.skip_depth = 0
+        self.buffer = []
+
+    def start(self, tag, attrib=None):
+        self.flush()
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        else:
+            self.count_tag(tag)
+
+    def count_tag(self, tag):
+        if tag == "a":
+            self.features.num_links += 1
+        elif tag == "img":
+            self.features.num_images += 1
+        elif tag == "input":
+            self.features.num_inputs += 1
+        elif tag == "form":
+            self.features.num_forms += 1
+
+    def end(self, tag):
+        self.flush()
+        if tag in SKIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, text):
+        if not self.skip_depth:
+            self.buffer.append(text)
+
+    def comment(self, text):
+        self.flush()
+
+    def close(self):
+        self.flush()
+        return self.features
+
+    def flush(self):
+        if not self.buffer:
+            return
+        text = "".join(self.buffer) if len(self.buffer) > 1 else self.buffer[0]
+        self.buffer = []
+        if not text.isspace():
+            self.match_text(text)
+
+    def match_text(self, text: str):
+        features = self.features
+        if PRICE_PATTERN.search(text):
+            features.price_hits += 1
+            if features.price_text is None:
+                features.price_text = text.strip()
+        if CTA_PATTERN.search(text):
+            features.cta_count += 1
+            if features.cta_text is None:
+                features.cta_text = text.strip()
+        if not features.has_spec_section and SPEC_PATTERN.search(text):
+            features.has_spec_section = True
+        if not features.has_related_section and RELATED_PATTERN.search(text):
+            features.has_related_section = True
+
+
+def declared_encoding(html: bytes) -> Optional[str]:
+    """
+    The encoding a page declares with a byte order mark or a meta charset, None if it
+    declares none.
+    """
+    for bom, encoding in BOMS:
+        if html.startswith(bom):
+            return encoding
+    match = META_CHARSET.search(html, 0, CHARSET_SNIFF_BYTES)
+    return match.group(1).decode("ascii").lower() if match else None
+
+
+def extract_features(html: Union[str, bytes], stop_early: bool = True) -> PageFeatures:
+    """
+    Extract page features in one streaming pass over the raw HTML. A bytes page is
+    decoded as it declares itself (left to lxml), or as UTF-8 if it declares nothing.
+    """
+    collector = FeatureCollector()
+    if not html:
+        return collector.features
+
+    encoding = None
+    if isinstance(html, bytes) and declared_encoding(html) is None:
+        encoding = "utf-8"
+    parser = etree.HTMLParser(target=collector, encoding=encoding)
+    for offset in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[offset:offset + FEED_CHUNK_SIZE])
+        if stop_early and collector.features.saturated:
+            collector.features.complete = offset + FEED_CHUNK_SIZE >= len(html)
+            break
+    return parser.close()
+
+
+def extract_features_from_soup(soup: BeautifulSoup, stop_early: bool = True) -> PageFeatures:
+    """
+    Extract page features in one traversal of an already parsed BeautifulSoup tree.
+    """
+    collector = FeatureCollector()
+    for element in soup.descendants:
+        if isinstance(element, Tag):
+            collector.count_tag(element.name)
+        elif isinstance(element, NavigableString) and not isinstance(element, PreformattedString):
+            parent = element.parent
+            if (parent is None or parent.name not in SKIPPED_TAGS) and not element.isspace():
+                collector.match_text(element)
+        if stop_early and collector.features.saturated:
+            collector.features.complete = False
+            break
+    return collector.features
@@ -0,0 +1,167 @@
+import asyncio
+import resource
+import zlib
+from collections import deque
+
+PAGE_SIZE = resource.getpagesize()
+
+
+def current_rss() -> int:
+    """
+    Resident set size of this process in bytes, 0 where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def peak_rss() -> int:
+    """
+    Peak resident set size of this process in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def decompress_page(payload: bytes) -> bytes:
+    return zlib.decompress(payload)
+
+
+class PageQueue:
+    """
+    Queue of fetched pages bounded by the total size of the queued page bytes.
+
+    put() waits while the queue holds `max_bytes` or more, so fetchers slow down to
+    the pace of the parsers; a page that is larger than the whole budget is still let in
+    when the queue is empty. With `compress` set, page bytes are zlib-compressed on the
+    way in and the consumer gets them compressed (see decompress_page). Items are
+    (payload, *rest) tuples or None as a stop sentinel.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, compress: bool = False, compress_level: int = 1):
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.compress_level = compress_level
+        self.items = deque()
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.unfinished = 0
+        self.paused = False
+        self.blocked_puts = 0
+        self.condition = asyncio.Condition()
+        self.finished = asyncio.Event()
+        self.finished.set()
+
+    def __admits(self, size: int) -> bool:
+        if not self.items:
+            return True
+        return not self.paused and self.bytes + size <= self.max_bytes
+
+    async def put(self, item):
+        size = 0
+        if item is not None:
+            payload, *rest = item
+            self.raw_bytes += len(payload)
+            if self.compress:
+                payload = zlib.compress(payload, self.compress_level)
+            size = len(payload)
+            self.stored_bytes += size
+            item = (payload, *rest)
+
+        async with self.condition:
+            if not self.__admits(size):
+                self.blocked_puts += 1
+                await self.condition.wait_for(lambda: self.__admits(size))
+            self.items.append((size, item))
+            self.bytes += size
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+            self.unfinished += 1
+            self.finished.clear()
+            self.condition.notify_all()
+
+    async def get(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.items)
+            item = self.__pop()
+            self.condition.notify_all()
+            return item
+
+    def get_nowait(self):
+        if not self.items:
+            raise asyncio.QueueEmpty
+        item = self.__pop()
+        # Wake fetchers waiting for room without blocking the caller
+        asyncio.get_event_loop().create_task(self.__notify())
+        return item
+
+    def __pop(self):
+        size, item = self.items.popleft()
+        self.bytes -= size
+        return item
+
+    async def __notify(self):
+        async with self.condition:
+            self.condition.notify_all()
+
+    def task_done(self):
+        self.unfinished -= 1
+        if self.unfinished <= 0:
+            self.finished.set()
+
+    async def join(self):
+        await self.finished.wait()
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    async def set_paused(self, paused: bool):
+        async with self.condition:
+            self.paused = paused
+            self.condition.notify_all()
+
+    def get_stats(self) -> dict:
+        return {
+            "queued": len(self.items),
+            "queued_bytes": self.bytes,
+            "peak_queued_bytes": self.peak_bytes,
+            "max_bytes": self.max_bytes,
+            "blocked_puts": self.blocked_puts,
+            "compression_ratio": round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else None,
+        }
+
+
+class MemoryGuard:
+    """
+    Holds the process under `ceiling` bytes of RSS: while it is above, the page queue
+    stops admitting new pages (beyond one at a time) until RSS falls below
+    `resume_ratio` of the ceiling. Also tracks the peak RSS it has seen.
+    """
+
+    def __init__(self, queue: PageQueue, ceiling: int, interval: float = 0.25, resume_ratio: float = 0.9):
+        self.queue = queue
+        self.ceiling = ceiling
+        self.interval = interval
+        self.resume_ratio = resume_ratio
+        self.peak = 0
+        self.pauses = 0
+
+    async def run(self):
+        while True:
+            rss = current_rss()
+            self.peak = max(self.peak, rss)
+            if not self.queue.paused and rss > self.ceiling:
+                self.pauses += 1
+                await self.queue.set_paused(True)
+            elif self.queue.paused and rss < self.ceiling * self.resume_ratio:
+                await self.queue.set_paused(False)
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> dict:
+        return {
+            "ceiling_mb": round(self.ceiling / 2 ** 20, 1),
+            "peak_sampled_rss_mb": round(self.peak / 2 ** 20, 1),
+            "pauses": self.pauses,
+        }
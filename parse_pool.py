@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from html_parser import HTMLParser
+from logger_config import ExplanationSampler, LOGGER_NAME, setup_worker_logger, worker_log_queue
+from near_duplicates import NearDuplicateIndex
+from page_queue import decompress_page
+from url_canonicalizer import URLCanonicalizer
+from vector_classifier import VectorClassifier
+
+# Per-process parser, created once by the pool initializer
+_worker_parser = None
+
+
+def init_worker(canonicalizer: URLCanonicalizer = None, model: VectorClassifier = None,
+                near_duplicates: NearDuplicateIndex = None, sampler: ExplanationSampler = None,
+                log_queue=None, log_level: int = logging.INFO):
+    global _worker_parser
+    # Worker processes hand their log records to the main process
+    if log_queue is not None:
+        setup_worker_logger(log_queue, log_level)
+    # Importing html_parser already compiled the URL and page feature patterns
+    _worker_parser = HTMLParser(canonicalizer=canonicalizer, model=model, near_duplicates=near_duplicates,
+                                sampler=sampler)
+
+
+def error_result(url: str, error: Exception) -> dict:
+    return {
+        "url": url,
+        "child_urls": set(),
+        "product_urls": set(),
+        "is_product_page": False,
+        "confidence": 0.0,
+        "score": 0.0,
+        "features": None,
+        "error": repr(error),
+    }
+
+
+def parse_batch(items: list[tuple[str, bytes, str]], compressed: bool = False) -> list[dict]:
+    """
+    Parse a batch of (url, html, seed_domain) items inside a pool worker. A page that
+    fails to parse yields an empty result with an `error` instead of failing the batch.
+    Compressed pages are only inflated here, so they also cross the process boundary small.
+    """
+    if _worker_parser is None:
+        init_worker()
+    if compressed:
+        items = [(url, decompress_page(html), seed_domain) for url, html, seed_domain in items]
+
+    if _worker_parser.model is not None:
+        try:
+            return _worker_parser.parse_pages(items)
+        except Exception:
+            # Fall back to one page at a time to isolate the page that failed
+            pass
+
+    results = []
+    for url, html, seed_domain in items:
+        try:
+            results.append(_worker_parser.parse_page(url, html, seed_domain))
+        except Exception as e:
+            results.append(error_result(url, e))
+    return results
+
+
+class ParsePool:
+    """
+    Parse stage backed by a process pool so parsing and classification run off the
+    event loop and across cores. With `workers=0` batches are parsed inline. With a
+    vector `model` each batch is classified in one matrix product. Every worker starts
+    with its own copy of `near_duplicates` and fills it with the pages it parses. Workers
+    log through a queue to this process, at this process's level.
+    """
+
+    def __init__(self, workers: int = None, batch_size: int = 8, canonicalizer: URLCanonicalizer = None,
+                 model: VectorClassifier = None, near_duplicates: NearDuplicateIndex = None,
+                 sampler: ExplanationSampler = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.batch_size = batch_size
+        self.canonicalizer = canonicalizer
+        self.model = model
+        self.near_duplicates = near_duplicates
+        self.sampler = sampler
+        self.executor = None
+
+    def start(self):
+        if self.workers == 0:
+            init_worker(self.canonicalizer, self.model, self.near_duplicates, self.sampler)
+        elif self.executor is None:
+            log_level = logging.getLogger(LOGGER_NAME).getEffectiveLevel()
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker,
+                initargs=(self.canonicalizer, self.model, self.near_duplicates, self.sampler, worker_log_queue(),
+                          log_level),
+            )
+
+    async def parse(self, items: list[tuple[str, bytes, str]], compressed: bool = False) -> list[dict]:
+        if self.executor is None:
+            return parse_batch(items, compressed)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, parse_batch, items, compressed)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -1,8 +1,10 @@
-import math, re
+import math
+from typing import Union
 from bs4 import BeautifulSoup
-from urllib.parse import urlparse, parse_qs
 from product_url_analyser import is_product_url
 from feature_weights import DEFAULT_FEATURE_WEIGHTS
+from page_features import extract_features, extract_features_from_soup
+from logger_config import LazyLines
 
 class ProductPageClassifier:
     """
@@ -13,83 +15,94 @@ class ProductPageClassifier:
     def sigmoid(x):
         return 1 / (1 + math.exp(-x))
 
-    def analyze(self, soup: BeautifulSoup, url: str = "", weights: dict = None, logger=print):
+    def analyze(self, soup: Union[BeautifulSoup, str, bytes], url: str = "", weights: dict = None, logger=print,
+                explain: bool = True):
+        """
+        Score a page. With `explain` the reasons are collected under `explanation` (as
+        LazyLines, formatted when read) and the verdict is passed to `logger` (if any);
+        without it neither is built.
+        """
         weights = weights or DEFAULT_FEATURE_WEIGHTS
         score = 0.0
-        explanation = []
+        explanation = LazyLines() if explain else None
 
-        for script in soup(["script", "style"]):
-            script.decompose()
+        def log(msg, *args):
+            # Kept as a template, formatted when the explanation is written
+            if explain:
+                explanation.add(msg, *args)
 
-        def log(msg):
-            explanation.append(msg + "\n")
+        # All page signals come from a single pass over the page
+        if isinstance(soup, BeautifulSoup):
+            features = extract_features_from_soup(soup)
+        else:
+            features = extract_features(soup)
 
         # --- Price Detection ---
-        price_texts = soup.find_all(string=re.compile(r'(₹|\$|€)\s?\d{2,}'))
-        if price_texts:
+        if features.price_hits:
             score += weights["price_present"]
-            log(f"+{weights['price_present']}: Price found '{price_texts[0].strip()}'")
+            log("+%s: Price found '%s'", weights['price_present'], features.price_text)
         else:
             score += weights["no_price_at_all"]
-            log(f"{weights['no_price_at_all']}: No price detected")
+            log("%s: No price detected", weights['no_price_at_all'])
 
         # --- CTA Detection ---
-        cta_texts = soup.find_all(string=re.compile(r"(add to cart|buy now|select size|select color)", re.IGNORECASE))
-        if len(cta_texts) != 1:
+        if features.cta_count != 1:
             score -= weights["multiple_cta"]
-            log(f"-5.0: Buy text is occurence  : ({len(cta_texts)})")
+            log("-5.0: Buy text is occurence  : (%s)", features.cta_count)
         else:
             score += weights['exact_one_cta'];
-            log(f"+{weights['exact_one_cta']}: Exactly one 'Add to Cart' or 'Buy Now' CTA found: {cta_texts[0].strip()}")
+            log("+%s: Exactly one 'Add to Cart' or 'Buy Now' CTA found: %s", weights['exact_one_cta'], features.cta_text)
 
-        if soup.find(string=re.compile(r"product details|specifications| select size| add to wishlist| know your product", re.IGNORECASE)):
+        if features.has_spec_section:
             score += weights["spec_section"]
-            log(f"+{weights['spec_section']}: Product details section found")
+            log("+%s: Product details section found", weights['spec_section'])
 
         # if soup.find(attrs={"itemtype": re.compile(r"Product", re.IGNORECASE)}):
         #     score += weights["semantic_schema"]
         #     log(f"+{weights['semantic_schema']}: Schema.org Product detected")
 
-        if soup.find(string=re.compile(r"similar products|you may also like|recommended", re.IGNORECASE)):
+        if features.has_related_section:
             score += weights["related_products"]
-            log(f"+{weights['related_products']}: Related/recommended section found")
+            log("+%s: Related/recommended section found", weights['related_products'])
 
-        num_links = len(soup.find_all("a"))
-        # if num_links > 20:
+        # if features.num_links > 20:
         #     score += weights["many_links"]
-        #     log(f"{weights['many_links']}: Many links ({num_links})")
+        #     log(f"{weights['many_links']}: Many links ({features.num_links})")
 
-        if not soup.find("input") and not soup.find("form"):
+        if not features.has_inputs_or_forms:
             score += weights["no_inputs_or_forms"]
-            log(f"{weights['no_inputs_or_forms']}: No inputs/forms found")
+            log("%s: No inputs/forms found", weights['no_inputs_or_forms'])
 
         # --- URL Analysis ---
-        is_prod_url, url_score, url_explanation = is_product_url(url)
+        is_prod_url, url_score, url_explanation = is_product_url(url, explain=explain)
         if is_prod_url:
             score += 2.0
         # score += url_score
-        explanation.extend(url_explanation)
-
-        confidence = ProductPageClassifier.sigmoid(score)
-        is_product_page = confidence >= 0.8
+        if explain:
+            explanation.extend(url_explanation)
 
         # Short-circuit if confidence is low
-        if not len(cta_texts) == 1 and not price_texts:
+        if not features.cta_count == 1 and not features.price_hits:
             confidence = 0.0
             is_product_page = False
             log("Short-circuited: Lacking all core indicators (CTA, price, image)")
+        else:
+            confidence = ProductPageClassifier.sigmoid(score)
+            is_product_page = confidence >= 0.8
 
-        logger(f"""
+        if explain and logger is not None:
+            logger(f"""
         Url: {url}
         Final score: {score}
         Confidence: {confidence:.4f}
         Is product page: {is_product_page}
         """)
-        logger("Explanation:\n" + "".join(explanation))
+            logger("Explanation:\n" + "\n".join(explanation))
 
         return {
             "is_product_page": is_product_page,
             "confidence": round(confidence, 4),
             "score": round(score, 2),
-            "explanation": explanation
+            "explanation": explanation,
+            "features": features.to_dict(),
         }
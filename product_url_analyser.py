@@ -1,132 +1,281 @@
 import re
 import urllib.parse
-from typing import List, Set, Dict, Optional
+from functools import lru_cache
+from typing import List, Dict, NamedTuple, Optional
 from feature_weights import DEFAULL_PRODUCT_URL_WEIGHTS
 from product_patterns import DEAD_END_PATTERNS, PRODUCT_URL_PATTERNS
 
+# Path-only checks that are anchored to the end of the path or only make sense on it
+PATH_DEAD_END_PATTERNS = {
+    'file_extension': [r'\.(?:css|js|json|xml|txt|pdf|zip|rar|exe|dmg|pkg)$'],
+    'media_file': [r'\.(?:jpg|jpeg|png|gif|svg|ico|webp|mp4|mp3|wav|pdf)$'],
+    'social': [r'/share', r'/social', r'/follow'],
+    'newsletter': [r'/email', r'/newsletter', r'/subscribe'],
+    'file_download': [r'/download', r'/file', r'/attachment', r'/document'],
+}
+
+VERDICT_CACHE_SIZE = 100_000
+REGEX_METACHARS = set(".^$*+?{}[]|()")
+QUANTIFIERS = set("?*{")
+
+
+class URLVerdict(NamedTuple):
+    is_dead_end: bool
+    is_product: bool
+    category: Optional[str] = None
+    pattern: Optional[str] = None
+
+
+def literal_prefix(pattern: str) -> tuple[str, bool]:
+    """
+    Leading literal text of a regex and whether the whole pattern is that literal.
+    """
+    literal = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            char = pattern[i + 1]
+            step = 2
+        elif char in REGEX_METACHARS:
+            break
+        else:
+            step = 1
+        if i + step < len(pattern) and pattern[i + step] in QUANTIFIERS:
+            break
+        literal.append(char)
+        i += step
+    return "".join(literal), i == len(pattern)
+
+
+class PatternIndex:
+    """
+    A list of (category, pattern) pairs indexed by the literal text that follows their
+    leading slash.
+
+    A pattern that starts with a slash can only match right after one of the slashes in
+    the text, so search() walks those slashes and only tries the patterns whose literal
+    prefix is actually there. Patterns without such a prefix are searched as a whole.
+    """
+
+    def __init__(self, labelled_patterns: List[tuple]):
+        self.by_first_char: Dict[str, list] = {}
+        self.floating = []
+        self.floating_literals: Dict[str, tuple] = {}
+        for category, pattern in labelled_patterns:
+            label = (category, pattern)
+            prefix, is_literal = literal_prefix(pattern)
+            if len(prefix) > 1 and prefix[0] == "/":
+                regex = None if is_literal else re.compile(pattern)
+                self.by_first_char.setdefault(prefix[1], []).append((prefix[1:], regex, label))
+            elif is_literal:
+                self.floating_literals.setdefault(prefix, label)
+            else:
+                self.floating.append((re.compile(pattern), label))
+
+        # Literals that may appear anywhere share one scan
+        self.literal_regex = None
+        if self.floating_literals:
+            alternatives = sorted(self.floating_literals, key=len, reverse=True)
+            self.literal_regex = re.compile("|".join(re.escape(l) for l in alternatives))
+
+    def search(self, text: str) -> Optional[tuple]:
+        if self.literal_regex is not None:
+            match = self.literal_regex.search(text)
+            if match:
+                return self.floating_literals[match.group(0)]
+        for regex, label in self.floating:
+            if regex.search(text):
+                return label
+
+        index = self.by_first_char
+        pos = text.find("/")
+        while pos != -1:
+            candidates = index.get(text[pos + 1:pos + 2])
+            if candidates:
+                for literal, regex, label in candidates:
+                    if text.startswith(literal, pos + 1) and (regex is None or regex.match(text, pos)):
+                        return label
+            pos = text.find("/", pos + 1)
+        return None
+
+
+class URLPatternEngine:
+    """
+    Dead-end and product URL patterns compiled once into prefix indexes.
+    """
+
+    def __init__(self, dead_end_patterns: Dict[str, List[str]] = None,
+                 product_patterns: List[str] = None,
+                 path_dead_end_patterns: Dict[str, List[str]] = None):
+        dead_end_patterns = dead_end_patterns or DEAD_END_PATTERNS
+        path_dead_end_patterns = path_dead_end_patterns or PATH_DEAD_END_PATTERNS
+        product_patterns = product_patterns or PRODUCT_URL_PATTERNS
+
+        self.url_dead_ends = PatternIndex(
+            [(category, p) for category, patterns in dead_end_patterns.items() for p in patterns]
+        )
+        self.path_dead_ends = PatternIndex(
+            [(category, p) for category, patterns in path_dead_end_patterns.items() for p in patterns]
+        )
+        self.products = PatternIndex([("product", p) for p in product_patterns])
+
+    def classify(self, url: str) -> URLVerdict:
+        """
+        Classify an already normalized (lowercased, stripped) URL in a single pass.
+        """
+        path = url_path(url)
+
+        hit = self.path_dead_ends.search(path) or self.url_dead_ends.search(url)
+        if hit:
+            return URLVerdict(True, False, *hit)
+
+        hit = self.products.search(path)
+        if hit:
+            return URLVerdict(False, True, *hit)
+
+        return URLVerdict(False, False)
+
+
+ENGINE = URLPatternEngine()
+
+
+def url_path(url: str) -> str:
+    """
+    Same result as urllib.parse.urlparse(url).path, without building the whole tuple
+    for the common `scheme://host/path?query` shape.
+    """
+    scheme_end = url.find("://")
+    if scheme_end == -1 or ";" in url or not url[:scheme_end].isalnum():
+        return urllib.parse.urlparse(url).path
+
+    start = len(url)
+    for sep in "/?#":
+        pos = url.find(sep, scheme_end + 3)
+        if pos != -1 and pos < start:
+            start = pos
+    if start == len(url) or url[start] != "/":
+        return ""
+
+    end = len(url)
+    for sep in "?#":
+        pos = url.find(sep, start)
+        if pos != -1 and pos < end:
+            end = pos
+    return url[start:end]
+
+
+def normalize_url(url: str) -> str:
+    return url.lower().strip()
+
+
+@lru_cache(maxsize=VERDICT_CACHE_SIZE)
+def _classify_normalized(url: str) -> URLVerdict:
+    return ENGINE.classify(url)
+
+
+def classify_url(url: str) -> Optional[URLVerdict]:
+    """
+    Cached verdict for a URL, or None if it is not a usable URL string.
+    """
+    if not url or not isinstance(url, str):
+        return None
+    return _classify_normalized(normalize_url(url))
+
+
+def verdict_cache_info():
+    return _classify_normalized.cache_info()
+
+
 class ProductURLAnalyzer:
     """
     Comprehensive product URL analyzer for e-commerce crawling.
     Supports major platforms and provides extensive URL classification.
     """
 
-    def is_product_url(self, url: str, weights: dict = None):
+    def is_product_url(self, url: str, weights: dict = None, explain: bool = True):
         """
         Comprehensive method to determine if a URL is a product URL.
-        
+
         Args:
             url (str): The URL to analyze
             weights (dict, optional): Weights for scoring different URL patterns.
                                        Defaults to DEFAULL_PRODUCT_URL_WEIGHTS.
+            explain (bool, optional): Build the explanation; left empty when False.
         Returns:
-            bool: True if the URL is likely a product URL, False otherwise
+            tuple: (is_product, score, explanation)
         """
 
         score = 0.0
         explanation = []
         weights = weights or DEFAULL_PRODUCT_URL_WEIGHTS
 
-
-        if not url or not isinstance(url, str):
+        verdict = classify_url(url)
+        if verdict is None:
             score = weights.get('invalid_url', 0)
-            explanation.append(f"{weights['invalid_url']} : Invalid Url {score}")
-            return False
-            
-        url = url.lower().strip()
-        parsed_url = urllib.parse.urlparse(url)
-        domain = parsed_url.netloc.replace('www.', '')
-        path = parsed_url.path
-        query = parsed_url.query
-        score = 0
-        explanation = []
-        
+            if explain:
+                explanation.append(f"{score} : Invalid Url {score}")
+            return False, score, explanation
+
         # Check if it's a dead-end URL first (higher priority)
-        if self.is_dead_end_url(url):
-            score = weights.get('dead_end_url', 0) 
-            explanation.append(f"{weights['dead_end_url']} : Dead-end URL {score}")
-            return False , score, explanation
-        
+        if verdict.is_dead_end:
+            score = weights.get('is_dead_end', 0)
+            if explain:
+                explanation.append(f"{score} : Dead-end URL ({verdict.category} {verdict.pattern}) {score}")
+            return False, score, explanation
+
         # Check for product URL patterns
-        for pattern in PRODUCT_URL_PATTERNS:
-            if re.search(pattern, path):
-                score += weights.get('product_pattern', 1)
-                explanation.append(f"{weights['product_pattern']} : Product pattern matched {pattern} {score}")
-                return True, score, explanation
-        
+        if verdict.is_product:
+            score += weights.get('product_pattern', 1)
+            if explain:
+                explanation.append(f"{weights.get('product_pattern', 1)} : Product pattern matched {verdict.pattern} {score}")
+            return True, score, explanation
+
         return False, score, explanation
-    
+
     def is_dead_end_url(self, url: str) -> bool:
         """
         Comprehensive method to determine if a URL will never lead to a product URL.
-        
+
         Args:
             url (str): The URL to analyze
-            
+
         Returns:
             bool: True if the URL is a dead-end that won't lead to products, False otherwise
         """
-        if not url or not isinstance(url, str):
-            return True
-            
-        # Normalize URL
-        url = url.lower().strip()
-        parsed_url = urllib.parse.urlparse(url)
-        domain = parsed_url.netloc.replace('www.', '')
-        path = parsed_url.path
-        query = parsed_url.query
-        fragment = parsed_url.fragment
-        
-        # Check for file extensions that are never product pages
-        if re.search(r'\.(css|js|json|xml|txt|pdf|zip|rar|exe|dmg|pkg)$', path):
-            return True
-        
-        # Check for media files
-        if re.search(r'\.(jpg|jpeg|png|gif|svg|ico|webp|mp4|mp3|wav|pdf)$', path):
-            return True
-        
-        # Check dead-end patterns
-        for category, patterns in DEAD_END_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, path) or re.search(pattern, url):
-                    return True
-        
-        if re.search(r'/(share|social|follow)', path):
-            return True
-        
-        # Check for email/newsletter URLs
-        if re.search(r'/(email|newsletter|subscribe)', path):
-            return True
-        
-        # Check for download/file URLs
-        if re.search(r'/(download|file|attachment|document)', path):
-            return True
-        
-        return False
-    
-    
+        verdict = classify_url(url)
+        return verdict is None or verdict.is_dead_end
+
+
+# Shared analyzer instance, the analyzer itself is stateless
+ANALYZER = ProductURLAnalyzer()
+
+
 # Convenience functions for easy importing
-def is_product_url(url: str):
+def is_product_url(url: str, explain: bool = True):
     """
     Convenience function to check if a URL is a product URL.
-    
+
     Args:
         url (str): The URL to analyze
-        
+        explain (bool, optional): Build the explanation; hot paths that only need the
+                                  verdict pass False.
+
     Returns:
-        bool: True if the URL is likely a product URL, False otherwise
+        tuple: (is_product, score, explanation)
     """
-    analyzer = ProductURLAnalyzer()
-    return analyzer.is_product_url(url)
+    return ANALYZER.is_product_url(url, explain=explain)
 
 def is_dead_end_url(url: str) -> bool:
     """
     Convenience function to check if a URL is a dead-end.
-    
+
     Args:
         url (str): The URL to analyze
-        
+
     Returns:
         bool: True if the URL is a dead-end that won't lead to products, False otherwise
     """
-    analyzer = ProductURLAnalyzer()
-    return analyzer.is_dead_end_url(url)
+    return ANALYZER.is_dead_end_url(url)
@@ -0,0 +1,169 @@
+import json
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+IMAGE_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp")
+MEDIA_PATTERNS = ("*.mp4", "*.webm", "*.m3u8", "*.ts", "*.mp3", "*.ogg", "*.wav", "*.mov")
+FONT_PATTERNS = ("*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot")
+STYLESHEET_PATTERNS = ("*.css",)
+# Ad, analytics and tag-manager hosts that never carry product data
+AD_HOSTS = (
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+    "googletagmanager.com", "googletagservices.com", "adservice.google.com", "connect.facebook.net",
+    "facebook.com/tr", "analytics.tiktok.com", "hotjar.com", "clarity.ms", "criteo.com", "criteo.net",
+    "taboola.com", "outbrain.com", "scorecardresearch.com", "quantserve.com", "amazon-adsystem.com",
+    "adsrvr.org", "bing.com/action", "snap.licdn.com", "moengage.com", "webengage.com", "clevertap-prod.com",
+    "branch.io", "appsflyer.com", "segment.io", "mixpanel.com", "newrelic.com", "nr-data.net",
+)
+READINESS_MODES = ("body", "network_idle", "selector", "dom_stable")
+
+# Number of elements and length of the visible text, compared between polls
+DOM_SIGNATURE_SCRIPT = (
+    "return [document.getElementsByTagName('*').length,"
+    " document.body ? document.body.innerText.length : 0, document.readyState];"
+)
+RESOURCE_COUNT_SCRIPT = (
+    "return [performance.getEntriesByType('resource').length, document.readyState];"
+)
+
+
+@dataclass
+class RenderProfile:
+    """
+    How Chrome renders pages: which resources are blocked and when a page counts as ready.
+
+    Readiness modes:
+      body          the <body> element exists (the old behaviour)
+      network_idle  no new resource requests for `network_idle_time` seconds
+      selector      the domain's CSS selector from `selectors` matches, e.g. a price element;
+                    domains without a selector fall back to dom_stable
+      dom_stable    element count and text length unchanged for `dom_stable_interval` seconds
+
+    A page that is not ready after `ready_timeout` seconds is taken as it is.
+    """
+    block_images: bool = True
+    block_media: bool = True
+    block_fonts: bool = True
+    block_stylesheets: bool = False
+    blocked_hosts: tuple = AD_HOSTS
+    readiness: str = "dom_stable"
+    selectors: dict[str, str] = field(default_factory=dict)
+    ready_timeout: float = 10.0
+    network_idle_time: float = 0.5
+    dom_stable_interval: float = 0.5
+    poll_interval: float = 0.1
+    # "eager" returns from driver.get() at DOMContentLoaded, readiness takes it from there
+    page_load_strategy: str = "eager"
+    measure_bytes: bool = True
+
+    def __post_init__(self):
+        if self.readiness not in READINESS_MODES:
+            raise ValueError(f"Unknown readiness mode {self.readiness!r}, expected one of {READINESS_MODES}")
+
+    @classmethod
+    def full(cls) -> "RenderProfile":
+        """
+        Load everything and wait for <body>, the way pages were rendered before profiles.
+        """
+        return cls(block_images=False, block_media=False, block_fonts=False, blocked_hosts=(),
+                   readiness="body", ready_timeout=15.0, page_load_strategy="normal")
+
+    def blocked_url_patterns(self) -> list[str]:
+        patterns = []
+        if self.block_images:
+            patterns.extend(IMAGE_PATTERNS)
+        if self.block_media:
+            patterns.extend(MEDIA_PATTERNS)
+        if self.block_fonts:
+            patterns.extend(FONT_PATTERNS)
+        if self.block_stylesheets:
+            patterns.extend(STYLESHEET_PATTERNS)
+        patterns.extend(f"*{host}*" for host in self.blocked_hosts)
+        return patterns
+
+    def apply_options(self, options):
+        """
+        Chrome options for the profile; images are also switched off through preferences
+        so they stay blocked if DevTools is unavailable.
+        """
+        options.page_load_strategy = self.page_load_strategy
+        if self.block_images:
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+            options.add_argument("--blink-settings=imagesEnabled=false")
+        if self.block_media:
+            options.add_argument("--autoplay-policy=user-gesture-required")
+        if self.measure_bytes:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    def setup_driver(self, driver):
+        """
+        Install request blocking on a new driver through the DevTools protocol.
+        """
+        patterns = self.blocked_url_patterns()
+        if not patterns:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        except Exception:
+            pass
+
+    def wait_ready(self, driver, url: str) -> bool:
+        """
+        Wait until the page is ready under this profile. Returns False on timeout.
+        """
+        selector = self.selectors.get(urlparse(url).netloc)
+        try:
+            if self.readiness == "body":
+                WebDriverWait(driver, self.ready_timeout).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                return True
+            if self.readiness == "selector" and selector:
+                WebDriverWait(driver, self.ready_timeout).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+                )
+                return True
+        except TimeoutException:
+            return False
+        if self.readiness == "network_idle":
+            return self.__wait_stable(driver, RESOURCE_COUNT_SCRIPT, self.network_idle_time)
+        return self.__wait_stable(driver, DOM_SIGNATURE_SCRIPT, self.dom_stable_interval)
+
+    def __wait_stable(self, driver, script: str, quiet_time: float) -> bool:
+        """
+        Poll `script` until its result stops changing for `quiet_time` seconds once the
+        document has been parsed.
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        last, stable_since = None, None
+        while time.monotonic() < deadline:
+            value = driver.execute_script(script)
+            now = time.monotonic()
+            if value != last or value[-1] == "loading":
+                last, stable_since = value, now
+            elif now - stable_since >= quiet_time:
+                return True
+            time.sleep(self.poll_interval)
+        return False
+
+    def transferred_bytes(self, driver) -> int:
+        """
+        Bytes received over the network since the last call, from Chrome's performance
+        log (which reading also clears). 0 when the log is not enabled.
+        """
+        if not self.measure_bytes:
+            return 0
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return 0
+        total = 0
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            if message.get("method") == "Network.loadingFinished":
+                total += int(message["params"].get("encodedDataLength", 0))
+        return total
@@ -0,0 +1,331 @@
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import Optional
+from metrics import REGISTRY
+from seen_set import FingerprintSet, url_fingerprint
+
+OUTPUT_WRITE_SECONDS = REGISTRY.histogram("output_write_seconds", "Writing one batch to all sinks")
+OUTPUT_ROWS = REGISTRY.counter("output_rows_total", "Product rows written")
+OUTPUT_DUPLICATES = REGISTRY.counter("output_duplicates_total", "Product rows dropped as already written")
+STREAM_WAIT_SECONDS = REGISTRY.histogram("stream_wait_seconds", "Time a producer waited on a full result stream")
+
+
+class CSVSink:
+    """
+    Appends result rows to a CSV file, one column per entry in `fields`.
+    """
+
+    def __init__(self, path: str, fields: tuple = ("seed_domain", "product_url"), append: bool = False):
+        self.path = path
+        self.fields = fields
+        self.append = append
+        self.file = None
+        self.writer = None
+
+    def existing_urls(self):
+        """
+        Product URLs already in the file when appending to a previous run.
+        """
+        if not (self.append and os.path.exists(self.path)):
+            return
+        with open(self.path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get("product_url"):
+                    yield row["product_url"]
+
+    def open(self):
+        write_header = not (self.append and os.path.exists(self.path) and os.path.getsize(self.path) > 0)
+        self.file = open(self.path, mode="a" if self.append else "w", newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(self.fields)
+
+    def write_rows(self, rows: list[dict]):
+        self.writer.writerows([row.get(field) for field in self.fields] for row in rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class JSONLinesSink:
+    """
+    Appends each result as one JSON object per line.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.append = append
+        self.file = None
+
+    def existing_urls(self):
+        if not (self.append and os.path.exists(self.path)):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line).get("product_url")
+
+    def open(self):
+        self.file = open(self.path, mode="a" if self.append else "w", encoding='utf-8')
+
+    def write_rows(self, rows: list[dict]):
+        self.file.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows))
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class ParquetSink:
+    """
+    Writes results to a Parquet file, one row group per flushed batch. Requires pyarrow.
+    """
+
+    def __init__(self, path: str, fields: tuple = ("seed_domain", "product_url", "source_url", "depth")):
+        self.path = path
+        self.fields = fields
+        self.writer = None
+        self.schema = None
+
+    def existing_urls(self):
+        return iter(())
+
+    def open(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"depth": pa.int32()}
+        self.schema = pa.schema([(field, types.get(field, pa.string())) for field in self.fields])
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write_rows(self, rows: list[dict]):
+        import pyarrow as pa
+
+        columns = {field: [row.get(field) for row in rows] for field in self.fields}
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ResultWriter:
+    """
+    Dedicated output task: results are queued, deduplicated by product URL across all
+    pages and seeds, and written to every sink in batches of `batch_size` rows or every
+    `flush_interval` seconds, whichever comes first. Sink I/O runs off the event loop.
+    With `dedupe=False` every record is written, e.g. for a stream of product changes.
+    If a sink fails, `write` and `close` raise its exception.
+
+    Callbacks passed to `checkpoint` run once every record written before them is in
+    the sinks, e.g. to mark a page done only after its products are written.
+    """
+
+    def __init__(self, sinks: list, batch_size: int = 500, flush_interval: float = 1.0, queue_size: int = 10000,
+                 dedupe: bool = True):
+        self.sinks = sinks
+        self.dedupe = dedupe
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.seen = FingerprintSet()
+        self.task = None
+        self.error = None
+        # Checkpoint callbacks waiting for the next flush
+        self.pending = []
+        self.rows_written = 0
+        self.duplicates_dropped = 0
+        self.flushes = 0
+        self.started_at = None
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        for sink in self.sinks:
+            await loop.run_in_executor(None, sink.open)
+            if not self.dedupe:
+                continue
+            for url in sink.existing_urls():
+                self.seen.add(url_fingerprint(url))
+        self.started_at = time.monotonic()
+        self.task = asyncio.create_task(self.__run())
+
+    async def write(self, record: dict):
+        if self.error is not None:
+            raise self.error
+        await self.queue.put(record)
+
+    async def checkpoint(self, callback):
+        """
+        Run `callback` once the records written so far are flushed.
+        """
+        if self.error is not None:
+            raise self.error
+        await self.queue.put(callback)
+
+    async def flush(self):
+        """
+        Flush every record written so far and run the checkpoints waiting on it.
+        """
+        if self.error is not None:
+            raise self.error
+        flushed = asyncio.get_event_loop().create_future()
+        await self.queue.put(flushed)
+        await asyncio.wait((flushed, self.task), return_when=asyncio.FIRST_COMPLETED)
+        if self.error is not None:
+            raise self.error
+
+    async def __flush(self, batch: list[dict]):
+        if not batch:
+            self.__run_checkpoints()
+            return
+        loop = asyncio.get_event_loop()
+        start = time.perf_counter()
+        for sink in self.sinks:
+            await loop.run_in_executor(None, sink.write_rows, batch)
+        OUTPUT_WRITE_SECONDS.observe(time.perf_counter() - start)
+        OUTPUT_ROWS.inc(len(batch))
+        self.rows_written += len(batch)
+        self.flushes += 1
+        self.__run_checkpoints()
+
+    def __run_checkpoints(self):
+        pending, self.pending = self.pending, []
+        for callback in pending:
+            callback()
+
+    async def __run(self):
+        try:
+            await self.__consume()
+        except Exception as e:
+            self.error = e
+            # Writers blocked on the full queue wake up and raise on their next write
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            raise
+
+    async def __consume(self):
+        loop = asyncio.get_event_loop()
+        batch = []
+        deadline = loop.time() + self.flush_interval
+        while True:
+            try:
+                record = await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                record = ...
+
+            if record is None:
+                await self.__flush(batch)
+                return
+            if isinstance(record, asyncio.Future):
+                # flush() waits on it
+                await self.__flush(batch)
+                batch = []
+                deadline = loop.time() + self.flush_interval
+                record.set_result(None)
+                continue
+            if callable(record):
+                self.pending.append(record)
+            elif record is not ...:
+                if not self.dedupe or self.seen.add(url_fingerprint(record["product_url"])):
+                    batch.append(record)
+                else:
+                    self.duplicates_dropped += 1
+                    OUTPUT_DUPLICATES.inc()
+
+            if len(batch) >= self.batch_size or loop.time() >= deadline:
+                await self.__flush(batch)
+                batch = []
+                deadline = loop.time() + self.flush_interval
+
+    async def close(self):
+        """
+        Flush everything still queued, then sync and close the sinks.
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            if self.task is not None:
+                if self.error is None:
+                    await self.queue.put(None)
+                # Raises the sink's exception if the task died
+                await self.task
+        finally:
+            self.task = None
+            for sink in self.sinks:
+                await loop.run_in_executor(None, sink.close)
+
+    def get_stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "rows_written": self.rows_written,
+            "duplicates_dropped": self.duplicates_dropped,
+            "flushes": self.flushes,
+            "rows_per_sec": round(self.rows_written / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+class ResultStream:
+    """
+    Bounded hand-off of product records to one async consumer. `put` waits while
+    `max_records` records are buffered, so a slow consumer holds up whoever produces
+    them. Records are deduplicated by product URL, like the written output.
+    """
+
+    def __init__(self, max_records: int = 1000):
+        self.queue = asyncio.Queue(maxsize=max_records)
+        self.seen = FingerprintSet()
+        self.records = 0
+        self.duplicates_dropped = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    async def put(self, record: dict):
+        if not self.seen.add(url_fingerprint(record["product_url"])):
+            self.duplicates_dropped += 1
+            return
+        if self.queue.full():
+            start = time.perf_counter()
+            await self.queue.put(record)
+            elapsed = time.perf_counter() - start
+            STREAM_WAIT_SECONDS.observe(elapsed)
+            self.waits += 1
+            self.wait_seconds += elapsed
+        else:
+            self.queue.put_nowait(record)
+
+    async def get(self, producer: asyncio.Future) -> Optional[dict]:
+        """
+        The next record, or None once `producer` is done and every record was taken. An
+        exception of the producer is raised then.
+        """
+        while self.queue.empty():
+            if producer.done():
+                producer.result()
+                return None
+            getter = asyncio.ensure_future(self.queue.get())
+            try:
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                got = getter.done()
+                if not got:
+                    getter.cancel()
+            if got:
+                self.records += 1
+                return getter.result()
+        self.records += 1
+        return self.queue.get_nowait()
+
+    def get_stats(self) -> dict:
+        return {
+            "records": self.records,
+            "duplicates_dropped": self.duplicates_dropped,
+            "buffered": self.queue.qsize(),
+            "producer_waits": self.waits,
+            "producer_wait_seconds": round(self.wait_seconds, 2),
+        }
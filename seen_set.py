@@ -0,0 +1,119 @@
+import hashlib
+from array import array
+
+EMPTY = 0
+
+
+def url_fingerprint(url: str) -> int:
+    """
+    64-bit fingerprint of a (canonical) URL. Never 0, which marks empty slots.
+    """
+    value = int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class BloomFilter:
+    """
+    Bloom filter over 64-bit fingerprints, using double hashing of the two fingerprint halves.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, bits_per_item: int = 10, hashes: int = 7):
+        self.num_bits = max(64, capacity * bits_per_item)
+        self.bits = bytearray(self.num_bits // 8 + 1)
+        self.hashes = hashes
+
+    def __positions(self, fingerprint: int):
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.hashes)]
+
+    def add(self, fingerprint: int):
+        for pos in self.__positions(fingerprint):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.__positions(fingerprint))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class FingerprintSet:
+    """
+    Open-addressing hash set of 64-bit fingerprints stored in a flat `array('Q')`, about
+    an order of magnitude smaller per URL than a Python set of URL strings. An optional
+    Bloom filter answers most "never seen" lookups without probing the table.
+    """
+
+    MAX_LOAD = 0.7
+
+    def __init__(self, initial_capacity: int = 1024, bloom: BloomFilter = None):
+        capacity = 1
+        while capacity < initial_capacity / self.MAX_LOAD:
+            capacity <<= 1
+        self.table = array("Q", bytes(8 * capacity))
+        self.mask = capacity - 1
+        self.count = 0
+        self.bloom = bloom
+        self.duplicates = 0
+
+    def __slot(self, fingerprint: int) -> int:
+        table, mask = self.table, self.mask
+        slot = fingerprint & mask
+        while True:
+            value = table[slot]
+            if value == EMPTY or value == fingerprint:
+                return slot
+            slot = (slot + 1) & mask
+
+    def __grow(self):
+        old = self.table
+        self.table = array("Q", bytes(8 * len(old) * 2))
+        self.mask = len(self.table) - 1
+        for value in old:
+            if value != EMPTY:
+                self.table[self.__slot(value)] = value
+
+    def add(self, fingerprint: int) -> bool:
+        """
+        Add a fingerprint. Returns False (and counts a duplicate) if it was already present.
+        """
+        if self.bloom is not None:
+            if fingerprint not in self.bloom:
+                self.__insert(fingerprint)
+                return True
+
+        slot = self.__slot(fingerprint)
+        if self.table[slot] == fingerprint:
+            self.duplicates += 1
+            return False
+        self.__insert(fingerprint, slot)
+        return True
+
+    def __insert(self, fingerprint: int, slot: int = None):
+        if (self.count + 1) > self.MAX_LOAD * len(self.table):
+            self.__grow()
+            slot = None
+        if slot is None:
+            slot = self.__slot(fingerprint)
+        self.table[slot] = fingerprint
+        self.count += 1
+        if self.bloom is not None:
+            self.bloom.add(fingerprint)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        if self.bloom is not None and fingerprint not in self.bloom:
+            return False
+        return self.table[self.__slot(fingerprint)] == fingerprint
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.itemsize * len(self.table) + (self.bloom.nbytes if self.bloom is not None else 0)
+
+    def bytes_per_url(self) -> float:
+        return self.nbytes / self.count if self.count else 0.0
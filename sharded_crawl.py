@@ -0,0 +1,523 @@
+"""
+Sharded crawl: a coordinator hands seed domains to crawler worker processes, on one
+machine or many, over a line-delimited JSON protocol on TCP.
+
+    python sharded_crawl.py coordinator --port 7700 --output products.csv https://a.com/ https://b.com/
+    python sharded_crawl.py worker --connect coordinator-host:7700
+    python sharded_crawl.py local --workers 4 --output products.csv https://a.com/ https://b.com/
+
+`local` runs the coordinator and N worker processes on this machine.
+
+Domains are placed on workers by consistent hashing, so a worker joining or leaving
+only moves the domains it owns. Workers pull domains in batches and crawl each batch
+with their own AsyncCrawler. Product rows stream back to the coordinator, which
+deduplicates and writes them, and heartbeats carry each worker's metrics, which the
+coordinator merges. A worker that disconnects or misses heartbeats is dropped from the
+ring and its unfinished domains are handed out again (resumed from their frontier when
+the workers share a state directory). An idle worker takes queued domains from the
+worker with the longest backlog.
+
+Nothing is handed out until `min_workers` workers joined or `join_grace` seconds
+passed, so the first worker to connect does not take every domain. A batch is capped at
+a fair share of the domains left, so the other workers find some to take.
+
+Messages, worker to coordinator:
+  hello      {"worker"}                      join the ring
+  request    {"slots"}                       ask for up to `slots` domains
+  rows       {"rows"}                        product rows, as given to output sinks
+  heartbeat  {"metrics", "progress"}         registry snapshot, per-domain progress
+  done       {"seeds", "products"}           a batch is finished
+Coordinator to worker, in reply to request:
+  assign     {"seeds", "max_depth", "resume"}
+  wait       {"seconds"}                     nothing to hand out right now
+  stop       {}                              the crawl is over
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import time
+from typing import Optional
+from urllib.parse import urlparse
+from crawler import AsyncCrawler
+from metrics import REGISTRY, merge_snapshots
+from result_writer import ResultWriter, CSVSink
+
+# Result batches are single lines, far longer than asyncio's 64 KiB default
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def seed_domain(seed_url: str) -> str:
+    return urlparse(seed_url).netloc.lower()
+
+
+async def send_message(writer: asyncio.StreamWriter, message: dict):
+    writer.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[dict]:
+    """
+    Next message from the peer, or None once the connection is closed.
+    """
+    try:
+        line = await reader.readline()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        return None
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class HashRing:
+    """
+    Consistent hash ring with `replicas` virtual points per node.
+    """
+
+    def __init__(self, replicas: int = 64):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            point = ring_hash(f"{node}#{i}")
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node: str):
+        self.points = [p for p in self.points if self.owners[p] != node]
+        self.owners = {p: self.owners[p] for p in self.points}
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self.points:
+            return None
+        i = bisect.bisect(self.points, ring_hash(key)) % len(self.points)
+        return self.owners[self.points[i]]
+
+    def nodes(self) -> set:
+        return set(self.owners.values())
+
+
+class WorkerHandle:
+    def __init__(self, worker_id: str, writer: asyncio.StreamWriter):
+        self.worker_id = worker_id
+        self.writer = writer
+        self.last_seen = time.monotonic()
+        self.assigned: set[str] = set()
+        self.metrics = {}
+        self.progress = {}
+        self.domains_done = 0
+        self.rows = 0
+
+
+class ShardCoordinator:
+    """
+    Owns the seed list, the hash ring of live workers and the output. See the module
+    docstring for the protocol.
+    """
+
+    def __init__(self, seed_urls: list[str], sinks: list = None, output_csv: str = "product_urls.csv",
+                 max_depth: int = 3, host: str = "127.0.0.1", port: int = 0, heartbeat_timeout: float = 60.0,
+                 max_attempts: int = 3, metrics_file: str = None, metrics_interval: float = 10.0,
+                 min_workers: int = 1, join_grace: float = 10.0):
+        self.seeds = {}
+        for seed in seed_urls:
+            self.seeds.setdefault(seed_domain(seed), seed)
+        self.max_depth = max_depth
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self.min_workers = min_workers
+        self.join_grace = join_grace
+        self.started_at = None
+        self.result_writer = ResultWriter(sinks or [CSVSink(output_csv)])
+
+        self.ring = HashRing()
+        self.workers: dict[str, WorkerHandle] = {}
+        # Every worker seen, live or not, for the merged metrics and stats
+        self.handles: dict[str, WorkerHandle] = {}
+        # Domains waiting for a worker, in seed order
+        self.pending: dict[str, bool] = {domain: False for domain in self.seeds}
+        self.attempts = {domain: 0 for domain in self.seeds}
+        self.done: set[str] = set()
+        self.failed: set[str] = set()
+        self.reassigned = 0
+        self.stolen = 0
+        self.server = None
+        self.finished = asyncio.Event()
+
+        REGISTRY.gauge("shard_workers", "Live shard workers", fn=lambda: len(self.workers))
+        REGISTRY.gauge("shard_domains_pending", "Domains waiting for a shard worker", fn=lambda: len(self.pending))
+        REGISTRY.gauge("shard_domains_done", "Domains finished by shard workers", fn=lambda: len(self.done))
+
+    async def start(self):
+        await self.result_writer.start()
+        self.server = await asyncio.start_server(self.__serve, self.host, self.port, limit=MAX_MESSAGE_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.started_at = time.monotonic()
+        print(f"Coordinator listening on {self.host}:{self.port} with {len(self.seeds)} domains")
+
+    async def run(self) -> dict:
+        """
+        Serve workers until every domain is done or failed. Returns the crawl stats.
+        """
+        if self.server is None:
+            await self.start()
+        monitor = asyncio.create_task(self.__monitor())
+        try:
+            self.__check_finished()
+            await self.finished.wait()
+        finally:
+            monitor.cancel()
+            await asyncio.gather(monitor, return_exceptions=True)
+            self.server.close()
+            for worker in list(self.workers.values()):
+                worker.writer.close()
+            await self.server.wait_closed()
+            await self.result_writer.close()
+            self.__write_metrics()
+        stats = self.get_stats()
+        print(f"Sharded crawl stats: {stats}")
+        return stats
+
+    async def __serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker = None
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                if worker is None:
+                    if message.get("type") != "hello":
+                        break
+                    worker = self.__join(message["worker"], writer)
+                    continue
+                worker.last_seen = time.monotonic()
+                await self.__handle(worker, message)
+        finally:
+            if worker is not None:
+                self.__leave(worker, "disconnected")
+            writer.close()
+
+    def __join(self, worker_id: str, writer: asyncio.StreamWriter) -> WorkerHandle:
+        if worker_id in self.workers:
+            self.__leave(self.workers[worker_id], "replaced")
+        worker = WorkerHandle(worker_id, writer)
+        self.workers[worker_id] = worker
+        self.handles[worker_id] = worker
+        self.ring.add(worker_id)
+        print(f"Shard worker {worker_id} joined, {len(self.workers)} live")
+        return worker
+
+    def __leave(self, worker: WorkerHandle, reason: str):
+        if self.workers.get(worker.worker_id) is not worker:
+            return
+        del self.workers[worker.worker_id]
+        self.ring.remove(worker.worker_id)
+        for domain in worker.assigned:
+            if self.attempts[domain] >= self.max_attempts:
+                self.failed.add(domain)
+                print(f"Giving up on {domain} after {self.attempts[domain]} attempts")
+            else:
+                self.pending[domain] = True
+                self.reassigned += 1
+        print(f"Shard worker {worker.worker_id} {reason}, {len(worker.assigned)} unfinished domains handed back")
+        worker.assigned.clear()
+        worker.writer.close()
+        self.__check_finished()
+
+    async def __handle(self, worker: WorkerHandle, message: dict):
+        kind = message.get("type")
+        if kind == "request":
+            await send_message(worker.writer, self.__next_assignment(worker, message.get("slots", 1)))
+        elif kind == "rows":
+            worker.rows += len(message["rows"])
+            for row in message["rows"]:
+                await self.result_writer.write(row)
+        elif kind == "heartbeat":
+            worker.metrics = message.get("metrics", {})
+            worker.progress = message.get("progress", {})
+        elif kind == "done":
+            for seed in message["seeds"]:
+                domain = seed_domain(seed)
+                if domain in worker.assigned:
+                    worker.assigned.discard(domain)
+                    worker.domains_done += 1
+                    self.done.add(domain)
+            self.__check_finished()
+
+    def __next_assignment(self, worker: WorkerHandle, slots: int) -> dict:
+        """
+        Up to `slots` domains for a worker, at most its fair share of the domains left:
+        its own by the ring first, otherwise queued domains of the worker with the longest
+        backlog. Resumed domains are handed out on their own so the rest of a batch
+        starts fresh.
+        """
+        if self.finished.is_set():
+            return {"type": "stop"}
+        if len(self.workers) < self.min_workers and time.monotonic() - self.started_at < self.join_grace:
+            return {"type": "wait", "seconds": 0.5}
+        left = len(self.pending) + sum(len(w.assigned) for w in self.workers.values())
+        slots = max(1, min(slots, -(-left // len(self.workers))))
+        backlog = {}
+        for domain in self.pending:
+            backlog.setdefault(self.ring.owner(domain), []).append(domain)
+        chosen = backlog.get(worker.worker_id, [])
+        stealing = not chosen
+        if stealing and backlog:
+            owner, queued = max(backlog.items(), key=lambda item: len(item[1]))
+            # An idle owner keeps the batch it will ask for next
+            chosen = queued[slots:] if not self.workers[owner].assigned else queued
+        if not chosen:
+            return {"type": "wait", "seconds": 1.0}
+
+        resume = self.pending[chosen[0]]
+        batch = [domain for domain in chosen if self.pending[domain] == resume][:slots]
+        if stealing:
+            self.stolen += len(batch)
+        for domain in batch:
+            del self.pending[domain]
+            self.attempts[domain] += 1
+            worker.assigned.add(domain)
+        return {"type": "assign", "seeds": [self.seeds[d] for d in batch], "max_depth": self.max_depth,
+                "resume": resume}
+
+    def __check_finished(self):
+        if not self.pending and len(self.done | self.failed) == len(self.seeds):
+            self.finished.set()
+
+    async def __monitor(self):
+        """
+        Drop workers whose heartbeats stopped and write merged metrics periodically.
+        """
+        last_write = time.monotonic()
+        while True:
+            await asyncio.sleep(min(1.0, self.heartbeat_timeout / 4))
+            now = time.monotonic()
+            for worker in list(self.workers.values()):
+                if now - worker.last_seen > self.heartbeat_timeout:
+                    self.__leave(worker, "missed its heartbeats")
+            if self.metrics_file is not None and now - last_write >= self.metrics_interval:
+                self.__write_metrics()
+                last_write = now
+
+    def merged_metrics(self) -> dict:
+        return merge_snapshots([w.metrics for w in self.handles.values()])
+
+    def __write_metrics(self):
+        if self.metrics_file is None:
+            return
+        snapshot = {
+            "timestamp": time.time(),
+            "coordinator": REGISTRY.snapshot(),
+            "workers": self.merged_metrics(),
+        }
+        tmp = self.metrics_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.metrics_file)
+
+    def get_stats(self) -> dict:
+        return {
+            "domains": len(self.seeds),
+            "done": len(self.done),
+            "failed": sorted(self.failed),
+            "reassigned": self.reassigned,
+            "stolen": self.stolen,
+            "output": self.result_writer.get_stats(),
+            "workers": {w.worker_id: {"live": w.worker_id in self.workers, "domains_done": w.domains_done,
+                                      "rows": w.rows, "assigned": sorted(w.assigned)}
+                        for w in self.handles.values()},
+        }
+
+
+class CoordinatorSink:
+    """
+    Output sink of a shard worker: rows go to the coordinator, which deduplicates and
+    writes them. write_rows runs on the result writer's executor thread.
+    """
+
+    def __init__(self, worker: "ShardWorker", loop: asyncio.AbstractEventLoop):
+        self.worker = worker
+        self.loop = loop
+
+    def open(self):
+        pass
+
+    def existing_urls(self):
+        return iter(())
+
+    def write_rows(self, rows: list[dict]):
+        asyncio.run_coroutine_threadsafe(self.worker.send({"type": "rows", "rows": rows}), self.loop).result()
+
+    def close(self):
+        pass
+
+
+class ShardWorker:
+    """
+    Connects to a coordinator and crawls the domains it hands out, `slots` at a time,
+    with a fresh AsyncCrawler per batch.
+    """
+
+    def __init__(self, host: str, port: int, worker_id: str = None, slots: int = 8, fetch_mode: str = "tiered",
+                 parse_workers: int = 0, state_dir: str = None, heartbeat_interval: float = 5.0,
+                 settings: dict = None):
+        self.host = host
+        self.port = port
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.slots = slots
+        self.fetch_mode = fetch_mode
+        self.parse_workers = parse_workers
+        self.state_dir = state_dir
+        self.heartbeat_interval = heartbeat_interval
+        # AsyncCrawler class attributes to override, e.g. {"MIN_REQUEST_DELAY": 1.0}
+        self.settings = settings or {}
+        self.reader = None
+        self.writer = None
+        self.send_lock = None
+        self.crawler = None
+
+    async def send(self, message: dict):
+        async with self.send_lock:
+            await send_message(self.writer, message)
+
+    def __progress(self) -> dict:
+        if self.crawler is None or self.crawler.scheduler is None:
+            return {}
+        return {domain: {"fetched": state.fetched, "queued": len(state.frontier.store), "finished": state.finished}
+                for domain, state in self.crawler.scheduler.domains.items()}
+
+    async def __heartbeat(self):
+        while True:
+            await self.send({"type": "heartbeat", "metrics": REGISTRY.snapshot(), "progress": self.__progress()})
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def __crawl(self, assignment: dict) -> int:
+        self.crawler = AsyncCrawler(fetch_mode=self.fetch_mode, parse_workers=self.parse_workers,
+                                    state_dir=self.state_dir, resume=assignment["resume"],
+                                    sinks=[CoordinatorSink(self, asyncio.get_event_loop())])
+        for name, value in self.settings.items():
+            setattr(self.crawler, name, value)
+        collected = await self.crawler.crawl_multiple_seeds(assignment["seeds"], max_depth=assignment["max_depth"])
+        return sum(len(rows) for rows in collected.values())
+
+    async def run(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=MAX_MESSAGE_BYTES)
+        self.send_lock = asyncio.Lock()
+        await self.send({"type": "hello", "worker": self.worker_id})
+        heartbeat = asyncio.create_task(self.__heartbeat())
+        try:
+            while True:
+                await self.send({"type": "request", "slots": self.slots})
+                message = await read_message(self.reader)
+                if message is None or message["type"] == "stop":
+                    break
+                if message["type"] == "wait":
+                    await asyncio.sleep(message["seconds"])
+                    continue
+                print(f"Worker {self.worker_id} crawling {message['seeds']}")
+                products = await self.__crawl(message)
+                await self.send({"type": "done", "seeds": message["seeds"], "products": products})
+        except ConnectionError:
+            # The coordinator shut down, or went away
+            pass
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            self.writer.close()
+
+
+def run_worker(host: str, port: int, options: dict):
+    asyncio.run(ShardWorker(host, port, **options).run())
+
+
+async def run_local(seed_urls: list[str], workers: int, output_csv: str, max_depth: int = 3,
+                    worker_options: dict = None, **coordinator_options) -> dict:
+    """
+    Coordinator in this process, `workers` crawler processes connected to it on localhost.
+    """
+    coordinator_options.setdefault("min_workers", workers)
+    coordinator = ShardCoordinator(seed_urls, output_csv=output_csv, max_depth=max_depth, **coordinator_options)
+    await coordinator.start()
+    # Workers start their own parse pools and Chrome drivers, so they are not daemonic
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(coordinator.host, coordinator.port,
+                                                  dict(worker_options or {}, worker_id=f"local-{i}")))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        return await coordinator.run()
+    finally:
+        loop = asyncio.get_event_loop()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 30)
+            if process.is_alive():
+                process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="role", required=True)
+
+    for role in ("coordinator", "local"):
+        p = sub.add_parser(role)
+        p.add_argument("seeds", nargs="+")
+        p.add_argument("--output", default="product_urls.csv")
+        p.add_argument("--max-depth", type=int, default=3)
+        p.add_argument("--metrics-file")
+        p.add_argument("--heartbeat-timeout", type=float, default=60.0)
+        p.add_argument("--join-grace", type=float, default=10.0,
+                       help="seconds to wait for workers to join before handing out domains")
+    sub.choices["coordinator"].add_argument("--min-workers", type=int, default=1,
+                                            help="hand out domains once this many workers joined")
+    sub.choices["coordinator"].add_argument("--host", default="0.0.0.0")
+    sub.choices["coordinator"].add_argument("--port", type=int, default=7700)
+    sub.choices["local"].add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    worker = sub.add_parser("worker")
+    worker.add_argument("--connect", required=True, help="coordinator host:port")
+    worker.add_argument("--id")
+    for p in (sub.choices["local"], worker):
+        p.add_argument("--slots", type=int, default=8, help="domains crawled at once per worker")
+        p.add_argument("--fetch-mode", default="tiered")
+        p.add_argument("--parse-workers", type=int, default=0)
+        p.add_argument("--state-dir", help="frontier state shared by the workers, lets a reassigned domain resume")
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        host, port = args.connect.rsplit(":", 1)
+        asyncio.run(ShardWorker(host, int(port), worker_id=args.id, slots=args.slots, fetch_mode=args.fetch_mode,
+                                parse_workers=args.parse_workers, state_dir=args.state_dir).run())
+    elif args.role == "coordinator":
+        coordinator = ShardCoordinator(args.seeds, output_csv=args.output, max_depth=args.max_depth, host=args.host,
+                                       port=args.port, heartbeat_timeout=args.heartbeat_timeout,
+                                       metrics_file=args.metrics_file, min_workers=args.min_workers,
+                                       join_grace=args.join_grace)
+        asyncio.run(coordinator.run())
+    else:
+        options = {"slots": args.slots, "fetch_mode": args.fetch_mode, "parse_workers": args.parse_workers,
+                   "state_dir": args.state_dir}
+        asyncio.run(run_local(args.seeds, args.workers, args.output, max_depth=args.max_depth, worker_options=options,
+                              heartbeat_timeout=args.heartbeat_timeout, metrics_file=args.metrics_file,
+                              join_grace=args.join_grace))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import asyncio
+import gzip
+import io
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+import requests
+from lxml import etree
+from crawl_archive import ArchiveReader, ArchiveWriter
+
+SITEMAP_TAGS = ("{*}url", "{*}sitemap")
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """
+    W3C datetime from a sitemap, e.g. `2024-05-01` or `2024-05-01T10:00:00+05:30`.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def lastmod_age_days(value: Optional[str], now: datetime = None) -> Optional[float]:
+    parsed = parse_lastmod(value)
+    if parsed is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (now - parsed).total_seconds() / 86400)
+
+
+class RobotsRules:
+    """
+    A domain's robots.txt: disallow rules, crawl delay and declared sitemaps.
+    Like RobotFileParser.read, a 401 or 403 for robots.txt disallows everything, while
+    any other missing or unreadable robots.txt allows everything.
+    """
+
+    def __init__(self, robots_url: str, text: str = "", user_agent: str = "*", status: int = None):
+        self.robots_url = robots_url
+        self.user_agent = user_agent
+        self.parser = RobotFileParser(robots_url)
+        self.parser.parse(text.splitlines())
+        if status in (401, 403):
+            self.parser.disallow_all = True
+        self.disallowed = 0
+
+    def can_fetch(self, url: str) -> bool:
+        allowed = self.parser.can_fetch(self.user_agent, url)
+        if not allowed:
+            self.disallowed += 1
+        return allowed
+
+    @property
+    def crawl_delay(self) -> float:
+        delay = self.parser.crawl_delay(self.user_agent)
+        return float(delay) if delay else 0.0
+
+    @property
+    def sitemaps(self) -> list[str]:
+        return self.parser.site_maps() or []
+
+
+def open_sitemap_stream(response: requests.Response):
+    """
+    File-like view of a streamed sitemap response, gunzipped on the fly when the body
+    is a .gz file (transfer encodings are already undone by urllib3).
+    """
+    response.raw.decode_content = True
+    # urllib3 would close the body at EOF under the buffered reader's feet
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw, buffer_size=STREAM_BUFFER_SIZE)
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def iter_sitemap_entries(stream):
+    """
+    Yield ("url" | "sitemap", loc, lastmod) from a sitemap or sitemap index, one entry at
+    a time; parsed elements are dropped as soon as they were read.
+    """
+    context = etree.iterparse(stream, events=("end",), tag=SITEMAP_TAGS,
+                              resolve_entities=False, no_network=True, huge_tree=False)
+    for _, element in context:
+        loc = element.findtext("{*}loc")
+        lastmod = element.findtext("{*}lastmod")
+        kind = etree.QName(element).localname
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+        if loc:
+            yield kind, loc.strip(), lastmod.strip() if lastmod else None
+
+
+class SitemapDiscovery:
+    """
+    Reads a domain's robots.txt and walks its sitemaps (indexes included, gzipped or not)
+    breadth first, streaming each file so memory does not grow with its size. Page URLs
+    are handed to `on_batch(batch)` as lists of up to `batch_size` (url, lastmod, sitemap
+    url) entries. With an ArchiveWriter as `archive` the robots.txt and the URL batches
+    are recorded; with an ArchiveReader they are read back instead of fetched.
+    """
+
+    USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
+    TIMEOUT = 30
+    # how often a walk blocked on the frontier checks whether it was cancelled
+    STOP_POLL_INTERVAL = 0.5
+
+    def __init__(self, batch_size: int = 500, max_sitemaps: int = 500, max_urls: int = None,
+                 robots_user_agent: str = "*", archive=None, robots_workers: int = 32):
+        self.batch_size = batch_size
+        self.archive = archive
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.robots_user_agent = robots_user_agent
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = self.USER_AGENT
+        # robots.txt of many seeds is fetched at once, each may take its full timeout
+        self.robots_executor = ThreadPoolExecutor(max_workers=robots_workers, thread_name_prefix="robots")
+
+    def fetch_robots_sync(self, seed_url: str) -> RobotsRules:
+        robots_url = urljoin(seed_url, "/robots.txt")
+        if isinstance(self.archive, ArchiveReader):
+            record = self.archive.get(robots_url)
+            status = record.status if record is not None else None
+            text = record.body.decode("utf-8", "replace") if status == 200 else ""
+            return RobotsRules(robots_url, text, self.robots_user_agent, status)
+
+        text, status = "", None
+        try:
+            response = self.session.get(robots_url, timeout=self.TIMEOUT)
+            status = response.status_code
+            if response.status_code == 200:
+                text = response.text
+        except requests.RequestException:
+            pass
+        if isinstance(self.archive, ArchiveWriter):
+            self.archive.write("resource", robots_url, text.encode("utf-8"),
+                               **{"Content-Type": "text/plain", "X-Crawler-Status": "-" if status is None else status})
+        return RobotsRules(robots_url, text, self.robots_user_agent, status)
+
+    async def fetch_robots(self, seed_url: str) -> RobotsRules:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.robots_executor, self.fetch_robots_sync, seed_url)
+
+    def walk_sync(self, seed_url: str, robots: Optional[RobotsRules], emit,
+                  stop: Optional[threading.Event] = None) -> dict:
+        """
+        Walk the sitemaps of a domain, calling `emit(batch)` for each batch of page URLs.
+        Without sitemaps in robots.txt, /sitemap.xml is tried. Returns counters for the walk,
+        early once `stop` is set.
+        """
+        stop = stop or threading.Event()
+        domain = urlparse(seed_url).netloc
+        if isinstance(self.archive, ArchiveReader):
+            return self.__replay(domain, emit, stop)
+        if isinstance(self.archive, ArchiveWriter):
+            emit = self.__recording(domain, emit)
+
+        declared = robots.sitemaps if robots is not None else []
+        pending = deque(declared or [urljoin(seed_url, "/sitemap.xml")])
+        seen = set()
+        stats = {"sitemaps": 0, "urls": 0, "failed": 0}
+        batch = []
+        while pending and stats["sitemaps"] < self.max_sitemaps and not stop.is_set():
+            sitemap_url = pending.popleft()
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            try:
+                with self.session.get(sitemap_url, timeout=self.TIMEOUT, stream=True) as response:
+                    if response.status_code != 200:
+                        stats["failed"] += 1
+                        continue
+                    stats["sitemaps"] += 1
+                    for kind, loc, lastmod in iter_sitemap_entries(open_sitemap_stream(response)):
+                        if kind == "sitemap":
+                            pending.append(urljoin(sitemap_url, loc))
+                            continue
+                        batch.append((loc, lastmod, sitemap_url))
+                        stats["urls"] += 1
+                        if len(batch) >= self.batch_size:
+                            emit(batch)
+                            batch = []
+                            if stop.is_set():
+                                break
+                        if self.max_urls is not None and stats["urls"] >= self.max_urls:
+                            pending.clear()
+                            break
+            except (requests.RequestException, etree.XMLSyntaxError, OSError, EOFError, ValueError):
+                stats["failed"] += 1
+        if batch and not stop.is_set():
+            emit(batch)
+        return stats
+
+    def __recording(self, domain: str, emit):
+        def emit_recorded(batch):
+            self.archive.write_sitemap_batch(domain, batch)
+            emit(batch)
+        return emit_recorded
+
+    def __replay(self, domain: str, emit, stop: threading.Event) -> dict:
+        stats = {"sitemaps": 0, "urls": 0, "failed": 0, "replayed_batches": 0}
+        sitemaps = set()
+        for batch in self.archive.sitemap_batches(domain):
+            if stop.is_set():
+                break
+            sitemaps.update(sitemap_url for _, _, sitemap_url in batch)
+            stats["urls"] += len(batch)
+            stats["replayed_batches"] += 1
+            emit(batch)
+        stats["sitemaps"] = len(sitemaps)
+        return stats
+
+    async def discover(self, seed_url: str, robots: Optional[RobotsRules], on_batch) -> dict:
+        """
+        Run the sitemap walk on a thread; each batch is awaited through `on_batch` on the
+        event loop before the walk goes on, so a slow frontier slows the walk down.
+        Cancelling the discovery stops the walk thread at its next batch or sitemap.
+        """
+        loop = asyncio.get_event_loop()
+        stop = threading.Event()
+
+        def emit(batch):
+            if stop.is_set():
+                return
+            future = asyncio.run_coroutine_threadsafe(on_batch(batch), loop)
+            while not stop.is_set():
+                try:
+                    return future.result(timeout=self.STOP_POLL_INTERVAL)
+                except TimeoutError:
+                    continue
+            future.cancel()
+
+        try:
+            return await loop.run_in_executor(None, self.walk_sync, seed_url, robots, emit, stop)
+        except asyncio.CancelledError:
+            stop.set()
+            raise
+
+    def close(self):
+        self.robots_executor.shutdown(wait=False)
+        self.session.close()
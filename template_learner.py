@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import Optional
+from product_url_analyser import is_product_url
+from seen_set import url_fingerprint
+from url_templates import path_template
+
+
+@dataclass
+class TemplateStats:
+    fetched: int = 0
+    products: int = 0
+    # Product-looking links found on the template's pages
+    product_links: int = 0
+    # URLs emitted as products without a fetch
+    emitted: int = 0
+
+    @property
+    def precision(self) -> float:
+        return self.products / self.fetched if self.fetched else 0.0
+
+
+class TemplateLearner:
+    """
+    Learns which path templates of one domain are product pages.
+
+    Every classified page is counted against its path template (see url_templates). Once
+    a template has `min_samples` classified pages and a product share of at least
+    `trust_precision`, new URLs of that template are taken as products without a fetch;
+    only `verify_rate` of them are still fetched, and their verdicts keep the precision
+    honest. Templates whose pages were never products and hardly link to any are
+    reported as dead weight so the frontier can push them back.
+    """
+
+    def __init__(self, min_samples: int = 20, trust_precision: float = 0.95, verify_rate: float = 0.05,
+                 dead_weight_link_yield: float = 1.0):
+        self.min_samples = min_samples
+        self.trust_precision = trust_precision
+        self.verify_rate = verify_rate
+        self.dead_weight_link_yield = dead_weight_link_yield
+        self.templates: dict[str, TemplateStats] = {}
+
+    def __stats(self, template: str) -> TemplateStats:
+        stats = self.templates.get(template)
+        if stats is None:
+            stats = self.templates[template] = TemplateStats()
+        return stats
+
+    def __trusted(self, stats: TemplateStats) -> bool:
+        return stats.fetched >= self.min_samples and stats.precision >= self.trust_precision
+
+    def __dead_weight(self, stats: TemplateStats) -> bool:
+        return (stats.fetched >= self.min_samples and stats.products == 0
+                and stats.product_links / stats.fetched < self.dead_weight_link_yield)
+
+    def is_product_link(self, url: str) -> bool:
+        stats = self.templates.get(path_template(url))
+        if stats is not None and self.__trusted(stats):
+            return True
+        return is_product_url(url, explain=False)[0]
+
+    def record(self, url: str, is_product: bool, child_urls=()):
+        """
+        Count the classifier verdict of a fetched page and the product links it had.
+        """
+        stats = self.__stats(path_template(url))
+        stats.fetched += 1
+        stats.products += bool(is_product)
+        stats.product_links += sum(1 for child in child_urls if self.is_product_link(child))
+
+    def skip_fetch(self, url: str) -> bool:
+        """
+        True if the URL belongs to a trusted product template and is not picked for
+        verification. The pick depends only on the URL, so it is stable across runs.
+        """
+        stats = self.templates.get(path_template(url))
+        if stats is None or not self.__trusted(stats):
+            return False
+        if url_fingerprint(url) % 10_000 < self.verify_rate * 10_000:
+            return False
+        stats.emitted += 1
+        return True
+
+    def precision(self, url: str) -> Optional[float]:
+        """
+        Product share of the classified pages of the URL's template, None if it has none.
+        """
+        stats = self.templates.get(path_template(url))
+        return stats.precision if stats is not None and stats.fetched else None
+
+    def link_yield(self, url: str) -> Optional[float]:
+        """
+        Products plus product links per fetched page of the URL's template, once the
+        template has `min_samples` pages; None before that.
+        """
+        stats = self.templates.get(path_template(url))
+        if stats is None or stats.fetched < self.min_samples:
+            return None
+        return (stats.products + stats.product_links) / stats.fetched
+
+    def is_dead_weight(self, url: str) -> bool:
+        stats = self.templates.get(path_template(url))
+        return stats is not None and self.__dead_weight(stats)
+
+    def get_stats(self) -> dict:
+        trusted = [t for t, s in self.templates.items() if self.__trusted(s)]
+        return {
+            "templates": len(self.templates),
+            "trusted": trusted,
+            "dead_weight": [t for t, s in self.templates.items() if self.__dead_weight(s)],
+            "emitted_without_fetch": sum(s.emitted for s in self.templates.values()),
+        }
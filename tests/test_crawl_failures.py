@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from benchmarks.synthetic_shop import SyntheticShop, ShopServer
+from crawler import AsyncCrawler
+
+
+class FailingSink:
+    """
+    Output sink whose writes always fail, like a full disk.
+    """
+
+    def existing_urls(self):
+        return iter(())
+
+    def open(self):
+        pass
+
+    def write_rows(self, rows: list[dict]):
+        raise OSError("disk full")
+
+    def close(self):
+        pass
+
+
+async def crawl_with_deadline(crawler: AsyncCrawler, seed_url: str, seconds: float) -> set:
+    """
+    Run the crawl, cancelling it after `seconds`. Returns the finished task, if any.
+    """
+    task = asyncio.ensure_future(crawler.crawl_multiple_seeds([seed_url], max_depth=3))
+    done, _ = await asyncio.wait({task}, timeout=seconds)
+    if not done:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return done
+
+
+def test_failing_sink_ends_the_crawl_with_its_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = ShopServer(SyntheticShop(seed=3, products_per_subcategory=20)).start()
+    try:
+        crawler = AsyncCrawler(fetch_mode="http", parse_workers=0, sinks=[FailingSink()])
+        crawler.MIN_REQUEST_DELAY = 0.0
+        crawler.DISCOVER_SITEMAPS = False
+        # The first product row fails while pages are still queued
+        crawler.OUTPUT_BATCH_SIZE = 1
+        done = asyncio.run(crawl_with_deadline(crawler, f"http://127.0.0.1:{server.port}/", 60))
+    finally:
+        server.close()
+
+    assert done, "the crawl hung after its sink failed"
+    with pytest.raises(OSError, match="disk full"):
+        done.pop().result()
@@ -0,0 +1,82 @@
+"""
+Offline trainer for the vector page classifier.
+
+Reads labelled pages from a JSON Lines file, one object per line with `url`, `label`
+(true for product pages) and either the page `html` or a `path` to a saved HTML file,
+fits logistic regression weights and saves them as the next versioned weight file:
+
+    python train_classifier.py labelled_pages.jsonl --out weights/
+
+`AsyncCrawler(classifier_model="weights/")` then classifies with the latest version.
+
+The current heuristic weights are evaluated on the same pages for comparison.
+"""
+import argparse
+import json
+import os
+import random
+import numpy as np
+from page_features import extract_features
+from vector_classifier import VectorClassifier, feature_matrix, train, evaluate, save_model
+
+
+def load_labelled_pages(path: str) -> tuple[list, list]:
+    pages, labels = [], []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            html = record.get("html")
+            if html is None:
+                with open(os.path.join(base, record["path"]), "rb") as page:
+                    html = page.read()
+            pages.append((extract_features(html), record["url"]))
+            labels.append(bool(record["label"]))
+    return pages, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", help="JSON Lines file of labelled pages")
+    parser.add_argument("--out", default="weights", help="directory of versioned weight files")
+    parser.add_argument("--l2", type=float, default=1.0)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of pages kept for evaluation")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dry-run", action="store_true", help="evaluate without saving")
+    args = parser.parse_args()
+
+    pages, labels = load_labelled_pages(args.pages)
+    order = list(range(len(pages)))
+    random.Random(args.seed).shuffle(order)
+    split = int(len(order) * (1 - args.holdout))
+    matrix = feature_matrix(pages)
+    labels = np.asarray(labels)
+    train_rows, test_rows = order[:split], order[split:]
+    if not train_rows or not test_rows:
+        # Evaluating on the training pages would report training accuracy as held-out accuracy
+        parser.error(f"--holdout {args.holdout} leaves {len(train_rows)} training and {len(test_rows)} "
+                     f"held-out pages of {len(pages)}, both need at least one")
+    print(f"{len(pages)} labelled pages ({int(labels.sum())} products), {len(test_rows)} held out")
+
+    weights = train(matrix[train_rows], labels[train_rows], l2=args.l2)
+    model = VectorClassifier(weights, threshold=args.threshold, metadata={
+        "trained_on": os.path.basename(args.pages),
+        "pages": len(train_rows),
+        "l2": args.l2,
+    })
+    model.metadata["holdout"] = evaluate(model, matrix[test_rows], labels[test_rows])
+    baseline = evaluate(VectorClassifier.from_feature_weights(), matrix[test_rows], labels[test_rows])
+
+    print(f"heuristic weights: {baseline}")
+    print(f"trained weights:   {model.metadata['holdout']}")
+    for name, weight in zip(model.to_dict()["feature_names"], model.weights):
+        print(f"  {name:<22} {weight:+.3f}")
+    if not args.dry_run:
+        print(f"Saved {save_model(model, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
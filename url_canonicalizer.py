@@ -0,0 +1,102 @@
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+# `ref` is left out: many shops select the product with it. Add it to a domain's
+# `extra_drop_params` where it only tracks the referrer.
+TRACKING_PARAMS = frozenset((
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "igshid", "srsltid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "ref_", "spm", "trk", "cmpid",
+))
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+SESSION_PARAMS = frozenset((
+    "sid", "sessionid", "session_id", "sessid", "jsessionid", "phpsessid", "aspsessionid", "cfid", "cftoken",
+))
+PATH_SESSION_PATTERN = re.compile(r";(jsessionid|phpsessid|sid|sessionid)=[^/?#]*", re.IGNORECASE)
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+@dataclass
+class CanonicalizationRules:
+    """
+    How URLs of one domain are reduced to their canonical form.
+    """
+    drop_params: frozenset = TRACKING_PARAMS | SESSION_PARAMS
+    drop_param_prefixes: tuple = TRACKING_PREFIXES
+    # When set, only these query parameters are kept
+    keep_params: Optional[frozenset] = None
+    sort_query: bool = True
+    ignore_www: bool = True
+    lowercase_path: bool = False
+    strip_trailing_slash: bool = True
+    extra_drop_params: frozenset = field(default_factory=frozenset)
+
+
+class URLCanonicalizer:
+    """
+    Reduces URL variants of the same page (tracking and session parameters, query order,
+    `www.` vs bare host, host case, fragments) to one canonical URL.
+
+    Hosts that only differ by `www.` are mapped onto the host of the seed domain, so the
+    canonical URL is still one the crawler can fetch.
+    """
+
+    def __init__(self, default_rules: CanonicalizationRules = None,
+                 domain_rules: dict[str, CanonicalizationRules] = None):
+        self.default_rules = default_rules or CanonicalizationRules()
+        self.domain_rules = {self.host_key(d): r for d, r in (domain_rules or {}).items()}
+
+    @staticmethod
+    def host_key(host: str) -> str:
+        host = host.lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def rules_for(self, host: str) -> CanonicalizationRules:
+        return self.domain_rules.get(self.host_key(host), self.default_rules)
+
+    def __keep_param(self, name: str, rules: CanonicalizationRules) -> bool:
+        name = name.lower()
+        if rules.keep_params is not None:
+            return name in rules.keep_params
+        if name in rules.drop_params or name in rules.extra_drop_params:
+            return False
+        return not name.startswith(rules.drop_param_prefixes)
+
+    @staticmethod
+    def __seed_host(seed_domain: str) -> str:
+        return (urlsplit("//" + seed_domain).hostname or "").lower()
+
+    def canonicalize(self, url: str, seed_domain: str = None) -> str:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        rules = self.rules_for(host)
+
+        if rules.ignore_www and seed_domain and self.host_key(host) == self.host_key(self.__seed_host(seed_domain)):
+            host = self.__seed_host(seed_domain)
+        # IPv6 literals keep their brackets
+        netloc = f"[{host}]" if ":" in host else host
+        if port is not None and DEFAULT_PORTS.get(scheme) != str(port):
+            netloc = f"{netloc}:{port}"
+
+        path = PATH_SESSION_PATTERN.sub("", parts.path)
+        if rules.lowercase_path:
+            path = path.lower()
+        if rules.strip_trailing_slash:
+            path = path.rstrip("/")
+
+        query = parts.query
+        if query:
+            # Parameters are kept as written, so `?page` and `?page=` stay apart
+            params = [(unquote_plus(param.partition("=")[0]), param) for param in query.split("&") if param]
+            params = [(name, param) for name, param in params if self.__keep_param(name, rules)]
+            if rules.sort_query:
+                params.sort()
+            query = "&".join(param for _, param in params)
+
+        return urlunsplit((scheme, netloc, path, query, ""))
@@ -1,63 +1,210 @@
 from urllib.parse import urlparse
-from typing import Set
 import asyncio
+import time
 
+from frontier_store import MemoryFrontierStore
+from metrics import REGISTRY
+from sitemap_discovery import lastmod_age_days
 from product_url_analyser import is_dead_end_url, is_product_url
 from work_tracker import WorkTracker
 
 SKIP_EXTENSIONS = (".jpg", ".png", ".svg", ".js", ".css", ".ico", ".woff", ".ttf", ".mp4", ".pdf", ".zip")
 SKIP_PATH_KEYWORDS = ("/login", "/signup", "/cart", "/help", "/terms", "/privacy", "/account")
 
+FRONTIER_ADD_SECONDS = REGISTRY.histogram("frontier_add_seconds", "add_urls call including lock wait and scoring")
+FRONTIER_NEXT_SECONDS = REGISTRY.histogram("frontier_next_seconds", "Popping the next URL from a frontier")
+FRONTIER_ADDED = REGISTRY.counter("frontier_urls_added_total", "URLs queued after deduplication")
+FRONTIER_DISALLOWED = REGISTRY.counter("frontier_robots_disallowed_total", "URLs dropped by robots.txt rules")
+FRONTIER_EVICTED = REGISTRY.counter("frontier_urls_evicted_total", "Lowest-value URLs dropped to keep frontiers under max_size")
+# Sitemap lastmod dates within about this many days move a URL ahead of its priority class
+LASTMOD_HALF_LIFE_DAYS = 30
+# Each level of depth pushes a URL this far back within its priority class
+DEPTH_WEIGHT = 0.1
+# Templates linking to this many products per page get the full TEMPLATE_YIELD_WEIGHT bonus
+TEMPLATE_YIELD_WEIGHT = 0.5
+TEMPLATE_YIELD_SATURATION = 20
+
 class URLFrontier:
-    def __init__(self, seed_url: str, tracker: WorkTracker, max_depth: int = 3):
-        self.queue = asyncio.PriorityQueue()
-        self.visited: Set[str] = set()
+    def __init__(self, seed_url: str, tracker: WorkTracker, max_depth: int = 3, store=None, templates=None,
+                 robots=None, max_size: int = None):
+        # Priority queue and visited set, in memory unless a persistent store is given
+        self.store = store if store is not None else MemoryFrontierStore()
         self.allowed_domain = urlparse(seed_url).netloc
         self.max_depth = max_depth
         self.condition = asyncio.Condition()
         self.tracker = tracker
         self.active = True
-
+        # A dropped frontier queues nothing any more
+        self.dropped = False
+        # Optional TemplateLearner: trusted product templates skip the queue, dead-weight ones go to the back
+        self.templates = templates
+        # Optional RobotsRules: disallowed URLs are never queued
+        self.robots = robots
+        # Beyond this many queued URLs the lowest-value ones are evicted
+        self.max_size = max_size
+        self.evicted = 0
+        # URLs queued by this run, so a revisit does not queue a URL twice in one run
+        self.pushed = set()
 
     def has_next(self) -> bool:
-        return len(self.queue) > 0
+        return len(self.store) > 0
 
-    async def add_urls(self, urls: set[str], current_depth: int):
-        added_count = 0
+    async def resume(self) -> int:
+        """
+        Pick up a persisted frontier: URLs still in flight are queued again and the
+        tracker is told about everything pending. Returns the number of pending URLs.
+        """
         async with self.condition:
-            for url in urls:
-                if url not in self.visited and current_depth + 1 <= self.max_depth:
-                    self.visited.add(url)
-                    added_count += 1
-                    priority = self.score_url(url)
-                    await self.queue.put((priority, url, current_depth + 1))
-            if added_count > 0:
+            pending = self.store.restore()
+            if pending > 0:
                 self.condition.notify_all()
-        
-        if added_count > 0:
+        if pending > 0:
             self.active = True
-            await self.tracker.add(added_count)
+            await self.tracker.add(pending)
+        return pending
+
+    async def add_urls(self, urls: set[str], current_depth: int, lastmods: dict[str, str] = None,
+                       priority_offset: float = 0, boosts: dict[str, float] = None,
+                       revisit: bool = False) -> list[str]:
+        """
+        Queue unseen URLs. `lastmods` maps URLs to their sitemap lastmod, fresher pages
+        go first within the same priority, `priority_offset` moves the whole batch back
+        and `boosts` moves single URLs forward. With `revisit` URLs are queued even if
+        they were seen in an earlier run (but once per run), and are fetched even when
+        their template is trusted. Returns the URLs that were taken as products from their
+        template instead of being queued.
+
+        The batch is deduplicated and scored before the lock is taken, which is then only
+        held to push it (and evict the worst URLs once the frontier is over `max_size`).
+        """
+        start = time.perf_counter()
+        if current_depth + 1 > self.max_depth or self.dropped:
+            return []
+        disallowed = 0
+        skipped = []
+        batch = []
+        lastmods = lastmods or {}
+        boosts = boosts or {}
+        for url in urls:
+            if self.robots is not None and not self.robots.can_fetch(url):
+                disallowed += 1
+                continue
+            if not self.store.mark_visited(url) and (not revisit or url in self.pushed):
+                continue
+            if not revisit and self.templates is not None and self.templates.skip_fetch(url):
+                skipped.append(url)
+                continue
+            priority = self.score_url(url, current_depth + 1, lastmods.get(url)) + priority_offset - boosts.get(url, 0)
+            batch.append((priority, url))
+
+        evicted = []
+        if batch:
+            async with self.condition:
+                for priority, url in batch:
+                    self.store.push(priority, url, current_depth + 1)
+                    self.pushed.add(url)
+                if self.max_size is not None and len(self.store) > self.max_size:
+                    evicted = self.store.evict(len(self.store) - self.max_size)
+                self.condition.notify_all()
+        FRONTIER_ADD_SECONDS.observe(time.perf_counter() - start)
+        FRONTIER_ADDED.inc(len(batch))
+        FRONTIER_DISALLOWED.inc(disallowed)
+        FRONTIER_EVICTED.inc(len(evicted))
+        self.evicted += len(evicted)
+
+        queued = len(batch) - len(evicted)
+        if queued > 0:
+            self.active = True
+            await self.tracker.add(queued)
+        elif queued < 0:
+            await self.tracker.done(-queued)
+        return skipped
+
+    async def drop(self) -> int:
+        """
+        Give up on the domain: every queued URL is dropped and no URL is queued from now
+        on. Returns the number of URLs dropped.
+        """
+        async with self.condition:
+            self.dropped = True
+            dropped = self.store.evict(len(self.store))
+            self.condition.notify_all()
+        if dropped:
+            await self.tracker.done(len(dropped))
+        return len(dropped)
+
+    def skip_urls(self, urls) -> int:
+        """
+        Mark URLs as seen without queueing them, e.g. pages an incremental crawl does not
+        need to revisit yet. Returns how many were not seen before.
+        """
+        return sum(1 for url in urls if self.store.mark_visited(url))
 
     async def next_url(self):
         async with self.condition:
-            while self.queue.empty():
+            while len(self.store) == 0:
                 if not self.active:
                     raise StopAsyncIteration
                 await self.condition.wait()
-            priority, url, depth = await self.queue.get()
+            priority, url, depth = self.store.pop()
             return url, depth
 
+    def pop_nowait(self):
+        """
+        Next (url, depth) without waiting, or None if nothing is queued right now.
+        """
+        start = time.perf_counter()
+        entry = self.store.pop()
+        FRONTIER_NEXT_SECONDS.observe(time.perf_counter() - start)
+        if entry is None:
+            return None
+        priority, url, depth = entry
+        return url, depth
+
+    def complete(self, url: str):
+        """
+        Mark a popped URL as fully processed so a resumed crawl does not fetch it again.
+        """
+        self.store.complete(url)
+
     def is_empty(self):
-        return self.queue.empty()
+        return len(self.store) == 0
     
     async def finish(self):
         async with self.condition:
             self.active = False
             self.condition.notify_all()
-    
-    def score_url(self, url: str) -> int:
+        self.store.checkpoint()
 
-        is_prod_url, score , explanation = is_product_url(url)
+    def close(self):
+        self.store.close()
+
+    def get_stats(self) -> dict:
+        stats = {"queued": len(self.store), "evicted": self.evicted}
+        stats.update(self.store.seen_stats())
+        if self.robots is not None:
+            stats["robots_disallowed"] = self.robots.disallowed
+        return stats
+
+    def score_url(self, url: str, depth: int = 0, lastmod: str = None) -> float:
+        """
+        Lower is fetched first. The URL's class (1, 3, 10, 50 or 100) is refined within
+        the class: deeper URLs go back a little, URLs of templates whose pages lead to many
+        products and pages with a recent sitemap lastmod move forward by up to half a point.
+        """
+        priority = self.__base_priority(url) + DEPTH_WEIGHT * depth
+        if self.templates is not None:
+            link_yield = self.templates.link_yield(url)
+            if link_yield is not None:
+                priority -= TEMPLATE_YIELD_WEIGHT * min(1.0, link_yield / TEMPLATE_YIELD_SATURATION)
+        age = lastmod_age_days(lastmod)
+        if age is not None:
+            priority -= 0.5 * LASTMOD_HALF_LIFE_DAYS / (LASTMOD_HALF_LIFE_DAYS + age)
+        return priority
+
+    def __base_priority(self, url: str) -> int:
+
+        is_prod_url, score , explanation = is_product_url(url, explain=False)
         
         # High confidence product indicators
         if is_prod_url and score > 1:
@@ -71,6 +218,10 @@ class URLFrontier:
         if is_dead_end_url(url):
             return 100
 
+        # Templates whose pages were never products and hardly lead to any
+        if self.templates is not None and self.templates.is_dead_weight(url):
+            return 50
+
         # Default
         return 10
 
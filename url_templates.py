@@ -0,0 +1,32 @@
+import re
+from urllib.parse import urlparse
+
+SLUG_WITH_ID = re.compile(r'^(.+?)([-_])([a-z]{0,3})(\d+)(\.[a-z]+)?$')
+HAS_DIGIT = re.compile(r'\d')
+
+
+def segment_template(segment: str) -> str:
+    """
+    Collapse the variable part of a single path segment into a placeholder.
+    """
+    segment = segment.lower()
+    if segment.isdigit():
+        return "{id}"
+
+    match = SLUG_WITH_ID.match(segment)
+    if match:
+        _, sep, prefix, _, ext = match.groups()
+        return "{slug}" + sep + prefix + "{id}" + (ext or "")
+
+    if HAS_DIGIT.search(segment) or segment.count("-") >= 2 or segment.count("_") >= 2:
+        return "{slug}"
+    return segment
+
+
+def path_template(url: str) -> str:
+    """
+    Path template of a URL, e.g. `/products/blue-cotton-shirt` -> `/products/{slug}`.
+    """
+    path = urlparse(url).path
+    segments = [segment_template(s) for s in path.split("/") if s]
+    return "/" + "/".join(segments)
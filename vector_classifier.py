@@ -0,0 +1,218 @@
+import glob
+import json
+import os
+import re
+import time
+from typing import Sequence
+import numpy as np
+from feature_weights import DEFAULT_FEATURE_WEIGHTS
+from page_features import PageFeatures
+from product_url_analyser import is_product_url
+
+# Column order of the feature vector; weight files must list exactly these names
+FEATURE_NAMES = (
+    "bias",
+    "price_present",
+    "no_price_at_all",
+    "exact_one_cta",
+    "not_one_cta",
+    "spec_section",
+    "related_products",
+    "no_inputs_or_forms",
+    "url_product_pattern",
+    "url_score",
+    "log_links",
+    "log_images",
+)
+WEIGHT_FILE_PATTERN = re.compile(r"product_page_v(\d+)\.json$")
+
+
+def feature_vector(features: PageFeatures, url: str = "", out: np.ndarray = None) -> np.ndarray:
+    """
+    Fixed-width numeric vector of one page, in FEATURE_NAMES order.
+    """
+    row = out if out is not None else np.empty(len(FEATURE_NAMES))
+    is_prod_url, url_score, _ = is_product_url(url, explain=False) if url else (False, 0.0, None)
+    has_price = features.price_hits > 0
+    one_cta = features.cta_count == 1
+    row[:] = (
+        1.0,
+        has_price,
+        not has_price,
+        one_cta,
+        not one_cta,
+        features.has_spec_section,
+        features.has_related_section,
+        not features.has_inputs_or_forms,
+        is_prod_url,
+        url_score,
+        np.log1p(features.num_links),
+        np.log1p(features.num_images),
+    )
+    return row
+
+
+def feature_matrix(pages: Sequence[tuple[PageFeatures, str]]) -> np.ndarray:
+    matrix = np.empty((len(pages), len(FEATURE_NAMES)))
+    for i, (features, url) in enumerate(pages):
+        feature_vector(features, url, out=matrix[i])
+    return matrix
+
+
+class VectorClassifier:
+    """
+    Logistic model over page feature vectors. A whole batch is scored with one
+    matrix-vector product.
+
+    With `short_circuit` set, pages that have neither a price nor exactly one CTA get
+    confidence 0, the way ProductPageClassifier.analyze short-circuits them.
+    """
+
+    def __init__(self, weights: Sequence[float], threshold: float = 0.8, short_circuit: bool = False,
+                 version: int = 0, metadata: dict = None):
+        self.weights = np.asarray(weights, dtype=float)
+        if self.weights.shape != (len(FEATURE_NAMES),):
+            raise ValueError(f"Expected {len(FEATURE_NAMES)} weights, got {self.weights.shape}")
+        self.threshold = threshold
+        self.short_circuit = short_circuit
+        self.version = version
+        self.metadata = metadata or {}
+
+    @classmethod
+    def from_feature_weights(cls, weights: dict = None) -> "VectorClassifier":
+        """
+        The model equivalent to ProductPageClassifier.analyze with the given heuristic
+        weights; "multiple_cta" is subtracted there, so its sign flips here.
+        """
+        weights = weights or DEFAULT_FEATURE_WEIGHTS
+        vector = dict.fromkeys(FEATURE_NAMES, 0.0)
+        vector.update(
+            price_present=weights["price_present"],
+            no_price_at_all=weights["no_price_at_all"],
+            exact_one_cta=weights["exact_one_cta"],
+            not_one_cta=-weights["multiple_cta"],
+            spec_section=weights["spec_section"],
+            related_products=weights["related_products"],
+            no_inputs_or_forms=weights["no_inputs_or_forms"],
+            url_product_pattern=2.0,
+        )
+        return cls([vector[name] for name in FEATURE_NAMES], threshold=0.8, short_circuit=True,
+                   metadata={"source": "DEFAULT_FEATURE_WEIGHTS"})
+
+    def scores(self, matrix: np.ndarray) -> np.ndarray:
+        return matrix @ self.weights
+
+    def confidences(self, matrix: np.ndarray) -> np.ndarray:
+        confidence = 1.0 / (1.0 + np.exp(-self.scores(matrix)))
+        if self.short_circuit:
+            core = (matrix[:, FEATURE_NAMES.index("price_present")] > 0) | \
+                   (matrix[:, FEATURE_NAMES.index("exact_one_cta")] > 0)
+            confidence = np.where(core, confidence, 0.0)
+        return confidence
+
+    def classify(self, pages: Sequence[tuple[PageFeatures, str]]) -> list[dict]:
+        """
+        Verdicts for a batch of (features, url) pairs, shaped like analyze() results
+        without the explanation.
+        """
+        if not pages:
+            return []
+        matrix = feature_matrix(pages)
+        scores = self.scores(matrix)
+        confidences = self.confidences(matrix)
+        return [
+            {
+                "is_product_page": bool(confidence >= self.threshold),
+                "confidence": round(float(confidence), 4),
+                "score": round(float(score), 2),
+                "features": features.to_dict(),
+            }
+            for (features, _), score, confidence in zip(pages, scores, confidences)
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "feature_names": list(FEATURE_NAMES),
+            "weights": [round(float(w), 6) for w in self.weights],
+            "threshold": self.threshold,
+            "short_circuit": self.short_circuit,
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "VectorClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if tuple(data["feature_names"]) != FEATURE_NAMES:
+            raise ValueError(f"{path} was trained on features {data['feature_names']}, expected {list(FEATURE_NAMES)}")
+        return cls(data["weights"], threshold=data["threshold"], short_circuit=data.get("short_circuit", False),
+                   version=data.get("version", 0), metadata=data.get("metadata"))
+
+
+def weight_file_versions(directory: str) -> dict[int, str]:
+    versions = {}
+    for path in glob.glob(os.path.join(directory, "product_page_v*.json")):
+        match = WEIGHT_FILE_PATTERN.search(path)
+        if match:
+            versions[int(match.group(1))] = path
+    return versions
+
+
+def save_model(model: VectorClassifier, directory: str) -> str:
+    """
+    Write the model as the next version in `directory`, e.g. product_page_v3.json.
+    Existing versions are never overwritten.
+    """
+    os.makedirs(directory, exist_ok=True)
+    model.version = max(weight_file_versions(directory), default=0) + 1
+    model.metadata.setdefault("created", time.strftime("%Y-%m-%dT%H:%M:%S"))
+    path = os.path.join(directory, f"product_page_v{model.version}.json")
+    with open(path, "x", encoding="utf-8") as f:
+        json.dump(model.to_dict(), f, indent=2)
+    return path
+
+
+def load_model(path_or_directory: str) -> VectorClassifier:
+    """
+    Load a weight file, or the latest version in a directory of weight files.
+    """
+    if os.path.isdir(path_or_directory):
+        versions = weight_file_versions(path_or_directory)
+        if not versions:
+            raise FileNotFoundError(f"No product_page_v*.json weight files in {path_or_directory}")
+        path_or_directory = versions[max(versions)]
+    return VectorClassifier.load(path_or_directory)
+
+
+def train(matrix: np.ndarray, labels: np.ndarray, l2: float = 1.0, iterations: int = 50,
+          tolerance: float = 1e-8) -> np.ndarray:
+    """
+    Fit logistic regression weights by Newton's method (IRLS) with an L2 penalty on
+    everything but the bias.
+    """
+    labels = np.asarray(labels, dtype=float)
+    weights = np.zeros(matrix.shape[1])
+    penalty = np.full(matrix.shape[1], l2)
+    penalty[FEATURE_NAMES.index("bias")] = 0.0
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(matrix @ weights)))
+        gradient = matrix.T @ (p - labels) + penalty * weights
+        hessian = (matrix.T * (p * (1 - p))) @ matrix + np.diag(penalty) + 1e-9 * np.eye(len(weights))
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.max(np.abs(step)) < tolerance:
+            break
+    return weights
+
+
+def evaluate(model: VectorClassifier, matrix: np.ndarray, labels: np.ndarray) -> dict:
+    labels = np.asarray(labels, dtype=bool)
+    predicted = model.confidences(matrix) >= model.threshold
+    true_positives = int(np.sum(predicted & labels))
+    return {
+        "pages": int(len(labels)),
+        "accuracy": round(float(np.mean(predicted == labels)), 4) if len(labels) else 0.0,
+        "precision": round(true_positives / max(1, int(np.sum(predicted))), 4),
+        "recall": round(true_positives / max(1, int(np.sum(labels))), 4),
+    }
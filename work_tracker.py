@@ -19,5 +19,13 @@ class WorkTracker:
             if self.count == 0:
                 self.event.set()
 
+    async def settle(self):
+        """
+        Release waiters if no work was ever added, e.g. a resumed crawl with nothing left.
+        """
+        async with self.lock:
+            if self.count == 0:
+                self.event.set()
+
     async def wait(self):
         await self.event.wait()